@@ -2,11 +2,61 @@ from django.db import models
 from django.contrib.auth.models import User
 from properties.models import Property
 from decimal import Decimal
-from django.db.models import Sum
+from django.db.models import Prefetch, Sum
+from django.utils import timezone
+from datetime import timedelta
+from properties.models import MAX_NIGHTS
 from reyes_estancias import settings
 
 # Create your models here.
 
+class BookingQuerySet(models.QuerySet):
+
+    def blocking(self, at=None):
+        """Reservas que bloquean fechas: confirmed, o pending cuyo hold no ha expirado."""
+        at = at or timezone.now()
+        return (self.filter(status__in=["confirmed", "pending"])
+                .exclude(status="pending", hold_expires_at__lt=at))
+
+    def overlapping(self, property_id, checkin_dt, checkout_dt, *, exclude_booking_id=None):
+        """
+        Reservas que bloquean y solapan con [checkin_dt, checkout_dt).
+
+        Pensada para .exists(): property + status + rango de arrival la resuelve
+        booking_avail_idx. La cota inferior de arrival (ninguna estancia supera
+        MAX_NIGHTS) evita recorrer el histórico de la propiedad, así que el coste
+        no crece con el número de reservas pasadas.
+        """
+        qs = self.blocking().filter(
+            property_id=property_id,
+            arrival__gt=checkin_dt - timedelta(days=MAX_NIGHTS + 1),
+            arrival__lt=checkout_dt,
+            departure__gt=checkin_dt,
+        )
+        if exclude_booking_id:
+            qs = qs.exclude(id=exclude_booking_id)
+        return qs
+
+    def with_payment_summary(self):
+        """
+        Añade lo que necesitan los listados de reservas sin una consulta por fila:
+        el saldo de cada reserva (BookingLedger, en el mismo JOIN) y el último pago
+        de depósito y de balance (un único prefetch para todas las reservas).
+
+        deposit_payment(), balance_payment(), dep_before_chage_dates(),
+        net_deposit_paid() y balance_due_runtime() usan estos valores si están.
+        """
+        from payments.models import Payment
+
+        return (self
+                .select_related("ledger")
+                .prefetch_related(Prefetch(
+                    "payments",
+                    queryset=Payment.objects.filter(payment_type__in=["deposit", "balance"]).order_by("-id"),
+                    to_attr="latest_payments",
+                )))
+
+
 class Booking(models.Model):
     STATUS_CHOICES = [
     ("pending", "Pendiente"),
@@ -33,9 +83,24 @@ class Booking(models.Model):
     #ETA PARA COBRO OFF-SESSION CON CELERY 
     balance_charge_task_id = models.CharField(max_length=255, blank=True, null=True, verbose_name="Identificador de la tarea")
     balance_charge_eta = models.DateTimeField(null=True, blank=True, verbose_name="Fecha para cobro automático de balance")
+
+    objects = BookingQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Para recalcular el libro de pagos solo si cambia total_amount (ver signals)
+        instance._loaded_total_amount = instance.__dict__.get("total_amount")
+        return instance
     
+    def _latest_payment(self, payment_type):
+        # Con with_payment_summary() los pagos ya vienen cargados (del más reciente al más antiguo)
+        if hasattr(self, "latest_payments"):
+            return next((p for p in self.latest_payments if p.payment_type == payment_type), None)
+        return self.payments.filter(payment_type=payment_type).order_by("-id").first()
+
     def deposit_payment(self):
-        return self.payments.filter(payment_type="deposit").order_by("-id").first()
+        return self._latest_payment("deposit")
 
     def deposit_paid(self):
         p = self.deposit_payment()
@@ -43,24 +108,27 @@ class Booking(models.Model):
     
     
     def balance_payment(self):
-        return self.payments.filter(payment_type="balance").order_by("-id").first()
+        return self._latest_payment("balance")
     
     def balance_paid(self):
         p = self.balance_payment()
         return bool(p and p.status == "paid")
     
+    def _ledger(self):
+        # Saldo desnormalizado (payments.BookingLedger): una fila, o ninguna consulta con with_payment_summary()
+        from payments.ledger import get_ledger
+
+        return get_ledger(self)
+
     def dep_before_chage_dates(self):
-        return self.payments.filter(payment_type="deposit", status="paid").aggregate(s=Sum("amount")) ["s"] or Decimal("0.00")
+        return self._ledger().paid_deposit
     
     def net_deposit_paid(self):
-        paid_dep = self.payments.filter(payment_type="deposit", status="paid").aggregate(s=Sum("amount")) ["s"] or Decimal("0.00")
-        refunded = self.payments.filter(payment_type="deposit", status="paid").aggregate(s=Sum("refunded_amount")) ["s"] or Decimal("0.00")
-        return (paid_dep - refunded)
+        return self._ledger().net_deposit
     
     def balance_due_runtime(self):
-        paid_ext = self.payments.filter(payment_type="extension", status="paid").aggregate(s=Sum("amount"))["s"] or Decimal("0.00")
-        paid_bal = self.payments.filter(payment_type="balance", status="paid").aggregate(s=Sum("amount"))["s"] or Decimal("0.00")
-        balance_due = self.total_amount - self.net_deposit_paid() - paid_bal - paid_ext
+        ledger = self._ledger()
+        balance_due = self.total_amount - ledger.net_deposit - ledger.paid_balance - ledger.paid_extension
         return balance_due if balance_due > 0 else Decimal("0.00")
 
 
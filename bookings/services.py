@@ -2,6 +2,7 @@ from decimal import Decimal, ROUND_HALF_UP
 from datetime import timedelta
 from django.db import transaction
 from properties.models import Property
+from properties.utils.quotes import get_quote
 from payments.services import *
 from .models import *
 
@@ -13,7 +14,8 @@ def _round(num):
     return num.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
 def compute_price(property, checkin, checkout):
-    price = property.quote_total(checkin, checkout)
+    # Memorizado: la previsualización y la aplicación del cambio cotizan lo mismo
+    price = get_quote(property, checkin, checkout)
     return price["total"]
 
 def quote_change_booking_dates(booking, new_in, new_out):
@@ -93,6 +95,9 @@ def apply_change_booking_dates(booking, new_in, new_out, *, actor_user, request=
         
         if not property.is_available(new_in, new_out, booking.person_num, exclude_booking_id=booking.id, buffer_nights=0):
             return {"ok": False, "msg" : "Propiedad no disponible"}
+
+        if Booking.objects.overlapping(property.pk, new_in, new_out, exclude_booking_id=booking.id).exists():
+            return {"ok": False, "msg" : "Propiedad no disponible"}
     
         paid_dep = get_paid_deposit_amount(booking)
 
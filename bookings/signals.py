@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from .models import Booking
 from payments.models import Payment
+from payments.ledger import refresh_ledger
+from properties.utils.occupancy import (
+    bump_availability_version, index_booking, touch_booking, EXPORTED_FIELDS, INDEXED_FIELDS,
+)
 
 @receiver(post_save, sender=Booking)
 def create_payment_for_booking(sender, instance, created, **kwargs):
@@ -12,4 +16,31 @@ def create_payment_for_booking(sender, instance, created, **kwargs):
             amount = 0.00,
             currency = "MXN",
 
-        )
\ No newline at end of file
+        )
+
+@receiver(post_save, sender=Booking)
+def update_occupancy_index(sender, instance, created, update_fields=None, **kwargs):
+    # Solo reindexar si el save() toca fechas, estado o propiedad; si solo toca
+    # huéspedes u hold (.ics exportado), basta con invalidar lo cacheado
+    if not created and update_fields is not None and not (set(update_fields) & INDEXED_FIELDS):
+        if set(update_fields) & EXPORTED_FIELDS:
+            touch_booking(instance)
+        return
+    index_booking(instance)
+
+@receiver(post_save, sender=Booking)
+def update_ledger_net_due(sender, instance, created, update_fields=None, **kwargs):
+    # El pendiente de pago del saldo depende de total_amount (al crearla lo calcula su primer Payment)
+    if created or (update_fields is not None and "total_amount" not in update_fields):
+        return
+    # save() completo: solo si total_amount cambió desde que se cargó la reserva
+    loaded = getattr(instance, "_loaded_total_amount", None)
+    if loaded is not None and loaded == instance.total_amount:
+        return
+    refresh_ledger(instance.pk)
+    instance._loaded_total_amount = instance.total_amount
+
+@receiver(post_delete, sender=Booking)
+def invalidate_availability_on_delete(sender, instance, **kwargs):
+    # Las noches se borran en cascada; solo falta invalidar lo cacheado
+    bump_availability_version(instance.property_id)
@@ -2,11 +2,18 @@ from celery import shared_task
 from django.utils import timezone
 from django.db.models import Q
 from .models import Booking
-from payments.services import compute_balance_due_snapshot
+from django.db import transaction
+from payments.ledger import net_paid_subquery
+from properties.utils.occupancy import release_bookings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Reservas por tramo en mark_completed_bookings (un UPDATE y una transacción por tramo)
+COMPLETED_BATCH_SIZE = 500
+# Holds por tramo en mark_expired_holds
+HOLD_EXPIRY_BATCH_SIZE = 200
+
 
 @shared_task
 def mark_expired_bookings():
@@ -29,7 +36,8 @@ def mark_expired_bookings():
     count = expired_bookings.count()
 
     if count > 0:
-        # Actualizar todas a expired
+        # Actualizar todas a expired (update() no dispara señales: liberar el índice antes)
+        release_bookings(expired_bookings)
         updated = expired_bookings.update(status="expired")
 
         logger.info(
@@ -49,6 +57,11 @@ def mark_completed_bookings():
     Marca como 'completed' las reservas confirmadas cuya fecha de salida ya pasó
     y cuyo balance está completamente pagado (compute_balance_due_snapshot == 0).
 
+    Sin una consulta por reserva: recorre las candidatas por tramos de clave
+    primaria (COMPLETED_BATCH_SIZE) y en cada tramo hace un único UPDATE cuyo
+    WHERE compara total_amount con la suma de pagos (subconsulta correlacionada),
+    cada uno en su propia transacción para no mantener bloqueos largos.
+
     Se ejecuta periódicamente via Celery Beat.
     """
     now = timezone.now()
@@ -59,11 +72,23 @@ def mark_completed_bookings():
     )
 
     completed = 0
-    for booking in candidates.iterator():
-        if compute_balance_due_snapshot(booking) == 0:
-            booking.status = "completed"
-            booking.save(update_fields=["status"])
-            completed += 1
+    last_pk = 0
+    while True:
+        # Último pk del tramo (escaneo solo de índice); None = lo que queda
+        window = candidates.filter(pk__gt=last_pk)
+        upper_pk = window.order_by("pk").values_list("pk", flat=True)[COMPLETED_BATCH_SIZE - 1:COMPLETED_BATCH_SIZE].first()
+        if upper_pk is not None:
+            window = window.filter(pk__lte=upper_pk)
+
+        with transaction.atomic():
+            paid_off = window.filter(total_amount__lte=net_paid_subquery())
+            # update() no dispara señales: liberar el índice antes (como mark_expired_bookings)
+            release_bookings(paid_off)
+            completed += paid_off.update(status="completed")
+
+        if upper_pk is None:
+            break
+        last_pk = upper_pk
 
     if completed:
         logger.info("Marcadas %d reservas como completed.", completed)
@@ -80,23 +105,43 @@ def mark_expired_holds():
 
     Esto es para reservas que se crearon pero nunca se pagó el depósito.
 
+    Es el consumidor de la cola de holds: el índice booking_hold_idx (status,
+    hold_expires_at) los ordena por vencimiento desde que se crean, así que cada
+    pasada solo lee los ya vencidos. Celery Beat la ejecuta cada
+    HOLD_EXPIRY_POLL_SECONDS: las noches de un hold vencido se liberan (y se
+    invalida la versión de disponibilidad de la propiedad) segundos después, y las
+    consultas de disponibilidad ya no tienen que descartar holds caducados.
+
+    Procesa tramos de HOLD_EXPIRY_BATCH_SIZE, del más antiguo al más reciente; con
+    skip_locked, dos workers a la vez no se pisan.
+
     Returns:
         str: Resumen de reservas expiradas
     """
     now = timezone.now()
 
-    # Buscar reservas pendientes con hold expirado
-    expired_holds = Booking.objects.filter(
-        status="pending",
-        hold_expires_at__isnull=False,
-        hold_expires_at__lt=now
-    )
-
-    count = expired_holds.count()
-
-    if count > 0:
-        updated = expired_holds.update(status="expired")
-
+    updated = 0
+    while True:
+        with transaction.atomic():
+            # Buscar reservas pendientes con hold expirado
+            due = list(
+                Booking.objects.filter(
+                    status="pending",
+                    hold_expires_at__isnull=False,
+                    hold_expires_at__lt=now
+                )
+                .order_by("hold_expires_at")
+                .select_for_update(skip_locked=True)
+                .values_list("pk", flat=True)[:HOLD_EXPIRY_BATCH_SIZE]
+            )
+            if due:
+                expired_holds = Booking.objects.filter(pk__in=due, status="pending")
+                release_bookings(expired_holds)
+                updated += expired_holds.update(status="expired")
+        if len(due) < HOLD_EXPIRY_BATCH_SIZE:
+            break
+
+    if updated > 0:
         logger.info(
             f"Marcadas {updated} reservas pendientes como expiradas por hold vencido. "
             f"Fecha de corte: {now.isoformat()}"
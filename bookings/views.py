@@ -4,6 +4,7 @@ from django.views.generic import TemplateView
 from django.views import View
 from .models import *
 from properties.models import *
+from properties.utils.quotes import get_quote
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views import View
 from django.contrib import messages
@@ -39,6 +40,7 @@ class BookingsList(LoginRequiredMixin, ListView):
         return (Booking.objects
                 .filter(user=self.request.user)  # o tu filtro
                 .annotate(last_deposit_refund=Subquery(latest_log.values("deposit_refund")[:1]))
+                .with_payment_summary()  # importes y últimos pagos sin consultas por fila
                 .select_related("property"))
     
 class CreateBookingView(LoginRequiredMixin, View):
@@ -74,21 +76,14 @@ class CreateBookingView(LoginRequiredMixin, View):
                     return redirect(url)
 
                 # 3. Verificar explícitamente que no hay reservas conflictivas
-                # (double-check para mayor seguridad)
-                conflicting_bookings = Booking.objects.filter(
-                    property=property,
-                    status__in=["confirmed", "pending"],
-                    arrival__lt=checkout_dt,
-                    departure__gt=checkin_dt
-                ).exclude(hold_expires_at__lt=now()).exists()
-
-                if conflicting_bookings:
+                # (double-check contra la tabla de reservas: un único EXISTS)
+                if Booking.objects.overlapping(property.pk, checkin_dt, checkout_dt).exists():
                     messages.warning(request, "La propiedad ya no está disponible")
                     url = f"{reverse('property_detail', kwargs={'pk':property_id})}?checkin={checkin}&checkout={checkout}&cant_personas={cant_personas}"
                     return redirect(url)
 
                 # 4. Calcular precios
-                quote = property.quote_total(checkin_dt.date(), checkout_dt.date())
+                quote = get_quote(property, checkin_dt.date(), checkout_dt.date())
                 total = quote["total"]
                 deposit = (quote["total"] * Decimal("0.30")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
                 balance = (quote["total"] - deposit).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
@@ -262,11 +257,10 @@ class RemakeBookingView(LoginRequiredMixin, View):
             return redirect("bookings_list")
         try:
             with transaction.atomic():
-                (property.bookings.select_for_update(skip_locked=True)
-                .filter(status=["confirmed","pending"]).exclude(hold_expires_at__lt=now())
-                .filter(arrival__lt=checkout, departure__gt=checkin).count())
+                Property.objects.select_for_update().get(pk=property.pk)
 
-                if not property.is_available(checkin, checkout, cant_personas):
+                if (not property.is_available(checkin, checkout, cant_personas)
+                        or Booking.objects.overlapping(property.pk, checkin, checkout).exists()):
                     messages.error(request, "Las fechas ya no están disponibles")
                     return redirect("bookings_list")
             
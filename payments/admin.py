@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment, RefundLog
+from .models import BookingLedger, Payment, RefundLog
 # Register your models here.
 class AdminPayment(admin.ModelAdmin):
     list_display = ("id", "booking", "payment_type", "status", "amount", "currency", "created_at")
@@ -12,6 +12,16 @@ class AdminRefundLog(admin.ModelAdmin):
     list_filter=("payment", "stripe_refund_id")
     readonly_fields=("created_at",)
 
+class AdminBookingLedger(admin.ModelAdmin):
+    # Solo lectura: se recalcula con cada cambio de un pago (manage.py verify_ledgers para comprobarlo)
+    list_display = ("booking", "paid_deposit", "deposit_refunded", "paid_balance", "paid_extension", "refunded_total", "net_due", "updated_at")
+    search_fields = ("booking__property__name", "booking__user__username")
+    readonly_fields = list_display
+
+    def has_add_permission(self, request):
+        return False
+
     
 admin.site.register(Payment, AdminPayment)
-admin.site.register(RefundLog, AdminRefundLog)
\ No newline at end of file
+admin.site.register(RefundLog, AdminRefundLog)
+admin.site.register(BookingLedger, AdminBookingLedger)
@@ -0,0 +1,166 @@
+# payments/ledger.py
+"""
+Saldo de cada reserva (BookingLedger).
+
+Los importes cobrados y reembolsados de una reserva se guardan ya sumados en una
+fila por reserva. Cada cambio de un Payment (payments.signals) la recalcula desde
+los pagos, en la misma transacción y con la fila bloqueada, así que dos webhooks
+simultáneos de la misma reserva no pueden dejarla desfasada. Las lecturas
+(get_paid_deposit_amount, compute_balance_due_snapshot, Booking.balance_due_runtime...)
+son una sola fila por clave primaria.
+
+Los update() en lote sobre Payment no disparan señales: quien los use debe
+llamar a refresh_ledger() si cambian pagos cobrados o reembolsos.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+import logging
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal("0.00")
+
+LEDGER_FIELDS = ("paid_deposit", "deposit_refunded", "paid_balance", "paid_extension", "refunded_total")
+
+
+def _sum(field, condition):
+    return Coalesce(Sum(field, filter=condition), Value(ZERO),
+                    output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def _ledger_aggregates(prefix=""):
+    """Sumas del saldo sobre Payment (prefix="") o desde Booking (prefix="payments__")."""
+    paid = Q(**{f"{prefix}status": "paid"})
+
+    def paid_of(payment_type):
+        return paid & Q(**{f"{prefix}payment_type": payment_type})
+
+    return {
+        "paid_deposit": _sum(f"{prefix}amount", paid_of("deposit")),
+        "deposit_refunded": _sum(f"{prefix}refunded_amount", paid_of("deposit")),
+        "paid_balance": _sum(f"{prefix}amount", paid_of("balance")),
+        "paid_extension": _sum(f"{prefix}amount", paid_of("extension")),
+        "refunded_total": _sum(f"{prefix}refunded_amount", Q(**{f"{prefix}refund_status": "paid"})),
+    }
+
+
+def net_paid_subquery(outer_ref="pk"):
+    """
+    Lo cobrado neto de una reserva (BookingLedger.net_paid) calculado desde sus
+    pagos, como subconsulta correlacionada: para filtros y update() en lote sobre
+    Booking que no deben depender del saldo guardado.
+    """
+    from payments.models import Payment
+
+    sums = _ledger_aggregates()
+    net = sums["paid_deposit"] + sums["paid_balance"] + sums["paid_extension"] - sums["refunded_total"]
+    per_booking = (Payment.objects
+                   .filter(booking_id=OuterRef(outer_ref))
+                   .values("booking_id")
+                   .annotate(net=net)
+                   .values("net")[:1])
+    return Coalesce(Subquery(per_booking), Value(ZERO), output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def _net_due(total_amount, values):
+    net_paid = values["paid_deposit"] + values["paid_balance"] + values["paid_extension"] - values["refunded_total"]
+    return max(total_amount - net_paid, ZERO).quantize(ZERO, rounding=ROUND_HALF_UP)
+
+
+def refresh_ledger(booking, create=True):
+    """
+    Recalcula el saldo de una reserva desde sus pagos y lo guarda.
+
+    Args:
+        booking: Booking o su ID
+        create: crear el saldo si no existe (False al borrar pagos: la reserva
+                puede estar borrándose en cascada)
+
+    Returns:
+        BookingLedger | None
+    """
+    from bookings.models import Booking
+    from payments.models import BookingLedger, Payment
+
+    booking_id = getattr(booking, "pk", booking)
+    with transaction.atomic():
+        if create:
+            BookingLedger.objects.get_or_create(booking_id=booking_id)
+        # Bloquear la fila serializa los recálculos concurrentes de la misma reserva
+        ledger = BookingLedger.objects.select_for_update().filter(booking_id=booking_id).first()
+        if ledger is None:
+            return None
+        values = Payment.objects.filter(booking_id=booking_id).aggregate(**_ledger_aggregates())
+        total_amount = Booking.objects.filter(pk=booking_id).values_list("total_amount", flat=True).first() or ZERO
+        for field in LEDGER_FIELDS:
+            setattr(ledger, field, values[field])
+        ledger.net_due = _net_due(total_amount, values)
+        ledger.save()
+    return ledger
+
+
+def get_ledger(booking):
+    """
+    Saldo de una reserva: el ya cargado con select_related("ledger") (listados) o,
+    si no, una fila por clave primaria, sin cachearla en la instancia, para que
+    los flujos de cobro siempre lean el saldo actual. Si aún no existe, se calcula.
+    """
+    from bookings.models import Booking
+    from payments.models import BookingLedger
+
+    if Booking.ledger.is_cached(booking):
+        ledger = Booking.ledger.related.get_cached_value(booking)
+        if ledger is not None:
+            return ledger
+    ledger = BookingLedger.objects.filter(booking_id=booking.pk).first()
+    return ledger if ledger is not None else refresh_ledger(booking)
+
+
+def verify_ledgers(booking_ids=None, fix=False):
+    """
+    Compara los saldos guardados con los que salen de los pagos reales.
+
+    Args:
+        booking_ids: reservas a comprobar (todas si None)
+        fix: reconstruir los saldos que no coincidan (o que falten)
+
+    Returns:
+        list: [{"booking_id", "field", "stored", "expected"}] con cada diferencia
+    """
+    from bookings.models import Booking
+    from payments.models import BookingLedger
+
+    bookings = Booking.objects.all()
+    if booking_ids is not None:
+        bookings = bookings.filter(pk__in=booking_ids)
+    # Saldos esperados de todas las reservas en una sola consulta agregada
+    expected = {
+        row.pop("pk"): row
+        for row in bookings.values("pk", "total_amount").annotate(**_ledger_aggregates("payments__"))
+    }
+    stored = {
+        ledger.booking_id: ledger
+        for ledger in BookingLedger.objects.filter(booking_id__in=list(expected))
+    }
+
+    mismatches = []
+    for booking_id, values in expected.items():
+        values["net_due"] = _net_due(values.pop("total_amount"), values)
+        ledger = stored.get(booking_id)
+        for field in LEDGER_FIELDS + ("net_due",):
+            current = getattr(ledger, field) if ledger else None
+            if current != values[field]:
+                mismatches.append({"booking_id": booking_id, "field": field,
+                                   "stored": current, "expected": values[field]})
+
+    broken = sorted({m["booking_id"] for m in mismatches})
+    if broken:
+        logger.warning(f"{len(broken)} saldos de reserva no coinciden con sus pagos",
+                       extra={'booking_ids': broken[:50], 'fix': fix})
+    if fix:
+        for booking_id in broken:
+            refresh_ledger(booking_id)
+    return mismatches
+
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from payments.ledger import verify_ledgers
+
+
+class Command(BaseCommand):
+    help = (
+        "Comprueba el saldo guardado de cada reserva (BookingLedger) contra sus pagos. "
+        "Sale con código 1 si hay diferencias y no se usa --fix (apto para cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--booking", type=int, action="append", dest="bookings", default=None,
+                            help="ID de la reserva (se puede repetir; por defecto, todas)")
+        parser.add_argument("--fix", action="store_true", help="Reconstruir desde los pagos los saldos que no coincidan")
+
+    def handle(self, *args, **options):
+        mismatches = verify_ledgers(options["bookings"], fix=options["fix"])
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Todos los saldos coinciden con sus pagos."))
+            return
+
+        for m in mismatches:
+            self.stdout.write(self.style.WARNING(
+                f"Reserva {m['booking_id']} · {m['field']}: guardado {m['stored']}, según los pagos {m['expected']}"
+            ))
+        broken = len({m["booking_id"] for m in mismatches})
+        if options["fix"]:
+            self.stdout.write(self.style.SUCCESS(f"{broken} saldos reconstruidos."))
+        else:
+            raise CommandError(f"{broken} saldos no coinciden con sus pagos (usa --fix)", returncode=1)
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 19:30
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0013_add_completed_status'),
+        ('payments', '0012_add_extension_payment_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingLedger',
+            fields=[
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ledger', serialize=False, to='bookings.booking', verbose_name='Reserva')),
+                ('paid_deposit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Depósito pagado')),
+                ('deposit_refunded', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Depósito devuelto')),
+                ('paid_balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Balance pagado')),
+                ('paid_extension', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Extensiones pagadas')),
+                ('refunded_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Total reembolsado')),
+                ('net_due', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Pendiente de pago')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Actualizado')),
+            ],
+            options={
+                'verbose_name': 'Saldo de reserva',
+                'verbose_name_plural': 'Saldos de reservas',
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def _sum(field, condition):
+    return Coalesce(Sum(field, filter=condition), Value(Decimal('0.00')),
+                    output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def build_ledgers(apps, schema_editor):
+    """Crea el saldo (BookingLedger) de cada reserva existente a partir de sus pagos."""
+    Booking = apps.get_model('bookings', 'Booking')
+    BookingLedger = apps.get_model('payments', 'BookingLedger')
+
+    paid = Q(payments__status='paid')
+    rows = Booking.objects.values('pk', 'total_amount').annotate(
+        paid_deposit=_sum('payments__amount', paid & Q(payments__payment_type='deposit')),
+        deposit_refunded=_sum('payments__refunded_amount', paid & Q(payments__payment_type='deposit')),
+        paid_balance=_sum('payments__amount', paid & Q(payments__payment_type='balance')),
+        paid_extension=_sum('payments__amount', paid & Q(payments__payment_type='extension')),
+        refunded_total=_sum('payments__refunded_amount', Q(payments__refund_status='paid')),
+    )
+    ledgers = []
+    for row in rows.iterator():
+        net_paid = row['paid_deposit'] + row['paid_balance'] + row['paid_extension'] - row['refunded_total']
+        ledgers.append(BookingLedger(
+            booking_id=row['pk'],
+            paid_deposit=row['paid_deposit'],
+            deposit_refunded=row['deposit_refunded'],
+            paid_balance=row['paid_balance'],
+            paid_extension=row['paid_extension'],
+            refunded_total=row['refunded_total'],
+            net_due=max(row['total_amount'] - net_paid, Decimal('0.00')),
+        ))
+    BookingLedger.objects.bulk_create(ledgers, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0013_bookingledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_ledgers, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from bookings.models import Booking
 from decimal import Decimal
 
@@ -57,6 +57,16 @@ class Payment(models.Model):
     def is_fully_refunded(self) -> bool : 
         return self.refunded_amount >= self.amount and self.refund_status == "paid"
 
+    # En una transacción: el post_save/post_delete recalcula el BookingLedger
+    # (payments.signals) y pago y saldo se confirman juntos o ninguno
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
     class Meta():
         verbose_name = "Pago"
         verbose_name_plural = "Pagos"
@@ -90,4 +100,38 @@ class RefundLog(models.Model):
         ]
 
     def __str__(self):
-        return f"Pago con id: {self.stripe_refund_id} · {self.amount}"
\ No newline at end of file
+        return f"Pago con id: {self.stripe_refund_id} · {self.amount}"
+
+class BookingLedger(models.Model):
+    """
+    Resumen de los pagos de una reserva, para no agregar Payment en cada lectura.
+
+    Se recalcula desde los pagos en la misma transacción que cada cambio de un
+    Payment (payments.ledger.refresh_ledger); verify_ledgers lo comprueba contra
+    los pagos reales.
+    """
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, primary_key=True, related_name="ledger", verbose_name="Reserva")
+    paid_deposit = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"), verbose_name="Depósito pagado")
+    deposit_refunded = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"), verbose_name="Depósito devuelto")
+    paid_balance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"), verbose_name="Balance pagado")
+    paid_extension = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"), verbose_name="Extensiones pagadas")
+    refunded_total = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"), verbose_name="Total reembolsado")
+    net_due = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"), verbose_name="Pendiente de pago")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Actualizado")
+
+    class Meta:
+        verbose_name = "Saldo de reserva"
+        verbose_name_plural = "Saldos de reservas"
+
+    @property
+    def net_deposit(self):
+        # Depósitos pagados menos lo devuelto de ellos (get_paid_deposit_amount)
+        return self.paid_deposit - self.deposit_refunded
+
+    @property
+    def net_paid(self):
+        # Todo lo cobrado menos los reembolsos completados (compute_balance_due_snapshot)
+        return self.paid_deposit + self.paid_balance + self.paid_extension - self.refunded_total
+
+    def __str__(self):
+        return f"Reserva {self.booking_id} · pendiente {self.net_due}"
@@ -9,6 +9,7 @@ from django.utils.timezone import now
 from datetime import datetime, time, date, timedelta
 from django.shortcuts import get_object_or_404, redirect
 from .models import Payment
+from .ledger import get_ledger
 from django.db.models import Sum
 from properties.models import Property
 from django.db.models import Sum, Q, Value, F
@@ -357,13 +358,9 @@ def get_paid_deposit_amount(booking):
     """
     Suma de depósitos 'paid' (payment_type='deposit') menos lo ya reembolsado.
     Soporta múltiples depósitos (p.ej., top-ups) usando el mismo tipo.
+    Se lee del saldo de la reserva (BookingLedger).
     """
-    deposits = booking.payments.filter(payment_type="deposit", status="paid")
-    paid = deposits.aggregate(s=Sum("amount"))["s"] or Decimal("0.00")
-    refunded = Decimal("0.00")
-    for deposit in deposits.only("id", "amount", "refunded_amount"):
-        refunded += getattr(deposit, "refunded_amount", Decimal("0.00"))
-    return _round(Decimal(paid) - refunded)
+    return _round(get_ledger(booking).net_deposit)
 
 def create_deposit_topup_checkout(booking, request, amount, 
     description="Depósito adicional para el cambio de fechas",*, change_log_id):
@@ -499,11 +496,6 @@ def trigger_refund_for_reduction(booking, amount):
 
 
 def compute_balance_due_snapshot(booking) -> Decimal:
-    agg = Payment.objects.filter(booking=booking).aggregate(
-        dep=Coalesce(Sum("amount", filter=Q(payment_type="deposit", status="paid")), Decimal("0.00")),
-        bal=Coalesce(Sum("amount", filter=Q(payment_type="balance", status="paid")), Decimal("0.00")),
-        ext=Coalesce(Sum("amount", filter=Q(payment_type="extension", status="paid")), Decimal("0.00")),
-        ref=Coalesce(Sum("refunded_amount", filter=Q(refund_status="paid")), Decimal("0.00")),
-    )
-    total_paid_net = agg["dep"] + agg["bal"] + agg["ext"] - agg["ref"]
+    # Con el total en memoria de la reserva (puede estar cambiándose) y lo cobrado según su saldo
+    total_paid_net = get_ledger(booking).net_paid
     return _round(max(booking.total_amount - total_paid_net, Decimal("0.00")))
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .ledger import refresh_ledger
+from .models import Payment
+
+# Campos de Payment que cambian el saldo de la reserva
+LEDGER_PAYMENT_FIELDS = {"booking", "payment_type", "status", "amount", "refunded_amount", "refund_status"}
+
+@receiver(post_save, sender=Payment)
+def update_booking_ledger(sender, instance, created, update_fields=None, **kwargs):
+    # Se recalcula dentro de la transacción de Payment.save(): pago y saldo se confirman juntos
+    if not created and update_fields is not None and not (set(update_fields) & LEDGER_PAYMENT_FIELDS):
+        return
+    refresh_ledger(instance.booking_id)
+
+@receiver(post_delete, sender=Payment)
+def update_booking_ledger_on_delete(sender, instance, **kwargs):
+    refresh_ledger(instance.booking_id, create=False)
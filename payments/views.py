@@ -12,12 +12,14 @@ from django.utils.timezone import make_aware, now, timedelta
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from properties.models import Property
+from properties.utils.quotes import get_quote
 from bookings.models import Booking, BookingChangeLog
 from .models import Payment, RefundLog
+from .ledger import refresh_ledger
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from .services import *
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.db.models import F, Value
 from django.db.models.functions import Coalesce
 from .services import reschedule_balance_charge
@@ -57,7 +59,7 @@ class StartCheckoutView(LoginRequiredMixin, View):
         
         checkin = booking.arrival.date()
         checkout = booking.departure.date()
-        quote = prop.quote_total(checkin, checkout)
+        quote = get_quote(prop, checkin, checkout)
         total = quote["total"]
         deposit = (total * Decimal("0.30")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
         balance = (total - deposit).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
@@ -329,12 +331,13 @@ def stripe_webhook(request):
         except (Booking.DoesNotExist, Payment.DoesNotExist):
             return HttpResponse(status=200)
         
-        payment.stripe_payment_intent_id = pi_id
-        payment.save(update_fields=["stripe_payment_intent_id"])
-        payment = Payment.objects.filter(stripe_payment_intent_id=pi_id).select_related("booking").first()
-        if payment:
-            payment.status = "requires_action"
-            payment.save(update_fields=["status"])
+        with transaction.atomic():
+            payment.stripe_payment_intent_id = pi_id
+            payment.save(update_fields=["stripe_payment_intent_id"])
+            payment = Payment.objects.filter(stripe_payment_intent_id=pi_id).select_related("booking").first()
+            if payment:
+                payment.status = "requires_action"
+                payment.save(update_fields=["status"])
 
     
     elif etype in ("refund.updated", "charge.refunded"):
@@ -386,7 +389,12 @@ def stripe_webhook(request):
             if refund_status == "paid":
                 updates["refunded_amount"] = Coalesce(F("refunded_amount"), Value(Decimal("0.00"))) + amount_mxn
 
-            Payment.objects.filter(pk=payment_id).update(**updates)
+            with transaction.atomic():
+                Payment.objects.filter(pk=payment_id).update(**updates)
+                # update() no dispara señales: actualizar el saldo de la reserva a mano
+                booking_id = Payment.objects.filter(pk=payment_id).values_list("booking_id", flat=True).first()
+                if booking_id:
+                    refresh_ledger(booking_id)
             
             
     return HttpResponse(status=200)
@@ -561,7 +569,10 @@ class RetryBalancePaymentView(LoginRequiredMixin, View):
 
 
 def expire_unpaid_bookings():
+    from properties.utils.occupancy import release_bookings
+
     qs = Booking.objects.filter(status="pending", hold_expires_at__isnull=False, hold_expires_at__lt=now())
+    release_bookings(qs)
     updated = qs.update(status="expired")
     return updated
 
@@ -5,8 +5,12 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django import forms
 from django.forms.widgets import ClearableFileInput
 from django.db.models import Max
+from datetime import date
 
-from .models import Property, PropertyImage
+from .models import CalendarFeed, ExternalBlock, NightlyRate, Property, PropertyImage
+from .utils.external_blocks import clear_external_blocks, update_calendar_summary
+from .utils.feed_metrics import feed_health, get_feed_metrics
+from .utils.rates import invalidate_rate_calendar
 
 # --- 1) Widget múltiple que devuelve LISTA de ficheros ---
 class MultipleFileInput(ClearableFileInput):
@@ -43,10 +47,28 @@ class PropertyImageInline(admin.TabularInline):
             return format_html('<img src="{}" style="height:60px;border-radius:6px;">', obj.image.url)
         return "—"
 
+class CalendarFeedInline(admin.TabularInline):
+    # Calendarios externos adicionales (Booking.com, VRBO, Google...); el de Airbnb
+    # se crea solo a partir de "Calendario iCal de Airbnb"
+    model = CalendarFeed
+    extra = 0
+    fields = ("name", "url", "active", "synced_at", "next_poll_at", "poll_interval", "consecutive_errors")
+    readonly_fields = ("synced_at", "next_poll_at", "poll_interval", "consecutive_errors")
+
+class NightlyRateInline(admin.TabularInline):
+    # Tarifas de noches concretas; el resto de noches usa "Precio por Noche"
+    model = NightlyRate
+    extra = 1
+    fields = ("night", "price")
+
+    def get_queryset(self, request):
+        # Solo las próximas: las pasadas ya no se cotizan
+        return super().get_queryset(request).filter(night__gte=date.today())
+
 @admin.register(Property)
 class PropertyAdmin(admin.ModelAdmin):
-    list_display = ("name", "max_people", "nightly_price", "airbnb_ical_url")
-    inlines = [PropertyImageInline]
+    list_display = ("name", "max_people", "nightly_price", "airbnb_ical_url", "ical_feed_count")
+    inlines = [PropertyImageInline, CalendarFeedInline, NightlyRateInline]
     change_form_template = "admin/properties/property/change_form.html"
     search_fields = ("name", )
 
@@ -90,4 +112,111 @@ class PropertyAdmin(admin.ModelAdmin):
 
         ctx = dict(self.admin_site.each_context(request),
                    form=form, original=prop, opts=self.model._meta)
-        return render(request, "admin/properties/property/bulk_upload.html", ctx)
\ No newline at end of file
+        return render(request, "admin/properties/property/bulk_upload.html", ctx)
+
+
+@admin.register(CalendarFeed)
+class CalendarFeedAdmin(admin.ModelAdmin):
+    # Salud de cada calendario externo: métricas de las últimas descargas (caché)
+    # y estado de la sincronización, los más lentos o atrasados a la vista
+    list_display = ("__str__", "property", "active", "health", "latency", "last_status", "size_kb",
+                    "parse_time", "events", "hit_ratio", "last_success", "synced_at",
+                    "consecutive_errors", "next_poll_at")
+    list_filter = ("active", "property")
+    list_select_related = ("property",)
+    search_fields = ("name", "url", "property__name")
+    readonly_fields = ("synced_at", "next_poll_at", "poll_interval", "last_changed_at", "consecutive_errors")
+
+    HEALTH_COLORS = {"stale": "#b91c1c", "error": "#b91c1c", "slow": "#b45309", "ok": "#15803d"}
+
+    def get_changelist_instance(self, request):
+        # Las métricas de toda la página con una sola lectura de caché
+        changelist = super().get_changelist_instance(request)
+        feeds = list(changelist.result_list)
+        metrics = get_feed_metrics(feed.url for feed in feeds)
+        for feed in feeds:
+            feed._feed_metrics = metrics.get(feed.url)
+        return changelist
+
+    def delete_queryset(self, request, queryset):
+        # El borrado en lote no pasa por CalendarFeed.delete()
+        feeds = list(queryset.values_list("id", "property_id"))
+        clear_external_blocks([feed_id for feed_id, _ in feeds])
+        super().delete_queryset(request, queryset)
+        for property_id in {property_id for _, property_id in feeds}:
+            update_calendar_summary(property_id)
+
+    def _metrics(self, obj):
+        if not hasattr(obj, "_feed_metrics"):
+            obj._feed_metrics = get_feed_metrics([obj.url]).get(obj.url)
+        return obj._feed_metrics
+
+    def _last(self, obj, field):
+        metrics = self._metrics(obj)
+        value = metrics["last"][field] if metrics and metrics["last"] else None
+        return "—" if value is None else value
+
+    @admin.display(description="Estado")
+    def health(self, obj):
+        state = feed_health(obj, self._metrics(obj))
+        return format_html('<strong style="color:{}">{}</strong>', self.HEALTH_COLORS[state], state)
+
+    @admin.display(description="Latencia p50 / máx (ms)")
+    def latency(self, obj):
+        metrics = self._metrics(obj)
+        if not metrics or metrics["latency_p50_ms"] is None:
+            return "—"
+        return f"{metrics['latency_p50_ms']:.0f} / {metrics['latency_max_ms']:.0f}"
+
+    @admin.display(description="HTTP")
+    def last_status(self, obj):
+        return self._last(obj, "status")
+
+    @admin.display(description="KB")
+    def size_kb(self, obj):
+        size = self._last(obj, "bytes")
+        return size if size == "—" else f"{size / 1024:.1f}"
+
+    @admin.display(description="Parseo (ms)")
+    def parse_time(self, obj):
+        return self._last(obj, "parse_ms")
+
+    @admin.display(description="Eventos")
+    def events(self, obj):
+        return self._last(obj, "events")
+
+    @admin.display(description="Aciertos de caché")
+    def hit_ratio(self, obj):
+        metrics = self._metrics(obj)
+        return "—" if not metrics else f"{metrics['hit_ratio']:.0%}"
+
+    @admin.display(description="Última descarga correcta")
+    def last_success(self, obj):
+        metrics = self._metrics(obj)
+        return (metrics and metrics["last_success"]) or "—"
+
+
+@admin.register(NightlyRate)
+class NightlyRateAdmin(admin.ModelAdmin):
+    list_display = ("property", "night", "price")
+    list_filter = ("property",)
+    date_hierarchy = "night"
+
+    def delete_queryset(self, request, queryset):
+        # El borrado en lote no pasa por NightlyRate.delete()
+        property_ids = set(queryset.values_list("property_id", flat=True))
+        super().delete_queryset(request, queryset)
+        for property_id in property_ids:
+            invalidate_rate_calendar(property_id)
+
+
+@admin.register(ExternalBlock)
+class ExternalBlockAdmin(admin.ModelAdmin):
+    # Solo lectura: los bloqueos los escribe la sincronización de calendarios
+    list_display = ("property", "feed", "start", "end", "uid", "updated_at")
+    list_filter = ("property", "feed")
+    date_hierarchy = "start"
+    readonly_fields = ("property", "feed", "uid", "start", "end", "updated_at")
+
+    def has_add_permission(self, request):
+        return False
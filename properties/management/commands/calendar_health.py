@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand
+from properties.utils.feed_metrics import feed_health_report
+
+
+def _fmt(value, suffix=""):
+    return "—" if value is None else f"{value:.0f}{suffix}"
+
+
+class Command(BaseCommand):
+    help = "Informe de salud de los calendarios externos: latencia, tamaño, errores y última sincronización"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--problems", action="store_true", help="Mostrar solo los feeds que no están 'ok'")
+        parser.add_argument("--json", action="store_true", help="Salida en JSON (una entrada por feed)")
+
+    def handle(self, *args, **options):
+        rows = feed_health_report()
+        if options["problems"]:
+            rows = [row for row in rows if row["health"] != "ok"]
+
+        if options["json"]:
+            self.stdout.write(json.dumps([self._as_dict(row) for row in rows], default=str, indent=2))
+            return
+
+        if not rows:
+            self.stdout.write(self.style.SUCCESS("No hay calendarios que mostrar."))
+            return
+
+        styles = {"stale": self.style.ERROR, "error": self.style.ERROR, "slow": self.style.WARNING, "ok": self.style.SUCCESS}
+        self.stdout.write(
+            f"{'estado':<7} {'feed':>5}  {'propiedad / calendario':<40} {'p50':>7} {'máx':>7} "
+            f"{'KB':>6} {'parseo':>7} {'eventos':>7} {'HTTP':>5} {'hit':>5} {'errores':>7}  última sincronización"
+        )
+        for row in rows:
+            feed, metrics = row["feed"], row["metrics"] or {}
+            last = metrics.get("last") or {}
+            bytes_read = last.get("bytes")
+            hit_ratio = metrics.get("hit_ratio")
+            line = (
+                f"{row['health']:<7} {feed.pk:>5}  {f'{feed.property.name} / {feed}'[:40]:<40} "
+                f"{_fmt(metrics.get('latency_p50_ms'), 'ms'):>7} {_fmt(metrics.get('latency_max_ms'), 'ms'):>7} "
+                f"{_fmt(bytes_read / 1024 if bytes_read is not None else None):>6} "
+                f"{_fmt(last.get('parse_ms'), 'ms'):>7} {_fmt(last.get('events')):>7} "
+                f"{last.get('status') or '—':>5} {_fmt(hit_ratio * 100 if hit_ratio is not None else None, '%'):>5} "
+                f"{feed.consecutive_errors:>7}  {feed.synced_at or 'nunca'}"
+            )
+            self.stdout.write(styles[row["health"]](line))
+
+    def _as_dict(self, row):
+        feed = row["feed"]
+        return {
+            "feed_id": feed.pk,
+            "property_id": feed.property_id,
+            "property": feed.property.name,
+            "name": str(feed),
+            "health": row["health"],
+            "synced_at": feed.synced_at,
+            "next_poll_at": feed.next_poll_at,
+            "poll_interval": feed.poll_interval,
+            "consecutive_errors": feed.consecutive_errors,
+            "metrics": row["metrics"],
+        }
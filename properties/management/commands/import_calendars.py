@@ -1,28 +1,131 @@
-import requests
-from django.core.management.base import BaseCommand
-from properties.models import Property
-from properties.utils.ical import get_blocked_dates  # Asegúrate de tener esta función implementada
+import json
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from properties.models import CalendarFeed, ExternalBlock
+from properties.utils.external_blocks import merge_ranges, sync_external_blocks
+from properties.utils.ical import fetch_ical_bookings_concurrently, fetch_ical_events
+
 
 class Command(BaseCommand):
-    help = 'Importa y parsea los calendarios .ics de cada propiedad'
+    help = (
+        "Descarga en paralelo los calendarios .ics de las propiedades y muestra sus bloqueos. "
+        "Sale con código 1 si algún calendario falla (apto para cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--property", type=int, action="append", dest="properties", default=None,
+                            help="ID de la propiedad (se puede repetir; por defecto, todas)")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Descargas simultáneas en total (por defecto, ICAL_SYNC_MAX_WORKERS). "
+                                 "Contra un mismo host no pasan de --per-host: si casi todos los "
+                                 "calendarios son de Airbnb, sube también ese límite")
+        parser.add_argument("--per-host", type=int, default=None, dest="per_host",
+                            help="Descargas simultáneas contra un mismo host (por defecto, "
+                                 "ICAL_SYNC_PER_HOST_LIMIT). Por encima de ICAL_HTTP_POOL_MAXSIZE "
+                                 "las conexiones sobrantes no se reutilizan")
+        parser.add_argument("--diff", action="store_true",
+                            help="Mostrar solo los bloqueos añadidos o eliminados respecto a los guardados")
+        parser.add_argument("--save", action="store_true",
+                            help="Guardar los bloqueos descargados (como la sincronización de Celery)")
+        parser.add_argument("--json", action="store_true", help="Salida en JSON")
 
     def handle(self, *args, **options):
-        props = Property.objects.exclude(airbnb_ical_url__isnull=True).exclude(airbnb_ical_url__exact="")
-        if not props.exists():
-            self.stdout.write(self.style.WARNING("No hay propiedades con calendar_url configurado."))
+        feeds = CalendarFeed.objects.filter(active=True).select_related("property").order_by("property_id", "id")
+        if options["properties"]:
+            feeds = feeds.filter(property_id__in=options["properties"])
+        feeds = list(feeds)
+        if not feeds:
+            if options["json"]:
+                self.stdout.write(json.dumps({"feeds": [], "errors": 0, "elapsed_s": 0}))
+            else:
+                self.stdout.write(self.style.WARNING("No hay propiedades con calendar_url configurado."))
             return
 
-        for prop in props:
-            self.stdout.write(self.style.NOTICE(f"\nProcesando propiedad: {prop.name}"))
-            try:
-                blocked = get_blocked_dates(prop.airbnb_ical_url)
-
-                if blocked:
-                    self.stdout.write(self.style.SUCCESS(f"Fechas bloqueadas encontradas: {len(blocked)}"))
-                    for b in blocked:
-                        self.stdout.write(f" - {b}")
-                else:
-                    self.stdout.write(self.style.WARNING("No se encontraron fechas bloqueadas."))
-            
-            except Exception as e:
-                self.stderr.write(self.style.ERROR(f"Error procesando {prop.name}: {str(e)}"))
+        started = time.perf_counter()
+        results = fetch_ical_bookings_concurrently(
+            ((feed.id, feed.url) for feed in feeds),
+            fetch=partial(fetch_ical_events, force_refresh=True),
+            max_workers=options["workers"],
+            per_host_limit=options["per_host"],
+        )
+        # Bloqueos guardados de todos los feeds, en una sola consulta
+        stored = {}
+        if options["diff"]:
+            for feed_id, uid, start, end in ExternalBlock.objects.filter(
+                feed_id__in=[feed.id for feed in feeds]
+            ).values_list("feed_id", "uid", "start", "end"):
+                stored.setdefault(feed_id, {})[uid] = (start, end)
+
+        rows = []
+        for feed in feeds:
+            row = {
+                "feed_id": feed.id,
+                "property_id": feed.property_id,
+                "property": feed.property.name,
+                "calendar": str(feed),
+            }
+            outcome = results[feed.id]
+            if isinstance(outcome, Exception):
+                row["error"] = str(outcome) or outcome.__class__.__name__
+                rows.append(row)
+                continue
+
+            merged = merge_ranges((start, end) for _, start, end in outcome)
+            row["events"] = len(outcome)
+            row["nights"] = sum((end - start).days for start, end in merged)
+            if options["diff"]:
+                row["added"], row["removed"] = self._diff(stored.get(feed.id, {}), outcome)
+            if options["save"]:
+                try:
+                    row["saved"] = sync_external_blocks(feed, outcome)
+                except Exception as e:
+                    row["error"] = f"Error guardando bloqueos: {e}"
+            rows.append(row)
+
+        errors = sum("error" in row for row in rows)
+        elapsed = round(time.perf_counter() - started, 2)
+        if options["json"]:
+            self.stdout.write(json.dumps({"feeds": rows, "errors": errors, "elapsed_s": elapsed}, default=str, indent=2))
+        else:
+            for row in rows:
+                self._write_row(row, options["diff"])
+            self.stdout.write(f"\n{len(rows)} calendarios en {elapsed}s, {errors} con error")
+
+        if errors:
+            raise CommandError(f"{errors} de {len(rows)} calendarios con error", returncode=1)
+
+    def _diff(self, stored, events):
+        incoming = {uid[:255]: (start, end) for uid, start, end in events}
+        added, removed = [], []
+        for uid, (start, end) in incoming.items():
+            if stored.get(uid) != (start, end):
+                added.append({"uid": uid, "start": start, "end": end})
+        for uid, (start, end) in stored.items():
+            if incoming.get(uid) != (start, end):
+                removed.append({"uid": uid, "start": start, "end": end})
+        return sorted(added, key=lambda b: b["start"]), sorted(removed, key=lambda b: b["start"])
+
+    def _write_row(self, row, diff):
+        label = f"{row['property']} ({row['calendar']})"
+        if "error" in row:
+            self.stderr.write(self.style.ERROR(f"✗ {label}: {row['error']}"))
+            return
+        if diff:
+            if not row["added"] and not row["removed"]:
+                self.stdout.write(f"= {label}: sin cambios")
+                return
+            self.stdout.write(self.style.NOTICE(f"~ {label}: +{len(row['added'])} / -{len(row['removed'])}"))
+            for block in row["added"]:
+                self.stdout.write(self.style.SUCCESS(f"  + {block['start']} → {block['end']}  {block['uid']}"))
+            for block in row["removed"]:
+                self.stdout.write(self.style.WARNING(f"  - {block['start']} → {block['end']}  {block['uid']}"))
+            return
+        saved = row.get("saved")
+        suffix = (
+            f" · guardado: +{saved['created']} ~{saved['updated']} -{saved['deleted']}" if saved else ""
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {label}: {row['events']} bloqueos, {row['nights']} noches{suffix}"
+        ))
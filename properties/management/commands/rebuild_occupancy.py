@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from properties.utils.occupancy import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de noches ocupadas (OccupiedNight) a partir de las reservas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--property", type=int, default=None, help="ID de la propiedad (por defecto, todas)")
+
+    def handle(self, *args, **options):
+        total = rebuild_occupancy(options["property"])
+        self.stdout.write(self.style.SUCCESS(f"Índice reconstruido: {total} noches ocupadas"))
@@ -0,0 +1,70 @@
+# Generated by Django 5.2 on 2026-10-17 18:38
+
+import django.db.models.deletion
+from datetime import time, timedelta
+from zoneinfo import ZoneInfo
+from django.db import migrations, models
+
+# Copia de properties.utils.occupancy en el momento de esta migración: el
+# rellenado no debe cambiar si esas utilidades cambian después
+BLOCKING_STATUSES = ('confirmed', 'pending')
+MX_TZ = ZoneInfo('America/Mexico_City')
+NIGHT_BOUNDARY = timedelta(hours=12)
+
+
+def stay_nights(arrival, departure):
+    # La noche N va de las 12:00 del día N a las 12:00 del N+1 (hora de México),
+    # redondeando hacia fuera
+    first = (arrival.astimezone(MX_TZ) - NIGHT_BOUNDARY).date()
+    end_dt = departure.astimezone(MX_TZ) - NIGHT_BOUNDARY
+    end = end_dt.date()
+    if end_dt.time() != time(0):
+        end += timedelta(days=1)
+    if end <= first:
+        end = first + timedelta(days=1)
+    return first, end
+
+
+def populate_occupancy(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    OccupiedNight = apps.get_model('properties', 'OccupiedNight')
+    batch = []
+    for b in Booking.objects.filter(status__in=BLOCKING_STATUSES).iterator():
+        first, end = stay_nights(b.arrival, b.departure)
+        expires_at = b.hold_expires_at if b.status == 'pending' else None
+        for i in range((end - first).days):
+            batch.append(OccupiedNight(property_id=b.property_id, booking_id=b.pk,
+                                       night=first + timedelta(days=i), expires_at=expires_at))
+        if len(batch) >= 1000:
+            OccupiedNight.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        OccupiedNight.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0013_add_completed_status'),
+        ('properties', '0003_property_ical_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupiedNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField(verbose_name='Noche')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Expira')),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='occupied_nights', to='bookings.booking', verbose_name='Reserva')),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupied_nights', to='properties.property')),
+            ],
+            options={
+                'verbose_name': 'Noche ocupada',
+                'verbose_name_plural': 'Noches ocupadas',
+                'indexes': [models.Index(fields=['property', 'night'], name='occupancy_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('booking', 'night'), name='occupancy_booking_night_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-17 18:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0013_add_completed_status'),
+        ('properties', '0004_occupiednight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='ical_synced_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última sincronización iCal'),
+        ),
+        migrations.CreateModel(
+            name='ExternalBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_url', models.URLField(max_length=500, verbose_name='Calendario de origen')),
+                ('uid', models.CharField(max_length=255, verbose_name='UID del evento')),
+                ('start', models.DateField(verbose_name='Inicio')),
+                ('end', models.DateField(verbose_name='Fin')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='external_blocks', to='properties.property')),
+            ],
+            options={
+                'verbose_name': 'Bloqueo externo',
+                'verbose_name_plural': 'Bloqueos externos',
+            },
+        ),
+        migrations.AddField(
+            model_name='occupiednight',
+            name='external_block',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='occupied_nights', to='properties.externalblock', verbose_name='Bloqueo externo'),
+        ),
+        migrations.AddConstraint(
+            model_name='occupiednight',
+            constraint=models.UniqueConstraint(fields=('external_block', 'night'), name='occupancy_external_night_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='externalblock',
+            index=models.Index(fields=['property', 'start'], name='external_block_lookup_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='externalblock',
+            constraint=models.UniqueConstraint(fields=('property', 'source_url', 'uid'), name='external_block_uid_uniq'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-17 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0005_externalblock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarFeed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, help_text='Ej.: Airbnb, Booking.com', max_length=100, verbose_name='Nombre')),
+                ('url', models.URLField(max_length=500, verbose_name='URL del calendario iCal')),
+                ('active', models.BooleanField(default=True, verbose_name='Activo')),
+                ('synced_at', models.DateTimeField(blank=True, null=True, verbose_name='Última sincronización')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_feeds', to='properties.property')),
+            ],
+            options={
+                'verbose_name': 'Calendario externo',
+                'verbose_name_plural': 'Calendarios externos',
+                'constraints': [models.UniqueConstraint(fields=('property', 'url'), name='calendar_feed_url_uniq')],
+            },
+        ),
+        migrations.AddField(
+            model_name='property',
+            name='ical_feed_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Calendarios externos'),
+        ),
+        # Con valor por defecto para poder deshacer 0008 (que elimina el campo)
+        migrations.AlterField(
+            model_name='externalblock',
+            name='source_url',
+            field=models.URLField(default='', max_length=500, verbose_name='Calendario de origen'),
+        ),
+        migrations.AddField(
+            model_name='externalblock',
+            name='feed',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='blocks', to='properties.calendarfeed', verbose_name='Calendario de origen'),
+        ),
+    ]
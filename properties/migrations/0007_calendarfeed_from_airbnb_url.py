@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def airbnb_url_to_feed(apps, schema_editor):
+    """Crea un CalendarFeed por cada airbnb_ical_url y le asigna sus bloqueos."""
+    Property = apps.get_model('properties', 'Property')
+    CalendarFeed = apps.get_model('properties', 'CalendarFeed')
+    ExternalBlock = apps.get_model('properties', 'ExternalBlock')
+
+    for prop in Property.objects.exclude(airbnb_ical_url__isnull=True).exclude(airbnb_ical_url=''):
+        feed, _ = CalendarFeed.objects.get_or_create(
+            property_id=prop.pk,
+            url=prop.airbnb_ical_url,
+            defaults={'name': 'Airbnb', 'synced_at': prop.ical_synced_at},
+        )
+        ExternalBlock.objects.filter(property_id=prop.pk, source_url=prop.airbnb_ical_url).update(feed=feed)
+        Property.objects.filter(pk=prop.pk).update(ical_feed_count=1)
+
+    # Bloqueos de calendarios que ya no están configurados
+    ExternalBlock.objects.filter(feed__isnull=True).delete()
+
+
+def feed_to_airbnb_url(apps, schema_editor):
+    ExternalBlock = apps.get_model('properties', 'ExternalBlock')
+
+    for block in ExternalBlock.objects.select_related('feed').iterator():
+        block.source_url = block.feed.url
+        block.save(update_fields=['source_url'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0006_calendarfeed'),
+    ]
+
+    operations = [
+        migrations.RunPython(airbnb_url_to_feed, feed_to_airbnb_url),
+    ]
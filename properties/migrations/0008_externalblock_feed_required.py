@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-17 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0007_calendarfeed_from_airbnb_url'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='externalblock',
+            name='external_block_uid_uniq',
+        ),
+        migrations.RemoveField(
+            model_name='externalblock',
+            name='source_url',
+        ),
+        migrations.AlterField(
+            model_name='externalblock',
+            name='feed',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocks', to='properties.calendarfeed', verbose_name='Calendario de origen'),
+        ),
+        migrations.AddConstraint(
+            model_name='externalblock',
+            constraint=models.UniqueConstraint(fields=('feed', 'uid'), name='external_block_uid_uniq'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-17 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0008_externalblock_feed_required'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendarfeed',
+            name='consecutive_errors',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Errores seguidos'),
+        ),
+        migrations.AddField(
+            model_name='calendarfeed',
+            name='last_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Último cambio detectado'),
+        ),
+        migrations.AddField(
+            model_name='calendarfeed',
+            name='next_poll_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Próxima descarga'),
+        ),
+        migrations.AddField(
+            model_name='calendarfeed',
+            name='poll_interval',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Intervalo de sondeo (s)'),
+        ),
+        migrations.AddIndex(
+            model_name='calendarfeed',
+            index=models.Index(fields=['active', 'next_poll_at'], name='calendar_feed_due_idx'),
+        ),
+    ]
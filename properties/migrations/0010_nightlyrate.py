@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-17 19:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0009_calendarfeed_poll_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NightlyRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField(verbose_name='Noche')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Precio')),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nightly_rates', to='properties.property')),
+            ],
+            options={
+                'verbose_name': 'Tarifa por noche',
+                'verbose_name_plural': 'Tarifas por noche',
+                'ordering': ['night'],
+                'constraints': [models.UniqueConstraint(fields=('property', 'night'), name='nightly_rate_night_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 19:52
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0010_nightlyrate'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='occupiednight',
+            name='expires_at',
+        ),
+    ]
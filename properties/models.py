@@ -13,6 +13,78 @@ logger = logging.getLogger(__name__)
 
 LIMPIEZA = Decimal("100.00")
 TAX_IMPUESTOS = Decimal("0.16")
+MIN_NIGHTS = 2
+MAX_NIGHTS = 365
+
+def _parse_stay(checkin, checkout, cant_personas, *, buffer_nights=0, property_id=None):
+    """
+    Valida fechas, número de noches y personas de una solicitud de estancia.
+
+    Returns:
+        tuple | None: (checkin_dt, checkout_dt, cant_personas) con el buffer aplicado,
+        o None si la solicitud no es válida
+    """
+    # 1. Parsear y validar fechas
+    try:
+        checkin_dt = compose_aware_dt(checkin, hour=15, minute=0)
+        checkout_dt = compose_aware_dt(checkout, hour=12, minute=0)
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.warning(
+            f"Error parseando fechas en is_available: checkin={checkin}, checkout={checkout}, error={e}",
+            extra={'property_id': property_id}
+        )
+        return None
+
+    if not checkin_dt or not checkout_dt:
+        logger.warning(f"Fechas nulas en is_available para propiedad {property_id}")
+        return None
+
+    # 2. Validar que checkout sea después de checkin
+    if checkout_dt <= checkin_dt:
+        logger.debug(f"Checkout debe ser después de checkin: {checkin_dt} >= {checkout_dt}")
+        return None
+
+    # 3. Validar que no sea en el pasado
+    current_time = now()
+    if checkin_dt < current_time:
+        logger.debug(f"Check-in en el pasado: {checkin_dt} < {current_time}")
+        return None
+
+    # 4. Validar número de noches (mínimo 2, máximo 365)
+    nights = (checkout_dt.date() - checkin_dt.date()).days
+    if nights < MIN_NIGHTS:
+        logger.debug(f"Estancia demasiado corta: {nights} noche(s), mínimo {MIN_NIGHTS}")
+        return None
+    if nights > MAX_NIGHTS:
+        logger.debug(f"Estancia demasiado larga: {nights} días, máximo {MAX_NIGHTS}")
+        return None
+
+    # 5. Validar número de personas (la capacidad se comprueba por propiedad)
+    try:
+        cant_personas_int = int(cant_personas)
+    except (ValueError, TypeError):
+        logger.warning(f"Número de personas inválido: {cant_personas}")
+        return None
+
+    # 6. Aplicar buffer si es necesario
+    if buffer_nights:
+        checkin_dt -= timedelta(days=buffer_nights)
+        checkout_dt += timedelta(days=buffer_nights)
+
+    return checkin_dt, checkout_dt, cant_personas_int
+
+
+class PropertyQuerySet(models.QuerySet):
+
+    def availability_map(self, checkin, checkout, cant_personas):
+        """Devuelve {property_id: bool} para todas las propiedades del queryset."""
+        return bulk_availability(list(self), checkin, checkout, cant_personas)
+
+    def available_between(self, checkin, checkout, cant_personas):
+        """Filtra el queryset a las propiedades disponibles (mismas reglas que is_available)."""
+        availability = self.availability_map(checkin, checkout, cant_personas)
+        return self.filter(id__in=[pid for pid, ok in availability.items() if ok])
+
 
 class Property (models.Model):
     name = models.CharField(verbose_name= "Nombre", max_length=200)
@@ -23,18 +95,55 @@ class Property (models.Model):
     address = models.CharField(max_length= 200, verbose_name="Localización")
     latitude = models.FloatField(blank=True, null= True, verbose_name="Latitud")
     longitude = models.FloatField(blank=True, null= True, verbose_name="Altitud")
-    #Importar calendarios desde Airbnb a esta web
+    objects = PropertyQuerySet.as_manager()
+
+    #Importar calendarios desde Airbnb a esta web (se guarda también como CalendarFeed)
     airbnb_ical_url = models.URLField("Calendario iCal de Airbnb", blank=True, null=True)
+    #Resumen de sus CalendarFeed activos, para decidir la disponibilidad sin consultarlos:
+    #cuántos hay y la sincronización correcta más antigua (None si alguno nunca se sincronizó)
+    ical_feed_count = models.PositiveSmallIntegerField("Calendarios externos", default=0, editable=False)
+    ical_synced_at = models.DateTimeField("Última sincronización iCal", blank=True, null=True)
     #Exportar calendarios desde esta web a Airbnb 
     ical_token = models.CharField(max_length=100, blank=True, null=True, unique=True)
     #Cada vez que llame a save(ya sea desde el admin, desde scripts, views, forms...)se ejecutará la 
     # función automáticamente y se creará un "ical_token" para la nueva propiedad añadida.
     #SI no lo hiciese así y simplemente creara una función que hiciese lo mismo, tendría que llamarla 
     # yo manualmente cada vez que crease una nueva propiedad
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Para detectar en save() si cambió la URL de Airbnb
+        instance._loaded_airbnb_ical_url = instance.__dict__.get("airbnb_ical_url")
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.ical_token:
             self.ical_token = secrets.token_urlsafe(48)
         super().save(*args, **kwargs)
+        from properties.utils.occupancy import bump_availability_version
+        from properties.utils.quotes import bump_pricing_version
+
+        self._sync_airbnb_feed()
+        # El nombre aparece en el .ics exportado
+        bump_availability_version(self.pk)
+        # nightly_price pudo cambiar: descartar las cotizaciones memorizadas
+        bump_pricing_version(self.pk)
+
+    def _sync_airbnb_feed(self):
+        """Mantiene un CalendarFeed con la URL de airbnb_ical_url."""
+        from properties.utils.external_blocks import update_calendar_summary
+
+        previous = getattr(self, "_loaded_airbnb_ical_url", None)
+        current = self.airbnb_ical_url or None
+        if "airbnb_ical_url" not in self.__dict__ or previous == current:
+            return
+        if previous:
+            for feed in self.calendar_feeds.filter(url=previous):
+                feed.delete()
+        if current:
+            CalendarFeed.objects.get_or_create(property=self, url=current, defaults={"name": "Airbnb"})
+        self._loaded_airbnb_ical_url = current
+        update_calendar_summary(self.pk, property_obj=self)
 
 
     def is_available(self, checkin, checkout, cant_personas, *, exclude_booking_id=None, buffer_nights=0):
@@ -45,8 +154,9 @@ class Property (models.Model):
         1. Validación de fechas (formato, orden, no en el pasado)
         2. Validación de número de noches (2-365)
         3. Validación de capacidad
-        4. Verificación contra calendarios externos (Airbnb, Booking.com)
-        5. Verificación contra reservas locales confirmadas/pendientes
+        4. El calendario externo (si hay) está sincronizado (fail-safe si no)
+        5. Verificación contra reservas locales confirmadas/pendientes y bloqueos
+           externos importados (índice OccupiedNight: una consulta indexada por noches)
 
         Args:
             checkin: Fecha de check-in (str, date, o datetime)
@@ -61,112 +171,63 @@ class Property (models.Model):
         Note:
             Por seguridad, si falla la verificación del calendario externo,
             la propiedad se considera NO disponible (fail-safe).
+            Para evaluar muchas propiedades a la vez usar bulk_availability().
         """
-        # 1. Parsear y validar fechas
-        try:
-            checkin_dt = compose_aware_dt(checkin, hour=15, minute=0)
-            checkout_dt = compose_aware_dt(checkout, hour=12, minute=0)
-        except (ValueError, TypeError, AttributeError) as e:
-            logger.warning(
-                f"Error parseando fechas en is_available: checkin={checkin}, checkout={checkout}, error={e}",
-                extra={'property_id': self.id}
-            )
+        # 1-5. Parsear y validar fechas, noches y número de personas
+        stay = _parse_stay(checkin, checkout, cant_personas, buffer_nights=buffer_nights, property_id=self.id)
+        if stay is None:
             return False
+        checkin_dt, checkout_dt, cant_personas_int = stay
 
-        if not checkin_dt or not checkout_dt:
-            logger.warning(f"Fechas nulas en is_available para propiedad {self.id}")
+        if self.max_people < cant_personas_int:
+            logger.debug(f"Excede capacidad: {cant_personas_int} personas, máximo {self.max_people}")
             return False
 
-        # 2. Validar que checkout sea después de checkin
-        if checkout_dt <= checkin_dt:
-            logger.debug(f"Checkout debe ser después de checkin: {checkin_dt} >= {checkout_dt}")
+        # 7. El calendario externo (Airbnb, Booking.com, etc.) debe estar sincronizado
+        if self._external_calendar_unusable():
             return False
 
-        # 3. Validar que no sea en el pasado
-        current_time = now()
-        if checkin_dt < current_time:
-            logger.debug(f"Check-in en el pasado: {checkin_dt} < {current_time}")
-            return False
+        # 8. Verificar conflictos con reservas existentes y bloqueos externos (índice por noche)
+        # Solo contiene reservas "confirmed" o "pending" y ExternalBlock; los holds vencidos los
+        # retira bookings.tasks.mark_expired_holds (cada HOLD_EXPIRY_POLL_SECONDS)
+        from properties.utils.occupancy import nights_occupied
 
-        # 4. Validar número de noches (mínimo 2, máximo 365)
-        nights = (checkout_dt.date() - checkin_dt.date()).days
-        if nights < 2:
-            logger.debug(f"Estancia demasiado corta: {nights} noche(s), mínimo 2")
-            return False
-        if nights > 365:
-            logger.debug(f"Estancia demasiado larga: {nights} días, máximo 365")
+        if nights_occupied(self.id, checkin_dt, checkout_dt, exclude_booking_id=exclude_booking_id):
+            logger.debug(
+                f"Conflicto con reservas o bloqueos externos en propiedad {self.id}: "
+                f"noches de [{checkin_dt}, {checkout_dt}] ocupadas"
+            )
             return False
 
-        # 5. Validar capacidad
-        try:
-            cant_personas_int = int(cant_personas)
-        except (ValueError, TypeError):
-            logger.warning(f"Número de personas inválido: {cant_personas}")
-            return False
+        return True
 
-        if self.max_people < cant_personas_int:
-            logger.debug(f"Excede capacidad: {cant_personas_int} personas, máximo {self.max_people}")
+    def _external_calendar_unusable(self):
+        """
+        Indica si el calendario externo no es fiable para decidir disponibilidad.
+
+        Los bloqueos externos ya están en ExternalBlock/OccupiedNight; aquí solo se
+        comprueba la antigüedad de la última sincronización (sin HTTP). Si se superó
+        el TTL duro o nunca se sincronizó, la propiedad NO está disponible (fail-safe).
+
+        Returns:
+            bool: True si el calendario no se puede usar
+        """
+        if not self.ical_feed_count:
             return False
 
-        # 6. Aplicar buffer si es necesario
-        if buffer_nights:
-            checkin_dt -= timedelta(days=buffer_nights)
-            checkout_dt += timedelta(days=buffer_nights)
-
-        # 7. Verificar conflictos con calendarios externos (Airbnb, Booking.com, etc.)
-        if self.airbnb_ical_url:
-            try:
-                from properties.utils.ical import fetch_ical_bookings
-                blocked_ranges = fetch_ical_bookings(self.airbnb_ical_url)
-                checkin_date = checkin_dt.date()
-                checkout_date = checkout_dt.date()
-
-                for start, end in blocked_ranges:
-                    # Verificar solapamiento: dos rangos se solapan si start1 < end2 AND start2 < end1
-                    if start < checkout_date and end > checkin_date:
-                        logger.info(
-                            f"Reserva rechazada por calendario externo para propiedad {self.id} '{self.name}': "
-                            f"rango bloqueado [{start}, {end}] solapa con solicitud [{checkin_date}, {checkout_date}]"
-                        )
-                        return False
-            except ValueError as e:
-                # Error de validación (host no permitido, timeout, etc.)
-                logger.warning(
-                    f"Error de validación al verificar calendario externo para propiedad {self.id}: {e}",
-                    extra={'property_id': self.id, 'ical_url': self.airbnb_ical_url[:100]}
-                )
-                # Por seguridad, si falla la validación, NO permitir la reserva
-                return False
-            except Exception as e:
-                # Error inesperado
-                logger.error(
-                    f"Error inesperado al verificar calendario externo para propiedad {self.id}: {e}",
-                    exc_info=True,
-                    extra={'property_id': self.id, 'ical_url': self.airbnb_ical_url[:100]}
-                )
-                # Por seguridad, si falla el fetch, NO permitir la reserva
-                return False
-
-        # 8. Verificar conflictos con reservas existentes
-        # Solo consideramos reservas "confirmed" o "pending" (no "expired" ni "cancelled")
-        qs = self.bookings.filter(status__in=["confirmed", "pending"])
-        # Excluir reservas pendientes con hold expirado
-        qs = qs.exclude(status="pending", hold_expires_at__lt=current_time)
-        # Excluir reservas confirmadas que ya pasaron (doble seguridad)
-        qs = qs.exclude(status="confirmed", departure__lt=current_time)
-
-        if exclude_booking_id:
-            qs = qs.exclude(id=exclude_booking_id)
-
-        for booking in qs:
-            if (booking.arrival < checkout_dt) and (booking.departure > checkin_dt):
-                logger.debug(
-                    f"Conflicto con reserva {booking.id}: "
-                    f"[{booking.arrival}, {booking.departure}] solapa con [{checkin_dt}, {checkout_dt}]"
-                )
-                return False
+        from properties.utils.ical import check_calendar_freshness
 
-        return True
+        if check_calendar_freshness(self.id, self.ical_synced_at) == 'expired':
+            self._warn_calendar_unusable()
+            return True
+        return False
+
+    def _warn_calendar_unusable(self):
+        logger.warning(
+            f"Calendario externo sin sincronizar para propiedad {self.id} '{self.name}' "
+            f"(última sincronización: {self.ical_synced_at}); no disponible por seguridad",
+            extra={'property_id': self.id, 'feeds': self.ical_feed_count}
+        )
     
     def _to_date(self, value):
         if isinstance(value, date) and not isinstance(value, datetime):
@@ -190,14 +251,13 @@ class Property (models.Model):
         if days <= 0:
             raise ValueError("Fechas mal configuradas")
 
-        nightly = self.nightly_price
-        if not nightly:
-            raise ValueError("Faltan tarifas por configurar")
-        
+        # Tarifa por defecto más las tarifas por noche (NightlyRate), con sumas prefijas
+        from properties.utils.rates import stay_subtotal
+
+        subtotal_base, has_rates = stay_subtotal(self, checkin, checkout)
+        nightly = (subtotal_base / days).quantize(Decimal("0.01")) if has_rates else self.nightly_price
 
-        
         info = {}
-        subtotal_base = (nightly * days).quantize(Decimal("0.01"))
 
         if days >= 30:
             discount_rate = Decimal("0.20")
@@ -231,31 +291,16 @@ class Property (models.Model):
     def get_blocked_ranges(self):
         """
             Devuelve una lista de tuplas (start_date, end_date) con las fechas bloqueadas
-            según el calendario iCal de Airbnb.
+            según los calendarios externos (bloqueos importados en ExternalBlock), ya
+            fusionadas: ordenadas y sin solapes ni rangos contiguos entre feeds.
         """
-        from properties.utils.ical import get_blocked_dates
-
-        if not self.airbnb_ical_url:
-            return []
-        
-        try:
-            return get_blocked_dates(self.airbnb_ical_url)
-        except ValueError as e:
-            # Error de validación (host no permitido, timeout, etc.)
-            logger.warning(
-                f"Error de validación al obtener bloqueos iCal para propiedad '{self.name}' (ID: {self.id}): {e}",
-                extra={'property_id': self.id, 'ical_url': self.airbnb_ical_url[:100]}
-            )
-            return []
-        except Exception as e:
-            # Error inesperado
-            logger.error(
-                f"Error inesperado al obtener bloqueos iCal para propiedad '{self.name}' (ID: {self.id}): {e}",
-                exc_info=True,
-                extra={'property_id': self.id, 'ical_url': self.airbnb_ical_url[:100]}
-            )
+        if not self.ical_feed_count:
             return []
 
+        from properties.utils.external_blocks import merge_ranges
+
+        return merge_ranges(self.external_blocks.order_by("start").values_list("start", "end"))
+
         
 
     
@@ -267,6 +312,54 @@ class Property (models.Model):
     def __str__(self):
         return self.name
 
+def bulk_availability(properties, checkin, checkout, cant_personas):
+    """
+    Evalúa la disponibilidad de muchas propiedades a la vez.
+
+    Da las mismas respuestas que Property.is_available, pero resuelve todo el catálogo
+    con una sola consulta al índice de ocupación (reservas locales y bloqueos externos);
+    la frescura de los calendarios externos se decide con ical_feed_count e
+    ical_synced_at, ya cargados, y check_calendars_freshness (un incremento de
+    contador por estado y, si hay calendarios caducados, un cache.get_many).
+
+    Args:
+        properties: iterable de instancias de Property
+        checkin, checkout, cant_personas: igual que en is_available
+
+    Returns:
+        dict: {property_id: bool}
+    """
+    from properties.utils.ical import check_calendars_freshness
+    from properties.utils.occupancy import occupied_property_ids
+
+    properties = list(properties)
+    result = {p.id: False for p in properties}
+    if not properties:
+        return result
+
+    stay = _parse_stay(checkin, checkout, cant_personas)
+    if stay is None:
+        return result
+    checkin_dt, checkout_dt, cant_personas_int = stay
+
+    candidates = [p for p in properties if p.max_people >= cant_personas_int]
+    if not candidates:
+        return result
+
+    # 1 consulta: propiedades con alguna noche ocupada (reservas locales o bloqueos externos)
+    occupied = occupied_property_ids([p.id for p in candidates], checkin_dt, checkout_dt)
+
+    free = [p for p in candidates if p.id not in occupied]
+    freshness = check_calendars_freshness({p.id: p.ical_synced_at for p in free if p.ical_feed_count})
+    for p in free:
+        if freshness.get(p.id) == 'expired':
+            p._warn_calendar_unusable()
+            continue
+        result[p.id] = True
+
+    return result
+
+
 class PropertyImage(models.Model):
     property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="images")
     image = models.ImageField(upload_to="properties", verbose_name="Imagen")
@@ -282,4 +375,159 @@ class PropertyImage(models.Model):
         if self.cover:
             with transaction.atomic():
                 PropertyImage.objects.filter(property_id=self.property_id, cover=True)\
-                                     .exclude(pk=self.pk).update(cover=False)
\ No newline at end of file
+                                     .exclude(pk=self.pk).update(cover=False)
+
+
+class NightlyRate(models.Model):
+    """
+    Tarifa de una noche concreta (fin de semana, temporada alta, festivo...).
+
+    Sustituye a Property.nightly_price esa noche. Para cotizar se leen como sumas
+    prefijas cacheadas (properties.utils.rates), así que guardarlas o borrarlas
+    invalida ese caché; para rangos usar set_nightly_rates().
+    """
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="nightly_rates")
+    night = models.DateField("Noche")
+    price = models.DecimalField("Precio", decimal_places=2, max_digits=10)
+
+    class Meta:
+        verbose_name = "Tarifa por noche"
+        verbose_name_plural = "Tarifas por noche"
+        ordering = ["night"]
+        constraints = [
+            models.UniqueConstraint(fields=["property", "night"], name="nightly_rate_night_uniq"),
+        ]
+
+    def save(self, *args, **kwargs):
+        from properties.utils.rates import invalidate_rate_calendar
+
+        super().save(*args, **kwargs)
+        invalidate_rate_calendar(self.property_id)
+
+    def delete(self, *args, **kwargs):
+        from properties.utils.rates import invalidate_rate_calendar
+
+        result = super().delete(*args, **kwargs)
+        invalidate_rate_calendar(self.property_id)
+        return result
+
+    def __str__(self):
+        return f"{self.property_id} · {self.night}: {self.price}"
+
+
+class CalendarFeed(models.Model):
+    """
+    Calendario externo (iCal) de una propiedad: Airbnb, Booking.com, VRBO, Google Calendar...
+
+    Una propiedad puede tener varios; sus bloqueos (ExternalBlock) se combinan en
+    el índice OccupiedNight. Al guardarlo o borrarlo se recalcula el resumen de la
+    propiedad (ical_feed_count / ical_synced_at).
+
+    Cada feed tiene su propia frecuencia de sondeo (properties.utils.feed_scheduler):
+    se acorta cuando el calendario cambia y se alarga si no cambia o falla.
+    """
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="calendar_feeds")
+    name = models.CharField("Nombre", max_length=100, blank=True, help_text="Ej.: Airbnb, Booking.com")
+    url = models.URLField("URL del calendario iCal", max_length=500)
+    active = models.BooleanField("Activo", default=True)
+    #Última sincronización correcta (los bloqueos están en ExternalBlock)
+    synced_at = models.DateTimeField("Última sincronización", blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    #Planificación del sondeo (None = pendiente de la primera descarga)
+    next_poll_at = models.DateTimeField("Próxima descarga", blank=True, null=True, editable=False)
+    poll_interval = models.PositiveIntegerField("Intervalo de sondeo (s)", blank=True, null=True, editable=False)
+    last_changed_at = models.DateTimeField("Último cambio detectado", blank=True, null=True, editable=False)
+    consecutive_errors = models.PositiveSmallIntegerField("Errores seguidos", default=0, editable=False)
+
+    class Meta:
+        verbose_name = "Calendario externo"
+        verbose_name_plural = "Calendarios externos"
+        constraints = [
+            models.UniqueConstraint(fields=["property", "url"], name="calendar_feed_url_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["active", "next_poll_at"], name="calendar_feed_due_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from properties.utils.external_blocks import clear_external_blocks, update_calendar_summary
+
+        if not self.active:
+            # Un calendario desactivado deja de bloquear fechas
+            clear_external_blocks([self.pk])
+        update_calendar_summary(self.property_id, property_obj=self._cached_property())
+
+    def delete(self, *args, **kwargs):
+        from properties.utils.external_blocks import clear_external_blocks, update_calendar_summary
+
+        property_id, property_obj = self.property_id, self._cached_property()
+        clear_external_blocks([self.pk])
+        result = super().delete(*args, **kwargs)
+        update_calendar_summary(property_id, property_obj=property_obj)
+        return result
+
+    def _cached_property(self):
+        # La instancia de Property ya cargada (si la hay), para refrescar su resumen en memoria
+        return self.property if CalendarFeed.property.is_cached(self) else None
+
+    def __str__(self):
+        return self.name or self.url
+
+
+class ExternalBlock(models.Model):
+    """
+    Bloqueo importado de un calendario externo (un VEVENT del iCal de Airbnb, etc.).
+
+    La sincronización (properties.utils.external_blocks) compara cada descarga con
+    los bloqueos guardados del mismo feed y solo crea, actualiza o borra lo que cambió.
+    """
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="external_blocks")
+    feed = models.ForeignKey(CalendarFeed, on_delete=models.CASCADE, related_name="blocks",
+                             verbose_name="Calendario de origen")
+    uid = models.CharField("UID del evento", max_length=255)
+    start = models.DateField("Inicio")
+    end = models.DateField("Fin")  # exclusivo, como DTEND en iCal
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Bloqueo externo"
+        verbose_name_plural = "Bloqueos externos"
+        indexes = [
+            models.Index(fields=["property", "start"], name="external_block_lookup_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["feed", "uid"], name="external_block_uid_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.property_id} · {self.start} → {self.end}"
+
+
+class OccupiedNight(models.Model):
+    """
+    Índice de ocupación: una fila por cada noche ocupada por una reserva local
+    (confirmada o pendiente con hold) o por un bloqueo externo importado.
+    Se mantiene desde properties.utils.occupancy.
+    """
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name="occupied_nights")
+    night = models.DateField(verbose_name="Noche")
+    booking = models.ForeignKey("bookings.Booking", on_delete=models.CASCADE, null=True, blank=True,
+                                related_name="occupied_nights", verbose_name="Reserva")
+    external_block = models.ForeignKey(ExternalBlock, on_delete=models.CASCADE, null=True, blank=True,
+                                       related_name="occupied_nights", verbose_name="Bloqueo externo")
+
+    class Meta:
+        verbose_name = "Noche ocupada"
+        verbose_name_plural = "Noches ocupadas"
+        indexes = [
+            # Índice para la consulta de disponibilidad: property + rango de noches
+            models.Index(fields=["property", "night"], name="occupancy_lookup_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["booking", "night"], name="occupancy_booking_night_uniq"),
+            models.UniqueConstraint(fields=["external_block", "night"], name="occupancy_external_night_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.property_id} · {self.night}"
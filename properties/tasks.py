@@ -1,43 +1,114 @@
 # properties/tasks.py
 from celery import shared_task
-from properties.models import Property
-from properties.utils.ical import fetch_ical_bookings
-from django.core.cache import cache
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
+from properties.models import CalendarFeed, Property
+from properties.utils.external_blocks import sync_external_blocks
+from properties.utils.feed_metrics import get_feed_metrics
+from properties.utils.feed_scheduler import busy_property_ids, due_feeds, reschedule_feed
+from properties.utils.ical import (
+    ICAL_CACHE_HARD_TIMEOUT,
+    close_http_session,
+    fetch_ical_bookings_concurrently,
+    fetch_ical_events,
+    get_circuit_breaker_state,
+    get_ical_cache_stats,
+    release_calendar_refresh,
+)
+from django.db.models import Q
+from django.utils import timezone
+from datetime import timedelta
+from functools import partial
+from urllib.parse import urlparse
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+@worker_process_init.connect
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _close_ical_http_session(**kwargs):
+    # Al arrancar un proceso hijo (prefork) no se heredan los sockets del padre;
+    # al apagar el worker se cierran las conexiones keep-alive abiertas
+    close_http_session()
+
+
+def _sync_feeds(feeds, force_refresh, changes=None):
+    """
+    Descarga varios CalendarFeed en paralelo y guarda sus bloqueos.
+
+    Args:
+        changes: dict opcional que se rellena con {feed_id: resumen de
+                 sync_external_blocks()} de los feeds guardados
+
+    Returns:
+        dict: {feed_id: lista de eventos o la excepción producida}
+    """
+    feeds = {feed.id: feed for feed in feeds}
+    results = fetch_ical_bookings_concurrently(
+        ((feed.id, feed.url) for feed in feeds.values()),
+        fetch=partial(fetch_ical_events, force_refresh=force_refresh),
+    )
+    for feed_id, outcome in results.items():
+        if not isinstance(outcome, Exception):
+            try:
+                summary = sync_external_blocks(feeds[feed_id], outcome)
+                if changes is not None:
+                    changes[feed_id] = summary
+            except Exception as e:
+                results[feed_id] = e
+    return results
+
+
+def _open_circuits(urls=None):
+    """
+    Hosts con el circuit breaker abierto (se avisa en el log).
+
+    Args:
+        urls: URLs cuyos hosts consultar (por defecto, las de todos los feeds activos)
+    """
+    if urls is None:
+        urls = CalendarFeed.objects.filter(active=True).values_list('url', flat=True).distinct()
+    breakers = get_circuit_breaker_state(urlparse(url).netloc for url in urls)
+    open_circuits = [host for host, state in breakers.items() if state['open']]
+    if open_circuits:
+        logger.warning(f"Circuit breaker abierto para: {', '.join(open_circuits)}")
+    return open_circuits
+
+
 @shared_task
 def sync_all_property_calendars():
     """
-    Sincroniza los calendarios iCal de todas las propiedades con URLs configuradas.
+    Sincroniza todos los calendarios externos activos (CalendarFeed).
 
-    Esta tarea se ejecuta periódicamente (cada 30 minutos) para:
-    1. Mantener el caché de calendarios siempre actualizado (warm cache)
-    2. Garantizar que los usuarios siempre obtengan respuestas instantáneas
-    3. Evitar que el primer usuario después de expiración espere la petición HTTP
+    Ya no está en CELERY_BEAT_SCHEDULE (el sondeo periódico lo hace
+    sync_due_calendars): sirve para forzar a mano una sincronización completa,
+    p.ej. tras un corte del proveedor o al dar de alta muchos calendarios.
 
     Proceso:
-    - Obtiene todas las propiedades con airbnb_ical_url configurado
-    - Para cada una, llama a fetch_ical_bookings() que:
-      * Actualiza el caché si ya existe
-      * Carga el caché si no existe
-    - Registra estadísticas de éxito/errores
+    - Obtiene todos los feeds activos (una propiedad puede tener varios)
+    - Los descarga en paralelo con fetch_ical_bookings_concurrently() (pool de
+      ICAL_SYNC_MAX_WORKERS hilos, ICAL_SYNC_PER_HOST_LIMIT por host y plazo
+      global ICAL_SYNC_DEADLINE) en modo force_refresh: siempre se descarga, aunque
+      el caché siga fresco, y el valor se sustituye de una vez al terminar
+    - Guarda los eventos de cada feed en ExternalBlock (solo las diferencias)
+    - Registra estadísticas de éxito/errores y los hosts con el circuit breaker
+      abierto (sus feeds fallan sin esperar al timeout)
 
     Returns:
-        dict: Resumen de la sincronización con estadísticas
+        dict: Resumen de la sincronización con estadísticas (por feed)
     """
     logger.info("=" * 70)
     logger.info("Iniciando sincronización automática de calendarios iCal")
     logger.info("=" * 70)
 
-    # Obtener propiedades con calendario configurado
-    properties_with_ical = Property.objects.filter(
-        airbnb_ical_url__isnull=False
-    ).exclude(airbnb_ical_url='')
+    feeds = list(
+        CalendarFeed.objects.filter(active=True).select_related("property").only(
+            "id", "name", "url", "property_id", "property__id", "property__name"
+        )
+    )
 
-    total = properties_with_ical.count()
+    total = len(feeds)
     success = 0
     errors = 0
     total_bookings = 0
@@ -49,37 +120,49 @@ def sync_all_property_calendars():
             'success': 0,
             'errors': 0,
             'total_bookings': 0,
+            'open_circuits': [],
             'message': 'No properties with iCal configured'
         }
 
-    logger.info(f"Sincronizando {total} propiedades con calendarios iCal...")
-
-    for prop in properties_with_ical:
-        try:
-            logger.info(f"Sincronizando '{prop.name}' (ID: {prop.id})...")
-
-            # fetch_ical_bookings automáticamente usa y actualiza el caché
-            bookings = fetch_ical_bookings(prop.airbnb_ical_url)
+    logger.info(f"Sincronizando {total} calendarios iCal...")
 
-            logger.info(
-                f"✅ Calendario sincronizado para '{prop.name}': "
-                f"{len(bookings)} reservas bloqueadas"
-            )
+    # Descarga concurrente (pool acotado, límite por host y plazo global)
+    results = _sync_feeds(feeds, force_refresh=True)
+    metrics = get_feed_metrics(feed.url for feed in feeds)
 
-            success += 1
-            total_bookings += len(bookings)
+    for feed in feeds:
+        outcome = results[feed.id]
+        prop = feed.property
+        last = (metrics.get(feed.url) or {}).get('last') or {}
+        feed_extra = {
+            'property_id': prop.id,
+            'feed_id': feed.id,
+            'http_status': last.get('status'),
+            'latency_ms': last.get('latency_ms'),
+            'bytes': last.get('bytes'),
+            'parse_ms': last.get('parse_ms'),
+        }
 
-        except Exception as e:
+        if isinstance(outcome, Exception):
             logger.error(
-                f"❌ Error sincronizando calendario de '{prop.name}' (ID: {prop.id}): {e}",
-                exc_info=True,
+                f"❌ Error sincronizando calendario '{feed}' de '{prop.name}' (ID: {prop.id}): {outcome}",
+                exc_info=outcome,
                 extra={
-                    'property_id': prop.id,
+                    **feed_extra,
                     'property_name': prop.name,
-                    'ical_url': prop.airbnb_ical_url[:100] if prop.airbnb_ical_url else None
+                    'ical_url': feed.url[:100]
                 }
             )
             errors += 1
+            continue
+
+        logger.info(
+            f"✅ Calendario '{feed}' sincronizado para '{prop.name}': "
+            f"{len(outcome)} reservas bloqueadas",
+            extra={**feed_extra, 'events': len(outcome)},
+        )
+        success += 1
+        total_bookings += len(outcome)
 
     # Log de resumen
     logger.info("=" * 70)
@@ -87,6 +170,13 @@ def sync_all_property_calendars():
         f"Sincronización completada: {success}/{total} exitosas, {errors} errores, "
         f"{total_bookings} reservas totales"
     )
+    stats = get_ical_cache_stats()
+    logger.info(
+        f"Caché iCal acumulado: vistas {stats['request_hit']} hit / {stats['request_stale']} stale / "
+        f"{stats['request_miss']} miss; descargas {stats['fetch_http']}, "
+        f"{stats['fetch_short_circuit']} rechazadas por circuit breaker"
+    )
+    open_circuits = _open_circuits(feed.url for feed in feeds)
     logger.info("=" * 70)
 
     result = {
@@ -94,16 +184,72 @@ def sync_all_property_calendars():
         'success': success,
         'errors': errors,
         'total_bookings': total_bookings,
+        'open_circuits': open_circuits,
         'message': f'{success}/{total} calendars synced successfully'
     }
 
     return result
 
 
+@shared_task
+def sync_due_calendars():
+    """
+    Descarga solo los calendarios cuya próxima descarga ya venció.
+
+    Se ejecuta en cada tick de Celery Beat (cada 5 minutos). Cada feed tiene su
+    propio intervalo (ver properties.utils.feed_scheduler): se acorta si el
+    calendario cambió, se alarga si no cambió y retrocede si falló. Las
+    propiedades con la mayoría de sus próximas noches ocupadas van primero.
+
+    Al ser la única tarea periódica de calendarios, informa además de los hosts
+    de los feeds activos con el circuit breaker abierto, haya o no feeds vencidos.
+
+    Returns:
+        dict: {'due', 'success', 'errors', 'changed', 'open_circuits'}
+    """
+    feeds, busy = due_feeds()
+    if not feeds:
+        return {'due': 0, 'success': 0, 'errors': 0, 'changed': 0, 'open_circuits': _open_circuits()}
+
+    changes = {}
+    results = _sync_feeds(feeds, force_refresh=True, changes=changes)
+
+    success = errors = changed = 0
+    for feed in feeds:
+        outcome = results[feed.id]
+        failed = isinstance(outcome, Exception)
+        summary = changes.get(feed.id, {})
+        feed_changed = bool(summary.get('created') or summary.get('updated') or summary.get('deleted'))
+        next_poll_at = reschedule_feed(
+            feed, changed=feed_changed, failed=failed, busy=feed.property_id in busy,
+        )
+        if failed:
+            errors += 1
+            logger.warning(
+                f"❌ Error sincronizando calendario '{feed}' de '{feed.property.name}': {outcome} "
+                f"(errores seguidos: {feed.consecutive_errors}, reintento {next_poll_at:%H:%M})"
+            )
+        else:
+            success += 1
+            changed += feed_changed
+
+    logger.info(
+        f"Sondeo de calendarios: {len(feeds)} vencidos, {success} correctos "
+        f"({changed} con cambios), {errors} errores"
+    )
+    return {
+        'due': len(feeds),
+        'success': success,
+        'errors': errors,
+        'changed': changed,
+        'open_circuits': _open_circuits(),
+    }
+
+
 @shared_task
 def sync_single_property_calendar(property_id):
     """
-    Sincroniza el calendario iCal de una propiedad específica.
+    Sincroniza los calendarios iCal de una propiedad específica.
 
     Útil para sincronización manual o bajo demanda.
 
@@ -115,8 +261,9 @@ def sync_single_property_calendar(property_id):
     """
     try:
         prop = Property.objects.get(id=property_id)
+        feeds = list(prop.calendar_feeds.filter(active=True))
 
-        if not prop.airbnb_ical_url:
+        if not feeds:
             logger.warning(
                 f"Propiedad '{prop.name}' (ID: {property_id}) no tiene calendario iCal configurado"
             )
@@ -127,19 +274,23 @@ def sync_single_property_calendar(property_id):
                 'property_name': prop.name
             }
 
-        logger.info(f"Sincronizando calendario de '{prop.name}' (ID: {property_id})...")
+        logger.info(f"Sincronizando {len(feeds)} calendarios de '{prop.name}' (ID: {property_id})...")
 
-        bookings = fetch_ical_bookings(prop.airbnb_ical_url)
+        results = _sync_feeds(feeds, force_refresh=True)
+        failed = [outcome for outcome in results.values() if isinstance(outcome, Exception)]
+        if failed:
+            raise failed[0]
+        bookings_count = sum(len(outcome) for outcome in results.values())
 
         logger.info(
-            f"✅ Calendario sincronizado para '{prop.name}': {len(bookings)} reservas"
+            f"✅ Calendarios sincronizados para '{prop.name}': {bookings_count} reservas"
         )
 
         return {
             'success': True,
             'property_id': property_id,
             'property_name': prop.name,
-            'bookings_count': len(bookings)
+            'bookings_count': bookings_count
         }
 
     except Property.DoesNotExist:
@@ -160,3 +311,57 @@ def sync_single_property_calendar(property_id):
             'error': str(e),
             'property_id': property_id
         }
+
+
+@shared_task
+def refresh_property_calendars(property_id):
+    """
+    Descarga los calendarios activos de una propiedad (en paralelo) y renueva su
+    caché y sus bloqueos (ExternalBlock).
+
+    La encolan las vistas (vía schedule_calendar_refresh) cuando la sincronización
+    más antigua de la propiedad superó ICAL_STALE_AFTER o no existe, para que la
+    petición HTTP nunca ocurra en el ciclo petición/respuesta. Pasa por el
+    planificador como sync_due_calendars: solo descarga los feeds vencidos
+    (next_poll_at) y replanifica cada uno con reschedule_feed. Los que ya pasaron
+    ICAL_CACHE_HARD_TIMEOUT se descargan aunque no les toque: su propiedad ya no
+    está disponible y no debe esperar al backoff de errores si el host se recuperó.
+
+    Args:
+        property_id: ID de la propiedad
+
+    Returns:
+        dict: Resultado del refresco
+    """
+    at = timezone.now()
+    feeds = list(
+        CalendarFeed.objects.filter(property_id=property_id, active=True)
+        .filter(
+            Q(next_poll_at__isnull=True) | Q(next_poll_at__lte=at)
+            | Q(synced_at__isnull=True) | Q(synced_at__lt=at - timedelta(seconds=ICAL_CACHE_HARD_TIMEOUT))
+        )
+    )
+    if not feeds:
+        # Nada vencido: el lock se deja expirar solo, el planificador se encarga
+        return {'success': True, 'bookings_count': 0}
+
+    changes = {}
+    results = _sync_feeds(feeds, force_refresh=True, changes=changes)
+    busy = property_id in busy_property_ids([property_id], at=at)
+    for feed in feeds:
+        summary = changes.get(feed.id, {})
+        reschedule_feed(
+            feed,
+            changed=bool(summary.get('created') or summary.get('updated') or summary.get('deleted')),
+            failed=isinstance(results[feed.id], Exception),
+            busy=busy,
+        )
+    failed = {feed_id: e for feed_id, e in results.items() if isinstance(e, Exception)}
+    if failed:
+        # El lock de refresco se deja expirar solo: evita reintentar en cada petición
+        for feed_id, e in failed.items():
+            logger.error(f"Error refrescando calendario {feed_id} de propiedad {property_id}: {e}")
+        return {'success': False, 'error': str(next(iter(failed.values())))}
+
+    release_calendar_refresh(property_id)
+    return {'success': True, 'bookings_count': sum(len(outcome) for outcome in results.values())}
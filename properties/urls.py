@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import PropertiesList, PropertyDetail, ExportCalendarView
+from .views import PropertiesList, PropertyDetail, DisabledDatesView, ExportCalendarView
 
 urlpatterns = [
     path("property_list/", PropertiesList.as_view(), name="property_list"),
     path("<int:pk>/", PropertyDetail.as_view(), name="property_detail"),
+    path("<int:pk>/disabled-dates/", DisabledDatesView.as_view(), name="property_disabled_dates"),
     path("calendar/<str:ical_token>/", ExportCalendarView.as_view(), name="export_calendar"),
 ]
\ No newline at end of file
@@ -0,0 +1,96 @@
+# properties/utils/date_picker.py
+"""
+Fechas deshabilitadas del selector de fechas (flatpickr) de la ficha de una propiedad.
+
+Salen del índice OccupiedNight, así que combinan en una sola consulta las
+reservas confirmadas, los holds de depósito vigentes y los bloqueos de todos los
+calendarios externos. El resultado se cachea bajo la "versión de disponibilidad"
+de la propiedad (ver occupancy.availability_version): cualquier cambio en sus
+fechas ocupadas, también la expiración de un hold (mark_expired_holds), genera
+una clave nueva y nunca se sirve un calendario antiguo.
+"""
+from datetime import date
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.timezone import localtime, now
+from core.tzutils import MX_TZ
+import logging
+
+logger = logging.getLogger(__name__)
+
+DATE_PICKER_MONTHS = getattr(settings, 'DATE_PICKER_MONTHS', 12)  # meses que cubre, además del actual
+DATE_PICKER_CACHE_TIMEOUT = getattr(settings, 'DATE_PICKER_CACHE_TIMEOUT', 3600)  # 1 hora
+
+
+def _payload_cache_key(property_id, version, today):
+    return f"date_picker:{property_id}:{version}:{today.isoformat()}"
+
+
+def _horizon(today, months):
+    """Primer día del mes que sigue a los `months` meses posteriores al actual."""
+    month = today.month + months
+    return date(today.year + month // 12, month % 12 + 1, 1)
+
+
+def build_disabled_dates(property_id, version=None):
+    """
+    Calcula y cachea las fechas deshabilitadas de una propiedad desde hoy hasta
+    el final del horizonte (DATE_PICKER_MONTHS).
+
+    La entrada dura como mucho DATE_PICKER_CACHE_TIMEOUT.
+
+    Returns:
+        dict: {'dates': JSON de la lista de días, 'body': JSON completo del
+               endpoint (bytes), 'etag': ETag fuerte del body}
+    """
+    from properties.models import OccupiedNight
+    from properties.utils.occupancy import availability_version
+
+    if version is None:
+        version = availability_version(property_id)
+    today = localtime(now(), MX_TZ).date()
+    until = _horizon(today, DATE_PICKER_MONTHS)
+
+    nights = OccupiedNight.objects.filter(
+        property_id=property_id, night__gte=today, night__lt=until,
+    ).values_list("night", flat=True).distinct().order_by("night")
+
+    dates = [night.isoformat() for night in nights]
+    body = json.dumps({
+        "property_id": property_id,
+        "from": today.isoformat(),
+        "until": until.isoformat(),
+        "disabled": dates,
+    }).encode()
+    payload = {
+        "dates": json.dumps(dates),
+        "body": body,
+        "etag": f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+    }
+
+    key = _payload_cache_key(property_id, version, today)
+    cache.set(key, payload, DATE_PICKER_CACHE_TIMEOUT)
+    # Si la disponibilidad cambió mientras se calculaba, descartar lo cacheado
+    if availability_version(property_id) != version:
+        cache.delete(key)
+    return payload
+
+
+def get_disabled_dates(property_id):
+    """
+    Fechas deshabilitadas de una propiedad; del caché si la versión de
+    disponibilidad no ha cambiado.
+
+    Returns:
+        dict: como build_disabled_dates()
+    """
+    from properties.utils.occupancy import availability_version
+
+    version = availability_version(property_id)
+    today = localtime(now(), MX_TZ).date()
+    payload = cache.get(_payload_cache_key(property_id, version, today))
+    if payload is None:
+        payload = build_disabled_dates(property_id, version=version)
+    return payload
@@ -0,0 +1,167 @@
+# properties/utils/external_blocks.py
+"""
+Persistencia de los bloqueos importados de calendarios externos (ExternalBlock).
+
+Cada propiedad puede tener varios calendarios (CalendarFeed). Cada sincronización
+compara los eventos descargados de un feed con los bloqueos guardados de ese
+mismo feed (clave: UID del evento) y solo escribe las diferencias. Las noches de
+cada bloqueo se reflejan en el índice OccupiedNight, de modo que la
+disponibilidad se resuelve con una única consulta para reservas locales y los
+bloqueos de todos los feeds.
+"""
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils.timezone import now
+import logging
+
+from properties.utils.occupancy import bump_availability_version, index_external_blocks
+
+logger = logging.getLogger(__name__)
+
+
+def merge_ranges(ranges):
+    """
+    Normaliza y fusiona rangos de fechas [start, end).
+
+    Ordena, descarta rangos vacíos y une los que se solapan o son contiguos
+    (p.ej. el mismo bloqueo en Airbnb y en Booking.com, o dos estancias seguidas).
+
+    Args:
+        ranges: iterable de (start_date, end_date)
+
+    Returns:
+        list: [(start_date, end_date)] ordenada y sin solapes
+    """
+    merged = []
+    for start, end in sorted((start, end) for start, end in ranges if end > start):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def update_calendar_summary(property_id, property_obj=None):
+    """
+    Recalcula Property.ical_feed_count e ical_synced_at a partir de sus feeds activos.
+
+    ical_synced_at es la sincronización correcta más antigua entre los feeds (None
+    si alguno nunca se sincronizó): la propiedad solo es fiable si lo son todos.
+
+    Args:
+        property_id: ID de la propiedad
+        property_obj: instancia ya cargada a la que copiar los valores (opcional)
+    """
+    from properties.models import CalendarFeed, Property
+
+    summary = CalendarFeed.objects.filter(property_id=property_id, active=True).aggregate(
+        count=Count("id"),
+        oldest=Min("synced_at"),
+        never=Count("id", filter=Q(synced_at__isnull=True)),
+    )
+    values = {
+        "ical_feed_count": summary["count"],
+        "ical_synced_at": None if summary["never"] else summary["oldest"],
+    }
+    Property.objects.filter(pk=property_id).update(**values)
+    if property_obj is not None:
+        for field, value in values.items():
+            setattr(property_obj, field, value)
+    return values
+
+
+def sync_external_blocks(feed, events, fetched_at=None):
+    """
+    Sustituye los bloqueos de un calendario externo por los de una descarga.
+
+    CalendarFeed.synced_at pasa a ser el momento de esa descarga, no el de la
+    llamada: unos eventos servidos desde el caché no hacen que el feed parezca
+    recién sincronizado.
+
+    Args:
+        feed: instancia de CalendarFeed
+        events: lista de (uid, start_date, end_date), p.ej. de fetch_ical_events()
+        fetched_at: cuándo se descargaron los eventos (por defecto events.fetched_at
+            si viene de fetch_ical_events(), o ahora)
+
+    Returns:
+        dict: {'created': n, 'updated': n, 'deleted': n, 'unchanged': n}
+    """
+    from properties.models import CalendarFeed, ExternalBlock
+
+    incoming = {uid[:255]: (start, end) for uid, start, end in events}
+    if fetched_at is None:
+        fetched_at = getattr(events, "fetched_at", None) or now()
+
+    with transaction.atomic():
+        # Eventos que desaparecieron del feed
+        _, deleted_by_model = (
+            ExternalBlock.objects.filter(feed_id=feed.pk)
+            .exclude(uid__in=list(incoming))
+            .delete()
+        )
+        deleted = deleted_by_model.get(ExternalBlock._meta.label, 0)
+        existing = {
+            block.uid: block
+            for block in ExternalBlock.objects.select_for_update().filter(feed_id=feed.pk)
+        }
+
+        to_create = []
+        to_update = []
+        for uid, (start, end) in incoming.items():
+            block = existing.get(uid)
+            if block is None:
+                to_create.append(ExternalBlock(
+                    property_id=feed.property_id, feed_id=feed.pk, uid=uid, start=start, end=end,
+                ))
+            elif (block.start, block.end) != (start, end):
+                block.start, block.end, block.updated_at = start, end, now()
+                to_update.append(block)
+
+        created = []
+        if to_create:
+            ExternalBlock.objects.bulk_create(to_create, batch_size=500)
+            # Releer para obtener los IDs (MySQL no los devuelve en bulk_create)
+            created = list(ExternalBlock.objects.filter(
+                feed_id=feed.pk, uid__in=[b.uid for b in to_create]
+            ))
+        if to_update:
+            ExternalBlock.objects.bulk_update(to_update, ["start", "end", "updated_at"])
+        index_external_blocks(created + to_update)
+
+        # Nunca hacia atrás: otra sincronización pudo guardar una descarga más reciente
+        if CalendarFeed.objects.filter(pk=feed.pk).filter(
+            Q(synced_at__isnull=True) | Q(synced_at__lt=fetched_at)
+        ).update(synced_at=fetched_at):
+            feed.synced_at = fetched_at
+        update_calendar_summary(feed.property_id, property_obj=feed._cached_property())
+
+    result = {
+        'created': len(to_create),
+        'updated': len(to_update),
+        'deleted': deleted,
+        'unchanged': len(incoming) - len(to_create) - len(to_update),
+    }
+    if to_create or to_update or deleted:
+        bump_availability_version(feed.property_id)
+        logger.info(f"Bloqueos externos del feed {feed.pk} (propiedad {feed.property_id}) actualizados: {result}")
+    return result
+
+
+def clear_external_blocks(feed_ids):
+    """
+    Elimina los bloqueos (y sus noches) de calendarios borrados o desactivados.
+
+    Returns:
+        int: número de bloqueos eliminados
+    """
+    from properties.models import ExternalBlock
+
+    blocks = ExternalBlock.objects.filter(feed_id__in=list(feed_ids))
+    property_ids = set(blocks.values_list("property_id", flat=True).distinct())
+    if not property_ids:
+        return 0
+    _, deleted_by_model = blocks.delete()
+    bump_availability_version(*property_ids)
+    return deleted_by_model.get(ExternalBlock._meta.label, 0)
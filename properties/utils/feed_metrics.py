@@ -0,0 +1,152 @@
+# properties/utils/feed_metrics.py
+"""
+Métricas por calendario externo: latencia, bytes, tiempo de parseo, eventos,
+estado HTTP, acierto de caché y última descarga correcta.
+
+fetch_ical_events() registra una muestra por llamada con record_fetch(). Por
+cada URL se guardan en caché las últimas ICAL_METRICS_HISTORY muestras como
+tuplas (unos cientos de bytes por feed) más la fecha de la última descarga
+correcta. El informe de salud (feed_health_report) las combina con el estado
+de CalendarFeed. Lo usan el comando calendar_health y el listado de
+calendarios externos del Admin.
+"""
+from datetime import datetime, timezone as dt_timezone
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.timezone import now
+import logging
+
+logger = logging.getLogger(__name__)
+
+ICAL_METRICS_HISTORY = getattr(settings, 'ICAL_METRICS_HISTORY', 20)  # muestras por feed
+ICAL_METRICS_TIMEOUT = getattr(settings, 'ICAL_METRICS_TIMEOUT', 7 * 24 * 3600)  # 7 días sin descargas
+ICAL_METRICS_SLOW_MS = getattr(settings, 'ICAL_METRICS_SLOW_MS', 3000)  # mediana de latencia "lenta"
+ICAL_CACHE_HARD_TIMEOUT = getattr(settings, 'ICAL_CACHE_HARD_TIMEOUT', 7200)
+
+# Orden de los campos de cada muestra
+SAMPLE_FIELDS = ("at", "outcome", "status", "latency_ms", "download_ms", "parse_ms", "bytes", "events")
+
+# Resultados de fetch_ical_events
+OUTCOME_HIT = "hit"                          # caché fresco, sin HTTP
+OUTCOME_FETCHED = "fetched"                  # descargado y parseado
+OUTCOME_NOT_MODIFIED = "not_modified"        # 304, se reutiliza el parseo en caché
+OUTCOME_ERROR = "error"                      # la descarga o el parseo fallaron
+OUTCOME_FAILURE_CACHED = "failure_cached"    # rechazado por un error reciente del feed
+OUTCOME_SHORT_CIRCUIT = "short_circuit"      # rechazado por el circuit breaker del host
+SUCCESS_OUTCOMES = (OUTCOME_FETCHED, OUTCOME_NOT_MODIFIED)
+FAILED_OUTCOMES = (OUTCOME_ERROR, OUTCOME_FAILURE_CACHED, OUTCOME_SHORT_CIRCUIT)
+
+# Estados del informe, del más al menos grave
+HEALTH_ORDER = ("stale", "error", "slow", "ok")
+
+
+def _metrics_key(ical_url):
+    return f"ical_metrics:{hashlib.sha256(ical_url.encode()).hexdigest()}"
+
+
+def record_fetch(ical_url, outcome, status=None, latency_ms=None, download_ms=None,
+                 parse_ms=None, bytes_read=None, events=None):
+    """Añade una muestra al historial de un feed. Nunca lanza excepciones."""
+    try:
+        key = _metrics_key(ical_url)
+        entry = cache.get(key) or {"samples": [], "last_success": None}
+        at = int(time.time())
+        entry["samples"] = (entry["samples"] + [
+            (at, outcome, status, latency_ms, download_ms, parse_ms, bytes_read, events)
+        ])[-ICAL_METRICS_HISTORY:]
+        if outcome in SUCCESS_OUTCOMES:
+            entry["last_success"] = at
+        cache.set(key, entry, ICAL_METRICS_TIMEOUT)
+    except Exception as e:
+        # Las métricas nunca deben romper la lectura de calendarios
+        logger.debug(f"No se pudieron guardar las métricas de {ical_url[:100]}: {e}")
+
+
+def _median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+def _summarize(entry):
+    samples = [dict(zip(SAMPLE_FIELDS, sample)) for sample in entry["samples"]]
+    latencies = [s["latency_ms"] for s in samples if s["latency_ms"] is not None]
+    hits = sum(s["outcome"] == OUTCOME_HIT for s in samples)
+    last = samples[-1] if samples else None
+    if last is not None:
+        last["at"] = datetime.fromtimestamp(last["at"], tz=dt_timezone.utc)
+    last_success = entry["last_success"]
+    return {
+        "last": last,
+        "last_success": datetime.fromtimestamp(last_success, tz=dt_timezone.utc) if last_success else None,
+        "samples": len(samples),
+        "errors": sum(s["outcome"] in FAILED_OUTCOMES for s in samples),
+        "hit_ratio": hits / len(samples) if samples else None,
+        "latency_p50_ms": _median(latencies),
+        "latency_max_ms": max(latencies) if latencies else None,
+    }
+
+
+def get_feed_metrics(urls):
+    """
+    Resumen de las muestras de varios feeds, con una sola lectura de caché.
+
+    Returns:
+        dict: {url: {'last', 'last_success', 'samples', 'errors', 'hit_ratio',
+               'latency_p50_ms', 'latency_max_ms'}}; las URLs sin muestras no aparecen.
+               'last' es la última muestra como dict (campos de SAMPLE_FIELDS).
+    """
+    keys = {_metrics_key(url): url for url in urls}
+    entries = cache.get_many(list(keys))
+    return {keys[key]: _summarize(entry) for key, entry in entries.items()}
+
+
+def feed_health(feed, metrics=None, at=None):
+    """
+    Estado de un feed:
+
+    - 'stale': sin sincronizar o con la última sincronización pasado el TTL duro
+      (sus fechas ya cuentan como no disponibles).
+    - 'error': la última descarga falló o acumula errores seguidos.
+    - 'slow': mediana de latencia por encima de ICAL_METRICS_SLOW_MS.
+    - 'ok'.
+    """
+    at = at or now()
+    if feed.synced_at is None or (at - feed.synced_at).total_seconds() >= ICAL_CACHE_HARD_TIMEOUT:
+        return "stale"
+    last = metrics["last"] if metrics else None
+    if feed.consecutive_errors or (last and last["outcome"] in FAILED_OUTCOMES):
+        return "error"
+    if metrics and (metrics["latency_p50_ms"] or 0) > ICAL_METRICS_SLOW_MS:
+        return "slow"
+    return "ok"
+
+
+def feed_health_report(feeds=None, at=None):
+    """
+    Informe de salud de los calendarios externos activos, los más graves primero.
+
+    Args:
+        feeds: iterable de CalendarFeed (por defecto, todos los activos)
+
+    Returns:
+        list: [{'feed', 'health', 'metrics'}]; 'metrics' es None si el feed no
+              tiene muestras (p.ej. tras reiniciar el caché)
+    """
+    from properties.models import CalendarFeed
+
+    at = at or now()
+    if feeds is None:
+        feeds = CalendarFeed.objects.filter(active=True).select_related("property").order_by("property_id", "id")
+    feeds = list(feeds)
+    metrics = get_feed_metrics(feed.url for feed in feeds)
+    rows = [
+        {"feed": feed, "health": feed_health(feed, metrics.get(feed.url), at=at), "metrics": metrics.get(feed.url)}
+        for feed in feeds
+    ]
+    rows.sort(key=lambda row: HEALTH_ORDER.index(row["health"]))
+    return rows
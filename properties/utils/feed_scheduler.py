@@ -0,0 +1,164 @@
+# properties/utils/feed_scheduler.py
+"""
+Planificación adaptativa del sondeo de calendarios externos (CalendarFeed).
+
+En lugar de descargar todos los feeds cada 30 minutos, cada feed guarda cuándo
+toca la siguiente descarga (next_poll_at) y con qué intervalo (poll_interval):
+
+- Si la descarga trae cambios, el intervalo se reduce a la mitad.
+- Si no trae cambios, crece un 50 %.
+- Si falla, se aplica un backoff exponencial según los errores seguidos.
+- Las propiedades con muchas noches ocupadas en las próximas semanas nunca
+  superan el intervalo por defecto y se atienden primero.
+
+Ni el intervalo normal (ICAL_POLL_MAX_INTERVAL) ni el backoff de errores
+(ICAL_POLL_ERROR_MAX_INTERVAL) deben pasar de ICAL_CACHE_HARD_TIMEOUT: si no, un
+feed sin cambios caducaría, o uno que falló dos veces seguiría sin volver a
+intentarse horas después de que su host se recupere, y su propiedad dejaría de
+estar disponible entretanto.
+
+La tarea sync_due_calendars se ejecuta en cada tick de Celery Beat y solo
+descarga los feeds que vencieron, como mucho ICAL_POLL_MAX_PER_TICK. Cada feed
+lleva además un desfase fijo derivado de su ID, de modo que las descargas se
+reparten entre ticks en lugar de coincidir todas.
+
+Las vistas solo encolan un refresco de una propiedad cuando su sincronización
+supera ICAL_POLL_OVERDUE_AFTER, es decir, cuando el planificador se ha
+retrasado; y ese refresco también pasa por aquí (solo feeds vencidos, o ya
+pasados de ICAL_CACHE_HARD_TIMEOUT, replanificados con reschedule_feed).
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, F, Q
+from django.utils.timezone import localtime, now
+from core.tzutils import MX_TZ
+import logging
+
+logger = logging.getLogger(__name__)
+
+ICAL_POLL_MIN_INTERVAL = getattr(settings, 'ICAL_POLL_MIN_INTERVAL', 600)  # 10 minutos
+ICAL_POLL_DEFAULT_INTERVAL = getattr(settings, 'ICAL_POLL_DEFAULT_INTERVAL', 1800)  # 30 minutos
+ICAL_POLL_MAX_INTERVAL = getattr(settings, 'ICAL_POLL_MAX_INTERVAL', 5400)  # 1,5 horas
+ICAL_POLL_ERROR_MAX_INTERVAL = getattr(settings, 'ICAL_POLL_ERROR_MAX_INTERVAL', 5400)  # 1,5 horas
+ICAL_POLL_MAX_PER_TICK = getattr(settings, 'ICAL_POLL_MAX_PER_TICK', 50)
+ICAL_POLL_BUSY_HORIZON_DAYS = getattr(settings, 'ICAL_POLL_BUSY_HORIZON_DAYS', 30)
+ICAL_POLL_BUSY_RATIO = getattr(settings, 'ICAL_POLL_BUSY_RATIO', 0.5)  # fracción de noches ocupadas
+
+# Desfase de cada feed: hasta ±5 % de su intervalo
+JITTER_RATIO = 0.05
+
+# Tick de Celery Beat de sync_due_calendars (CELERY_BEAT_SCHEDULE)
+POLL_TICK_SECONDS = 300
+
+# Antigüedad a partir de la cual un feed sano ya debería haberse descargado:
+# el intervalo más largo, con su desfase, más un tick
+ICAL_POLL_OVERDUE_AFTER = int(ICAL_POLL_MAX_INTERVAL * (1 + JITTER_RATIO)) + POLL_TICK_SECONDS
+
+
+def _jitter(feed_id, interval):
+    # Determinista por feed (hash multiplicativo de Knuth): reparte sin aleatoriedad
+    fraction = (feed_id * 2654435761 % 1000) / 1000
+    return int(interval * JITTER_RATIO * (2 * fraction - 1))
+
+
+def busy_property_ids(property_ids, at=None):
+    """
+    Propiedades con al menos ICAL_POLL_BUSY_RATIO de sus próximas
+    ICAL_POLL_BUSY_HORIZON_DAYS noches ocupadas (reservas, holds o bloqueos).
+
+    Returns:
+        set: IDs de las propiedades "ocupadas"
+    """
+    from properties.models import OccupiedNight
+
+    at = at or now()
+    today = localtime(at, MX_TZ).date()
+    threshold = ICAL_POLL_BUSY_HORIZON_DAYS * ICAL_POLL_BUSY_RATIO
+    rows = (
+        OccupiedNight.objects.filter(
+            property_id__in=list(property_ids),
+            night__gte=today,
+            night__lt=today + timedelta(days=ICAL_POLL_BUSY_HORIZON_DAYS),
+        )
+        .values("property_id")
+        .annotate(nights=Count("night", distinct=True))
+        .filter(nights__gte=threshold)
+    )
+    return {row["property_id"] for row in rows}
+
+
+def next_interval(interval, *, changed=False, failed=False, errors=0, busy=False):
+    """
+    Calcula el siguiente intervalo de sondeo de un feed.
+
+    Args:
+        interval: intervalo actual en segundos (None = ICAL_POLL_DEFAULT_INTERVAL)
+        changed: la descarga trajo cambios en los bloqueos
+        failed: la descarga falló
+        errors: errores seguidos, incluido este si failed
+        busy: la propiedad tiene la mayoría de sus próximas noches ocupadas
+
+    Returns:
+        int: segundos hasta la siguiente descarga
+    """
+    interval = interval or ICAL_POLL_DEFAULT_INTERVAL
+    if failed:
+        return min(ICAL_POLL_DEFAULT_INTERVAL * 2 ** min(errors, 16), ICAL_POLL_ERROR_MAX_INTERVAL)
+
+    interval = interval // 2 if changed else int(interval * 1.5)
+    upper = ICAL_POLL_DEFAULT_INTERVAL if busy else ICAL_POLL_MAX_INTERVAL
+    return max(ICAL_POLL_MIN_INTERVAL, min(interval, upper))
+
+
+def due_feeds(at=None, limit=None):
+    """
+    Feeds activos cuya próxima descarga ya venció, como mucho `limit`.
+
+    Van primero los de propiedades ocupadas y después los más atrasados (los que
+    nunca se han descargado, antes que nadie).
+
+    Returns:
+        tuple: (lista de CalendarFeed, set de IDs de propiedades ocupadas)
+    """
+    from properties.models import CalendarFeed
+
+    at = at or now()
+    limit = ICAL_POLL_MAX_PER_TICK if limit is None else limit
+    feeds = list(
+        CalendarFeed.objects.filter(active=True)
+        .filter(Q(next_poll_at__isnull=True) | Q(next_poll_at__lte=at))
+        .select_related("property")
+        .only("id", "name", "url", "poll_interval", "consecutive_errors", "next_poll_at",
+              "property_id", "property__id", "property__name")
+        .order_by(F("next_poll_at").asc(nulls_first=True), "id")
+    )
+    busy = busy_property_ids({feed.property_id for feed in feeds}, at=at) if feeds else set()
+    # sort estable: dentro de cada grupo se mantiene el orden por atraso
+    feeds.sort(key=lambda feed: feed.property_id not in busy)
+    return feeds[:limit], busy
+
+
+def reschedule_feed(feed, *, changed=False, failed=False, busy=False, at=None):
+    """
+    Guarda el resultado de una descarga en la planificación del feed.
+
+    Returns:
+        datetime: próxima descarga
+    """
+    from properties.models import CalendarFeed
+
+    at = at or now()
+    errors = feed.consecutive_errors + 1 if failed else 0
+    interval = next_interval(feed.poll_interval, changed=changed, failed=failed, errors=errors, busy=busy)
+    values = {
+        "poll_interval": interval,
+        "consecutive_errors": errors,
+        "next_poll_at": at + timedelta(seconds=interval + _jitter(feed.pk, interval)),
+    }
+    if changed:
+        values["last_changed_at"] = at
+    # update() para no disparar CalendarFeed.save() (resumen de la propiedad)
+    CalendarFeed.objects.filter(pk=feed.pk).update(**values)
+    for field, value in values.items():
+        setattr(feed, field, value)
+    return values["next_poll_at"]
@@ -1,20 +1,55 @@
 # properties/utils/ical.py
 import requests
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from icalendar import Calendar, Event
-from datetime import datetime, timedelta, date
-from django.utils.timezone import make_aware, now, is_aware
+from datetime import date, datetime, timezone as dt_timezone
+from django.utils.timezone import now
 from urllib.parse import urlparse
 import logging
 from django.conf import settings
 from django.core.cache import cache
 import hashlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from properties.utils.feed_metrics import (
+    OUTCOME_ERROR,
+    OUTCOME_FAILURE_CACHED,
+    OUTCOME_FETCHED,
+    OUTCOME_HIT,
+    OUTCOME_NOT_MODIFIED,
+    OUTCOME_SHORT_CIRCUIT,
+    record_fetch,
+)
+from properties.utils.feed_scheduler import ICAL_POLL_OVERDUE_AFTER
 
 logger = logging.getLogger(__name__)
 
 # Configuración de seguridad para fetch de iCal
 ICAL_REQUEST_TIMEOUT = getattr(settings, 'ICAL_REQUEST_TIMEOUT', 10)  # segundos
 ICAL_MAX_SIZE = getattr(settings, 'ICAL_MAX_SIZE', 5 * 1024 * 1024)  # 5 MB
-ICAL_CACHE_TIMEOUT = getattr(settings, 'ICAL_CACHE_TIMEOUT', 900)  # 15 minutos
+ICAL_CACHE_TIMEOUT = getattr(settings, 'ICAL_CACHE_TIMEOUT', 900)  # 15 minutos (TTL "blando")
+ICAL_CACHE_HARD_TIMEOUT = getattr(settings, 'ICAL_CACHE_HARD_TIMEOUT', 7200)  # 2 horas (TTL "duro")
+# Antigüedad a partir de la cual las vistas encolan un refresco: antes, los feeds
+# los descarga sync_due_calendars según su intervalo de sondeo
+ICAL_STALE_AFTER = max(ICAL_CACHE_TIMEOUT, ICAL_POLL_OVERDUE_AFTER)
+ICAL_REFRESH_LOCK_TIMEOUT = getattr(settings, 'ICAL_REFRESH_LOCK_TIMEOUT', 60)  # segundos
+ICAL_EXPORT_CACHE_TIMEOUT = getattr(settings, 'ICAL_EXPORT_CACHE_TIMEOUT', 3600)  # .ics exportado, 1 hora
+# Sincronización concurrente (sync_all_property_calendars)
+ICAL_SYNC_MAX_WORKERS = getattr(settings, 'ICAL_SYNC_MAX_WORKERS', 16)  # hilos en total
+ICAL_SYNC_PER_HOST_LIMIT = getattr(settings, 'ICAL_SYNC_PER_HOST_LIMIT', 4)  # peticiones simultáneas por host
+ICAL_SYNC_DEADLINE = getattr(settings, 'ICAL_SYNC_DEADLINE', 480)  # segundos (< soft time limit de Celery)
+# Cliente HTTP compartido (keep-alive)
+ICAL_HTTP_POOL_MAXSIZE = getattr(settings, 'ICAL_HTTP_POOL_MAXSIZE', ICAL_SYNC_PER_HOST_LIMIT)  # conexiones por host
+ICAL_HTTP_RETRIES = getattr(settings, 'ICAL_HTTP_RETRIES', 2)  # reintentos por petición
+ICAL_HTTP_BACKOFF = getattr(settings, 'ICAL_HTTP_BACKOFF', 0.5)  # segundos; se duplica en cada reintento
+# Feeds y hosts caídos
+ICAL_FAILURE_CACHE_TIMEOUT = getattr(settings, 'ICAL_FAILURE_CACHE_TIMEOUT', 120)  # error cacheado por feed
+ICAL_BREAKER_THRESHOLD = getattr(settings, 'ICAL_BREAKER_THRESHOLD', 5)  # fallos seguidos que abren el circuito
+ICAL_BREAKER_COOLDOWN = getattr(settings, 'ICAL_BREAKER_COOLDOWN', 300)  # segundos con el circuito abierto
 ICAL_ALLOWED_HOSTS = getattr(settings, 'ICAL_ALLOWED_HOSTS', [
     'airbnb.com',
     'airbnb.es',
@@ -25,9 +60,287 @@ ICAL_ALLOWED_HOSTS = getattr(settings, 'ICAL_ALLOWED_HOSTS', [
     'homeaway.com',
 ])
 
-def fetch_ical_bookings(ical_url):
+_http_sessions = {}  # {con reintentos (bool): requests.Session}
+_http_session_lock = threading.Lock()
+
+
+def _build_http_session(retries):
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=ICAL_HTTP_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({'GET'}),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # tras el último reintento se devuelve la respuesta (raise_for_status)
+    )
+    adapter = HTTPAdapter(
+        # Un pool por host (los proveedores permitidos y sus subdominios)
+        pool_connections=max(len(ICAL_ALLOWED_HOSTS), 10),
+        pool_maxsize=ICAL_HTTP_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': 'ReyesEstancias/1.0 (Calendar Sync)',
+        'Accept': 'text/calendar, application/octet-stream, */*',
+    })
+    # La sesión se comparte entre hilos y feeds: no guardar cookies de un proveedor
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def get_http_session(retries=True):
+    """
+    Sesión HTTP compartida por el proceso para descargar calendarios.
+
+    Reutiliza conexiones (keep-alive) con los mismos hosts entre descargas y
+    entre los hilos de fetch_ical_bookings_concurrently(), y reintenta con
+    backoff los errores de conexión y las respuestas 429/5xx.
+
+    Args:
+        retries: False para la variante sin reintentos (descargas con un plazo en
+            el que no cabe el peor caso de los reintentos)
+    """
+    session = _http_sessions.get(retries)
+    if session is None:
+        with _http_session_lock:
+            session = _http_sessions.get(retries)
+            if session is None:
+                session = _http_sessions[retries] = _build_http_session(ICAL_HTTP_RETRIES if retries else 0)
+    return session
+
+
+def close_http_session():
+    """Cierra las sesiones compartidas y sus conexiones (se recrean al volver a usarse)."""
+    with _http_session_lock:
+        sessions = list(_http_sessions.values())
+        _http_sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+def _retries_worst_case():
+    # Todos los intentos agotando el timeout, más una cota de las esperas de backoff
+    # (sin contar un Retry-After del proveedor)
+    return (ICAL_HTTP_RETRIES + 1) * ICAL_REQUEST_TIMEOUT + ICAL_HTTP_BACKOFF * 2 ** ICAL_HTTP_RETRIES
+
+
+class CircuitOpenError(ValueError):
+    """El host del calendario acumula fallos y no se le hacen peticiones por ahora."""
+
+
+def _cache_key(ical_url):
+    # Clave única basada en la URL (hash SHA256 para no exponer la URL en Redis)
+    return f'ical_bookings:{hashlib.sha256(ical_url.encode()).hexdigest()}'
+
+
+def _refresh_lock_key(property_id):
+    return f'ical_refresh:property:{property_id}'
+
+
+def _failure_key(ical_url):
+    return f'ical_failure:{hashlib.sha256(ical_url.encode()).hexdigest()}'
+
+
+def _breaker_failures_key(host):
+    return f'ical_breaker:failures:{host}'
+
+
+def _breaker_open_key(host):
+    return f'ical_breaker:open:{host}'
+
+
+def _record_feed_failure(ical_url, host, message, host_failure=False):
     """
-    Obtiene reservas de un calendario iCal externo de forma segura.
+    Cachea el error de un feed durante ICAL_FAILURE_CACHE_TIMEOUT y, si es un
+    fallo del host (timeout, conexión, 5xx), lo suma a su circuit breaker.
+
+    Returns:
+        ValueError: la excepción a lanzar
+    """
+    _count('fetch_error')
+    cache.set(_failure_key(ical_url), message, ICAL_FAILURE_CACHE_TIMEOUT)
+    if host_failure:
+        key = _breaker_failures_key(host)
+        try:
+            # El contador sobrevive al cool-down: un fallo más al reabrir vuelve a disparar
+            cache.add(key, 0, ICAL_BREAKER_COOLDOWN * 2)
+            failures = cache.incr(key)
+        except ValueError:
+            failures = 1
+        if failures >= ICAL_BREAKER_THRESHOLD and cache.add(_breaker_open_key(host), time.time(), ICAL_BREAKER_COOLDOWN):
+            logger.warning(
+                f"Circuit breaker ABIERTO para {host}: {failures} fallos seguidos, "
+                f"sin peticiones durante {ICAL_BREAKER_COOLDOWN}s"
+            )
+    return ValueError(message)
+
+
+def _record_host_success(host):
+    cache.delete(_breaker_failures_key(host))
+
+
+def get_circuit_breaker_state(hosts):
+    """
+    Estado del circuit breaker de varios hosts.
+
+    Returns:
+        dict: {host: {'open': bool, 'failures': int}}
+    """
+    hosts = sorted({host.lower() for host in hosts})
+    keys = [_breaker_failures_key(h) for h in hosts] + [_breaker_open_key(h) for h in hosts]
+    values = cache.get_many(keys)
+    return {
+        host: {
+            'open': _breaker_open_key(host) in values,
+            'failures': values.get(_breaker_failures_key(host), 0),
+        }
+        for host in hosts
+    }
+
+
+def _unpack_entry(entry):
+    """
+    Devuelve (bookings, antigüedad en segundos) de una entrada de caché.
+
+    Las entradas antiguas (una lista sin fecha de descarga) se tratan como
+    caducadas por TTL blando: se sirven y se refrescan en segundo plano.
+    """
+    if isinstance(entry, dict):
+        return entry['bookings'], time.time() - entry['fetched_at']
+    return entry, ICAL_CACHE_TIMEOUT
+
+
+class IcalEvents(list):
+    """
+    Eventos (uid, start, end) de un calendario, con fetched_at: cuándo se
+    descargaron de verdad del proveedor (o los confirmó un 304), aunque se
+    sirvan desde el caché.
+    """
+
+    __slots__ = ("fetched_at",)
+
+
+def _entry_events(entry):
+    """
+    Eventos (uid, start, end) de una entrada de caché, como IcalEvents.
+
+    Los eventos sin UID (o de entradas antiguas sin 'uids') reciben uno derivado
+    de sus fechas, estable entre sincronizaciones.
+    """
+    bookings, age = _unpack_entry(entry)
+    uids = entry.get('uids') if isinstance(entry, dict) else None
+    uids = uids or [None] * len(bookings)
+    events = IcalEvents()
+    events.fetched_at = datetime.fromtimestamp(time.time() - age, tz=dt_timezone.utc)
+    seen = set()
+    for uid, (start, end) in zip(uids, bookings):
+        uid = uid or f'{start.isoformat()}/{end.isoformat()}'
+        if uid in seen:
+            # Eventos recurrentes comparten UID (RECURRENCE-ID): se distinguen por fecha
+            uid = f'{uid}#{start.isoformat()}'
+        seen.add(uid)
+        events.append((uid, start, end))
+    return events
+
+
+def _store_bookings(cache_key, bookings, uids=None, etag=None, last_modified=None):
+    # La entrada vive hasta el TTL duro; el TTL blando se calcula con fetched_at.
+    # etag/last_modified son los validadores HTTP para el siguiente GET condicional.
+    entry = {
+        'bookings': bookings,
+        'uids': uids,
+        'fetched_at': time.time(),
+        'etag': etag,
+        'last_modified': last_modified,
+    }
+    cache.set(cache_key, entry, ICAL_CACHE_HARD_TIMEOUT)
+    return entry
+
+
+def _conditional_headers(entry):
+    """Cabeceras If-None-Match / If-Modified-Since a partir de una entrada de caché."""
+    if not isinstance(entry, dict):
+        return {}
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+# Contadores de caché (ver get_ical_cache_stats)
+STATS_KEY_PREFIX = 'ical_stats'
+STATS_EVENTS = (
+    'request_hit', 'request_stale', 'request_miss', 'fetch_hit', 'fetch_http', 'fetch_not_modified',
+    'fetch_error', 'fetch_failure_cached', 'fetch_short_circuit',
+)
+
+
+def _count(event, delta=1):
+    key = f'{STATS_KEY_PREFIX}:{event}'
+    try:
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # Primer uso del contador
+            cache.add(key, 0, None)
+            cache.incr(key, delta)
+    except Exception as e:
+        # Las métricas nunca deben romper la lectura de calendarios
+        logger.debug(f"No se pudo actualizar el contador {key}: {e}")
+
+
+def get_ical_cache_stats():
+    """
+    Contadores acumulados de uso del caché de calendarios.
+
+    - request_hit / request_stale / request_miss: comprobaciones desde vistas
+      (check_calendar_freshness). request_miss son las peticiones que encontraron el
+      calendario sin sincronizar o con la última sincronización pasado el TTL duro.
+    - fetch_hit / fetch_http: llamadas a fetch_ical_bookings resueltas desde caché
+      o con descarga HTTP (workers y comandos). fetch_not_modified cuenta las
+      descargas a las que el proveedor respondió 304 Not Modified.
+    - fetch_error: descargas fallidas. fetch_failure_cached / fetch_short_circuit:
+      llamadas rechazadas sin HTTP por un error reciente del feed o por el circuit
+      breaker abierto de su host.
+
+    Returns:
+        dict: {evento: número}
+    """
+    values = cache.get_many([f'{STATS_KEY_PREFIX}:{event}' for event in STATS_EVENTS])
+    return {event: values.get(f'{STATS_KEY_PREFIX}:{event}', 0) for event in STATS_EVENTS}
+
+
+def reset_ical_cache_stats():
+    cache.delete_many([f'{STATS_KEY_PREFIX}:{event}' for event in STATS_EVENTS])
+
+
+def fetch_ical_bookings(ical_url, force_refresh=False, timeout=None):
+    """
+    Obtiene los rangos bloqueados (start_date, end_date) de un calendario iCal.
+
+    Igual que fetch_ical_events(), sin los UID.
+    """
+    return [
+        (start, end)
+        for _, start, end in fetch_ical_events(ical_url, force_refresh=force_refresh, timeout=timeout)
+    ]
+
+
+def fetch_ical_events(ical_url, force_refresh=False, timeout=None):
+    """
+    Obtiene los eventos de un calendario iCal externo de forma segura.
+
+    Solo debe llamarse desde workers de Celery o comandos de gestión: si el caché
+    supera el TTL blando hace una petición HTTP bloqueante. Las vistas consultan
+    los bloqueos ya guardados en ExternalBlock (ver check_calendar_freshness).
 
     Protecciones implementadas:
     - Caché de 15 minutos (configurable) para evitar peticiones repetidas
@@ -35,28 +348,70 @@ def fetch_ical_bookings(ical_url):
     - Whitelist de hosts permitidos
     - Timeout de conexión
     - Límite de tamaño de respuesta
+    - Errores cacheados por feed (ICAL_FAILURE_CACHE_TIMEOUT) salvo con force_refresh
+    - Circuit breaker por host: tras ICAL_BREAKER_THRESHOLD fallos seguidos (timeout,
+      conexión, 429/5xx) se rechazan las descargas durante ICAL_BREAKER_COOLDOWN
     - Logging de errores y métricas de caché
 
     Args:
         ical_url: URL del calendario iCal
+        force_refresh: descargar siempre, aunque el caché esté fresco. El valor en
+            caché se sustituye de una vez (un único cache.set) solo si la descarga
+            y el parseo terminan bien; si fallan, se conserva el anterior.
+        timeout: segundos disponibles para la descarga, reintentos incluidos (p.ej.
+            lo que queda del plazo de una sincronización). Si no cabe el peor caso
+            de los reintentos, se hace un único intento con ese timeout (como mucho
+            ICAL_REQUEST_TIMEOUT); un timeout recortado así no cuenta como fallo
+            del host para el circuit breaker. Por defecto, ICAL_REQUEST_TIMEOUT por
+            intento con todos los reintentos.
 
     Returns:
-        list: Lista de tuplas (start_date, end_date)
+        IcalEvents: Lista de tuplas (uid, start_date, end_date), con fetched_at
 
     Raises:
-        ValueError: Si la URL es inválida o el host no está permitido
+        ValueError: Si la URL es inválida, el host no está permitido o la descarga falla
+        CircuitOpenError: Si el circuit breaker del host está abierto
         requests.exceptions.RequestException: Si hay error en la petición
     """
+    # Cada llamada deja una muestra en las métricas del feed (ver feed_metrics)
+    metrics = {'outcome': OUTCOME_ERROR}
+    try:
+        events = _fetch_ical_events(ical_url, force_refresh, metrics, timeout)
+        metrics['events'] = len(events)
+        return events
+    finally:
+        record_fetch(ical_url, **metrics)
+
+
+def _fetch_ical_events(ical_url, force_refresh, metrics, timeout=None):
+    # Cuerpo de fetch_ical_events; rellena `metrics` con lo que mide por el camino
+    # Reintentos solo si su peor caso cabe en el tiempo disponible
+    retries = timeout is None or timeout >= _retries_worst_case()
+    timeout = ICAL_REQUEST_TIMEOUT if retries else min(timeout, ICAL_REQUEST_TIMEOUT)
     # 0. Intentar obtener del caché primero
-    # Generar clave única basada en la URL (usar hash SHA256 para seguridad)
-    cache_key = f'ical_bookings:{hashlib.sha256(ical_url.encode()).hexdigest()}'
+    cache_key = _cache_key(ical_url)
+
+    cached_entry = cache.get(cache_key)
+    if not force_refresh:
+        if cached_entry is not None:
+            _, age = _unpack_entry(cached_entry)
+            if age < ICAL_CACHE_TIMEOUT:
+                logger.info(f"iCal cache HIT for {urlparse(ical_url).netloc} (usando datos en caché)")
+                _count('fetch_hit')
+                metrics['outcome'] = OUTCOME_HIT
+                return _entry_events(cached_entry)
 
-    cached_result = cache.get(cache_key)
-    if cached_result is not None:
-        logger.info(f"iCal cache HIT for {urlparse(ical_url).netloc} (usando datos en caché)")
-        return cached_result
+        # Error reciente cacheado: no repetir la petición hasta que expire
+        failure = cache.get(_failure_key(ical_url))
+        if failure is not None:
+            _count('fetch_failure_cached')
+            metrics['outcome'] = OUTCOME_FAILURE_CACHED
+            raise ValueError(failure)
 
-    logger.info(f"iCal cache MISS for {urlparse(ical_url).netloc} (haciendo petición HTTP)")
+        logger.info(f"iCal cache MISS for {urlparse(ical_url).netloc} (haciendo petición HTTP)")
+    else:
+        logger.info(f"iCal force refresh for {urlparse(ical_url).netloc} (haciendo petición HTTP)")
+    _count('fetch_http')
 
     # 1. Validar que sea una URL válida
     try:
@@ -89,129 +444,491 @@ def fetch_ical_bookings(ical_url):
             f"Hosts permitidos: {', '.join(ICAL_ALLOWED_HOSTS)}"
         )
 
+    # Circuit breaker: el host acumula fallos, no esperar otro timeout
+    if cache.get(_breaker_open_key(host)) is not None:
+        _count('fetch_short_circuit')
+        metrics['outcome'] = OUTCOME_SHORT_CIRCUIT
+        raise CircuitOpenError(f"Proveedor {host} no disponible temporalmente (circuit breaker abierto)")
+
     # 4. Hacer la petición con protecciones
     try:
         logger.info(f"Fetching iCal from {host}: {ical_url[:100]}...")
 
-        response = requests.get(
-            ical_url,
-            timeout=ICAL_REQUEST_TIMEOUT,
-            stream=True,  # Stream para verificar tamaño antes de descargar todo
-            headers={
-                'User-Agent': 'ReyesEstancias/1.0 (Calendar Sync)',
-                'Accept': 'text/calendar, application/octet-stream, */*',
-            },
-            allow_redirects=True,  # Permite redirects (max 30 por defecto en requests)
-        )
+        request_started = time.perf_counter()
+        try:
+            response = get_http_session(retries).get(
+                ical_url,
+                timeout=timeout,
+                stream=True,  # Stream para verificar tamaño antes de descargar todo
+                # GET condicional: si el calendario no cambió, el proveedor responde 304
+                headers=_conditional_headers(cached_entry),
+                allow_redirects=True,  # Permite redirects (max 30 por defecto en requests)
+            )
+        finally:
+            # Latencia hasta las cabeceras (incluye reintentos); en errores, hasta el fallo
+            metrics['latency_ms'] = _elapsed_ms(request_started)
+        metrics['status'] = response.status_code
         response.raise_for_status()
 
     except requests.exceptions.Timeout:
         logger.error(f"Timeout fetching iCal from {host}: {ical_url[:100]}")
-        raise ValueError(f"Timeout al obtener el calendario de {host} (>{ICAL_REQUEST_TIMEOUT}s)")
+        raise _record_feed_failure(
+            ical_url, host, f"Timeout al obtener el calendario de {host} (>{timeout:g}s)",
+            host_failure=timeout >= ICAL_REQUEST_TIMEOUT,
+        )
 
     except requests.exceptions.ConnectionError as e:
         logger.error(f"Connection error fetching iCal from {host}: {e}")
-        raise ValueError(f"Error de conexión al obtener el calendario de {host}")
+        raise _record_feed_failure(
+            ical_url, host, f"Error de conexión al obtener el calendario de {host}", host_failure=True,
+        )
 
     except requests.exceptions.HTTPError as e:
-        logger.error(f"HTTP error fetching iCal from {host}: {e.response.status_code}")
-        raise ValueError(f"Error HTTP {e.response.status_code} al obtener el calendario")
+        e.response.close()  # devolver la conexión al pool
+        status_code = e.response.status_code
+        logger.error(f"HTTP error fetching iCal from {host}: {status_code}")
+        # 429/5xx son del proveedor; un 404 o 403 es de este feed concreto
+        raise _record_feed_failure(
+            ical_url, host, f"Error HTTP {status_code} al obtener el calendario",
+            host_failure=status_code == 429 or status_code >= 500,
+        )
 
     except requests.exceptions.RequestException as e:
         logger.error(f"Request error fetching iCal from {host}: {e}")
-        raise ValueError(f"Error al obtener el calendario: {e}")
+        raise _record_feed_failure(ical_url, host, f"Error al obtener el calendario: {e}")
+
+    _record_host_success(host)
+
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+
+    # 304 Not Modified: el calendario no cambió, se reutiliza el parseo en caché
+    if response.status_code == 304 and isinstance(cached_entry, dict):
+        response.close()
+        cache.delete(_failure_key(ical_url))
+        bookings, _ = _unpack_entry(cached_entry)
+        entry = _store_bookings(
+            cache_key,
+            bookings,
+            uids=cached_entry.get('uids'),
+            etag=etag or cached_entry.get('etag'),
+            last_modified=last_modified or cached_entry.get('last_modified'),
+        )
+        _count('fetch_not_modified')
+        metrics['outcome'] = OUTCOME_NOT_MODIFIED
+        logger.info(f"iCal not modified (304) from {host}: {len(bookings)} bookings, caché renovado")
+        return _entry_events(entry)
 
     # 5. Verificar tamaño del contenido
     content_length = response.headers.get('content-length')
     if content_length and int(content_length) > ICAL_MAX_SIZE:
+        response.close()
         logger.warning(f"iCal file too large: {content_length} bytes from {host}")
-        raise ValueError(
+        raise _record_feed_failure(
+            ical_url, host,
             f"El archivo de calendario es demasiado grande "
-            f"({int(content_length) / 1024 / 1024:.1f} MB, máximo {ICAL_MAX_SIZE / 1024 / 1024} MB)"
+            f"({int(content_length) / 1024 / 1024:.1f} MB, máximo {ICAL_MAX_SIZE / 1024 / 1024} MB)",
         )
 
-    # 6. Leer contenido con límite
+    # 6-8. Leer y parsear en streaming (sin acumular el cuerpo completo en memoria)
+    read_started = time.perf_counter()
     try:
-        content = b''
-        for chunk in response.iter_content(chunk_size=8192):
-            content += chunk
-            if len(content) > ICAL_MAX_SIZE:
-                logger.warning(f"iCal content exceeded max size while reading from {host}")
-                raise ValueError(
-                    f"El archivo de calendario excede el tamaño máximo permitido "
-                    f"({ICAL_MAX_SIZE / 1024 / 1024} MB)"
-                )
+        events = parse_ical_stream(_metered_chunks(response.iter_content(chunk_size=8192), metrics))
+    except ValueError as e:
+        logger.warning(f"Error reading iCal from {host}: {e}")
+        raise _record_feed_failure(ical_url, host, str(e))
     finally:
         response.close()
+        # Lo que no fue esperar a la red fue parsear
+        metrics['parse_ms'] = round(_elapsed_ms(read_started) - metrics.get('download_ms', 0), 1)
+
+    bookings = [(start, end) for _, start, end in events]
+    uids = [uid for uid, _, _ in events]
+
+    logger.info(f"Successfully fetched {len(bookings)} bookings from {host}")
+
+    # Guardar en caché antes de retornar
+    cache.delete(_failure_key(ical_url))
+    entry = _store_bookings(cache_key, bookings, uids=uids, etag=etag, last_modified=last_modified)
+    metrics['outcome'] = OUTCOME_FETCHED
+    logger.info(
+        f"iCal data cached (fresco {ICAL_CACHE_TIMEOUT / 60:.1f} min, "
+        f"válido {ICAL_CACHE_HARD_TIMEOUT / 60:.1f} min)"
+    )
+
+    return _entry_events(entry)
 
-    # 7. Parsear el calendario
-    try:
-        calendar = Calendar.from_ical(content)
-    except Exception as e:
-        logger.error(f"Error parsing iCal from {host}: {e}")
-        raise ValueError(f"Error al parsear el calendario: formato inválido")
 
-    # 8. Extraer reservas
-    bookings = []
-    for component in calendar.walk():
-        if component.name != "VEVENT":
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def _metered_chunks(chunks, metrics):
+    """Reenvía los fragmentos del cuerpo contando bytes y tiempo de espera de red."""
+    metrics['bytes_read'] = 0
+    metrics['download_ms'] = 0.0
+    chunks = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        chunk = next(chunks, None)
+        metrics['download_ms'] = round(metrics['download_ms'] + _elapsed_ms(started), 1)
+        if chunk is None:
+            return
+        metrics['bytes_read'] += len(chunk)
+        yield chunk
+
+
+def _iter_ical_lines(chunks, max_size):
+    """
+    Genera las líneas lógicas (ya "desplegadas", RFC 5545 §3.1) de un iCal por trozos.
+
+    Solo se retiene el trozo de línea pendiente, nunca el cuerpo completo. El
+    tamaño total se comprueba a medida que llegan los bytes.
+    """
+    size = 0
+    pending = []   # trozos de la línea física aún sin terminar
+    current = None  # línea lógica en construcción (puede continuar en la siguiente)
+
+    def physical_lines(chunk):
+        nonlocal pending
+        parts = chunk.split(b'\n')
+        if len(parts) == 1:
+            pending.append(chunk)
+            return
+        parts[0] = b''.join(pending) + parts[0]
+        pending = [parts.pop()]
+        yield from parts
+
+    def feed(raw):
+        nonlocal current
+        line = raw.rstrip(b'\r')
+        if line[:1] in (b' ', b'\t') and current is not None:
+            current += line[1:]
+            return None
+        finished, current = current, line
+        return finished
+
+    for chunk in chunks:
+        if not chunk:
             continue
+        size += len(chunk)
+        if size > max_size:
+            raise ValueError(
+                f"El archivo de calendario excede el tamaño máximo permitido "
+                f"({max_size / 1024 / 1024} MB)"
+            )
+        for raw in physical_lines(chunk):
+            finished = feed(raw)
+            if finished is not None:
+                yield finished.decode('utf-8', errors='replace')
 
-        try:
-            start = component.get("dtstart").dt
-            end = component.get("dtend").dt
-
-            # Convertir datetime a date si es necesario
-            if isinstance(start, datetime):
-                if not is_aware(start):
-                    start = make_aware(start)
-                start = start.date()
-            elif not isinstance(start, date):
-                logger.warning(f"Invalid start date type: {type(start)}")
-                continue
-
-            if isinstance(end, datetime):
-                if not is_aware(end):
-                    end = make_aware(end)
-                end = end.date()
-            elif not isinstance(end, date):
-                logger.warning(f"Invalid end date type: {type(end)}")
-                continue
-
-            bookings.append((start, end))
-
-        except Exception as e:
-            # Si un evento individual falla, log y continuar
-            logger.warning(f"Error parsing iCal event from {host}: {e}")
+    finished = feed(b''.join(pending))
+    if finished is not None:
+        yield finished.decode('utf-8', errors='replace')
+    if current:
+        yield current.decode('utf-8', errors='replace')
+
+
+def _split_content_line(line):
+    """'DTSTART;TZID="A:B":20250101T150000' -> ('DTSTART', '20250101T150000')"""
+    in_quotes = False
+    for i, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            name = line[:i].split(';', 1)[0]
+            return name.strip().upper(), line[i + 1:]
+    return line.strip().upper(), None
+
+
+def _ical_date(value):
+    """
+    Fecha de un valor DATE o DATE-TIME (20250101, 20250101T150000, ...Z).
+
+    Se toma la fecha literal, igual que hacía el parseo con icalendar (el día de la
+    fecha/hora en su propia zona horaria).
+    """
+    value = (value or '').strip()
+    if len(value) < 8 or not value[:8].isdigit() or (len(value) > 8 and value[8] != 'T'):
+        raise ValueError(f"Fecha iCal inválida: {value[:30]!r}")
+    return date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+
+
+def parse_ical_stream(chunks, max_size=None):
+    """
+    Extrae los eventos (uid, start_date, end_date) de un iCal leyéndolo por trozos.
+
+    Lee línea a línea y solo guarda DTSTART/DTEND/UID de cada VEVENT, sin construir
+    el árbol de componentes. Los eventos sin fechas válidas se omiten (con aviso).
+
+    Args:
+        chunks: iterable de bytes (p.ej. response.iter_content())
+        max_size: tamaño máximo en bytes (por defecto ICAL_MAX_SIZE)
+
+    Returns:
+        list: Lista de tuplas (uid o None, start_date, end_date)
+
+    Raises:
+        ValueError: Si el contenido no es un VCALENDAR válido o excede el tamaño
+    """
+    max_size = max_size or ICAL_MAX_SIZE
+    events = []
+    stack = []
+    event = None
+    closed = False
+
+    for line in _iter_ical_lines(chunks, max_size):
+        if closed or not line.strip():
             continue
+        name, value = _split_content_line(line)
+        if value is None or (not stack and (name, value.strip().upper()) != ('BEGIN', 'VCALENDAR')):
+            raise ValueError("Error al parsear el calendario: formato inválido")
 
-    logger.info(f"Successfully fetched {len(bookings)} bookings from {host}")
+        if name == 'BEGIN':
+            component = value.strip().upper()
+            stack.append(component)
+            if component == 'VEVENT':
+                event = {}
+        elif name == 'END':
+            component = value.strip().upper()
+            if not stack or stack[-1] != component:
+                raise ValueError("Error al parsear el calendario: formato inválido")
+            stack.pop()
+            if component == 'VEVENT':
+                try:
+                    events.append((
+                        event.get('UID') or None,
+                        _ical_date(event.get('DTSTART')),
+                        _ical_date(event.get('DTEND')),
+                    ))
+                except ValueError as e:
+                    # Si un evento individual falla, log y continuar
+                    logger.warning(f"Error parsing iCal event {event.get('UID')}: {e}")
+                event = None
+            elif component == 'VCALENDAR' and not stack:
+                closed = True
+        elif event is not None and stack[-1] == 'VEVENT' and name in ('DTSTART', 'DTEND', 'UID'):
+            event[name] = value.strip()
 
-    # Guardar en caché antes de retornar
-    cache.set(cache_key, bookings, ICAL_CACHE_TIMEOUT)
-    logger.info(f"iCal data cached for {ICAL_CACHE_TIMEOUT} seconds ({ICAL_CACHE_TIMEOUT / 60:.1f} minutes)")
+    if not closed:
+        raise ValueError("Error al parsear el calendario: formato inválido")
+    return events
+
+
+def fetch_ical_bookings_concurrently(urls, fetch=None, max_workers=None, per_host_limit=None, deadline=None):
+    """
+    Descarga varios calendarios en paralelo con un pool de hilos acotado.
+
+    - Como mucho `max_workers` descargas simultáneas en total.
+    - Como mucho `per_host_limit` simultáneas contra un mismo host. Las descargas
+      esperan en una cola por host y solo se envían al pool cuando su host tiene
+      hueco, repartiendo los hilos libres entre hosts por turnos: un proveedor
+      lento o con muchos feeds no ocupa hilos esperando y no retrasa al resto.
+    - Plazo global `deadline` (segundos): cada descarga recibe lo que queda del
+      plazo como tiempo disponible (ver fetch_ical_events): solo se reintenta si el
+      peor caso de los reintentos cabe en él. Lo que no haya terminado a tiempo se
+      da por fallido con TimeoutError y lo que seguía en cola ya no se envía.
+
+    El timeout de requests acota la conexión y cada lectura, no la descarga
+    completa: una descarga en curso al vencer el plazo puede tardar algo más en
+    terminar. Su hilo no se espera y acaba por su cuenta poco después.
+
+    Args:
+        urls: iterable de (clave, ical_url); la clave identifica el resultado
+            (p.ej. el ID de la propiedad)
+        fetch: función de descarga, llamada como fetch(ical_url, timeout=segundos)
+            (por defecto fetch_ical_bookings)
+
+    Returns:
+        dict: {clave: resultado de fetch o la excepción producida}
+    """
+    fetch = fetch or fetch_ical_bookings
+    max_workers = max_workers or ICAL_SYNC_MAX_WORKERS
+    per_host_limit = per_host_limit or ICAL_SYNC_PER_HOST_LIMIT
+    deadline = deadline if deadline is not None else ICAL_SYNC_DEADLINE
+
+    jobs = list(urls)
+    if not jobs:
+        return {}
+
+    queues = {}
+    for key, ical_url in jobs:
+        queues.setdefault(urlparse(ical_url).netloc.lower(), deque()).append((key, ical_url))
+    active = dict.fromkeys(queues, 0)
+    running = {}  # future -> (clave, host)
+    results = {}
+    ends_at = time.monotonic() + deadline
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(jobs)), thread_name_prefix="ical-sync")
+
+    def submit_ready():
+        # Una descarga por host y vuelta, mientras queden hilos y plazo
+        submitted = True
+        while submitted and len(running) < max_workers:
+            submitted = False
+            for host, queue in queues.items():
+                remaining = ends_at - time.monotonic()
+                if len(running) >= max_workers or remaining <= 0:
+                    return
+                if queue and active[host] < per_host_limit:
+                    key, ical_url = queue.popleft()
+                    running[executor.submit(fetch, ical_url, timeout=remaining)] = (key, host)
+                    active[host] += 1
+                    submitted = True
+
+    try:
+        submit_ready()
+        while running:
+            remaining = ends_at - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, host = running.pop(future)
+                active[host] -= 1
+                results[key] = future.exception() or future.result()
+            submit_ready()
+    finally:
+        # No esperar a las descargas en curso: terminan solas, sin reintentos que
+        # pasen del plazo
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    pending = len(jobs) - len(results)
+    if pending:
+        for key, _ in jobs:
+            if key not in results:
+                results[key] = TimeoutError(f"Plazo de sincronización agotado ({deadline}s)")
+        logger.warning(f"Sincronización iCal: {pending}/{len(jobs)} descargas sin terminar tras {deadline}s")
+    return results
+
+
+def schedule_calendar_refresh(property_id):
+    """
+    Encola en Celery la descarga de los calendarios de una propiedad, como mucho
+    una vez por ICAL_REFRESH_LOCK_TIMEOUT segundos por propiedad.
+
+    Returns:
+        bool: True si se encoló una tarea nueva
+    """
+    lock_key = _refresh_lock_key(property_id)
+    if not cache.add(lock_key, 1, ICAL_REFRESH_LOCK_TIMEOUT):
+        return False
+
+    from properties.tasks import refresh_property_calendars
+
+    try:
+        refresh_property_calendars.delay(property_id)
+    except Exception as e:
+        # Broker caído: no bloquear la petición web, se reintentará en la siguiente
+        cache.delete(lock_key)
+        logger.error(f"No se pudo encolar el refresco de los calendarios de la propiedad {property_id}: {e}")
+        return False
+    return True
+
+
+def release_calendar_refresh(property_id):
+    """
+    Libera el lock de schedule_calendar_refresh tras un refresco correcto, para que
+    la siguiente sincronización caducada pueda encolar otro sin esperar a que expire.
+    """
+    cache.delete(_refresh_lock_key(property_id))
+
+
+# Contador de get_ical_cache_stats de cada estado de check_calendar_freshness
+FRESHNESS_EVENTS = {'fresh': 'request_hit', 'stale': 'request_stale', 'expired': 'request_miss'}
+
+
+def _freshness(synced_at, at):
+    age = (at - synced_at).total_seconds() if synced_at else None
+    if age is None or age >= ICAL_CACHE_HARD_TIMEOUT:
+        return 'expired'
+    if age >= ICAL_STALE_AFTER:
+        return 'stale'
+    return 'fresh'
+
+
+def check_calendar_freshness(property_id, synced_at):
+    """
+    Estado de la sincronización de los calendarios de una propiedad, para el ciclo
+    petición/respuesta.
+
+    No hace HTTP: los bloqueos ya están en ExternalBlock y aquí solo se decide si
+    siguen siendo fiables.
+
+    - 'fresh':   sincronizado hace menos de ICAL_STALE_AFTER (el feed está al día
+      según su intervalo de sondeo).
+    - 'stale':   entre ICAL_STALE_AFTER y el TTL duro: el planificador se retrasó;
+      los bloqueos se usan y se encola un refresco.
+    - 'expired': nunca sincronizado o pasado el TTL duro; se encola un refresco y
+      el calendario cuenta como no disponible (fail-safe).
+
+    Args:
+        property_id: ID de la propiedad
+        synced_at: sincronización correcta más antigua de sus feeds
+            (Property.ical_synced_at, o None)
+
+    Returns:
+        str: 'fresh', 'stale' o 'expired'
+    """
+    at = now()
+    state = _freshness(synced_at, at)
+    _count(FRESHNESS_EVENTS[state])
+    if state == 'expired':
+        logger.info(f"iCal MISS para propiedad {property_id} (refresco encolado, calendario no disponible)")
+        schedule_calendar_refresh(property_id)
+    elif state == 'stale':
+        age = (at - synced_at).total_seconds()
+        logger.info(f"iCal STALE para propiedad {property_id} ({age:.0f}s, refresco encolado)")
+        schedule_calendar_refresh(property_id)
+    return state
+
+
+def check_calendars_freshness(synced_at_by_property):
+    """
+    check_calendar_freshness para muchas propiedades (listados).
 
-    return bookings
+    Cada contador se incrementa una vez, por el número de propiedades en ese
+    estado, y los locks de refresco de las caducadas se leen con un solo
+    cache.get_many: solo se encolan las que no tienen ya un refresco en marcha.
+    Si todas están al día, basta un incremento de contador.
 
-def get_blocked_dates(ical_url):
-    ranges = fetch_ical_bookings(ical_url)
-    blocked = set()
+    Args:
+        synced_at_by_property: {property_id: Property.ical_synced_at}
 
-    for start, end in ranges:
-        current = start
-        while current < end:
-            blocked.add(current)
-            current += timedelta(days=1)
+    Returns:
+        dict: {property_id: 'fresh' | 'stale' | 'expired'}
+    """
+    at = now()
+    states = {pid: _freshness(synced_at, at) for pid, synced_at in synced_at_by_property.items()}
+    for state, event in FRESHNESS_EVENTS.items():
+        total = sum(1 for s in states.values() if s == state)
+        if total:
+            _count(event, total)
 
-    return sorted(blocked)
+    outdated = [pid for pid, state in states.items() if state != 'fresh']
+    if outdated:
+        locked = cache.get_many([_refresh_lock_key(pid) for pid in outdated])
+        queued = [
+            pid for pid in outdated
+            if _refresh_lock_key(pid) not in locked and schedule_calendar_refresh(pid)
+        ]
+        logger.info(
+            f"iCal: {len(outdated)} propiedades con la sincronización caducada, "
+            f"{len(queued)} refrescos encolados"
+        )
+    return states
 
-def generate_ical_for_property(property_obj):
+
+def generate_ical_for_property(property_obj, dtstamp=None):
     """
     Genera un calendario iCal con las reservas confirmadas y pendientes (hold activo)
     de una propiedad, para que Airbnb bloquee esas fechas.
 
     Args:
         property_obj: Instancia de Property
+        dtstamp: DTSTAMP de los eventos (por defecto, ahora). La exportación cacheada
+            usa la versión de disponibilidad, para que el contenido (y su ETag) no
+            cambie si no cambian las reservas.
 
     Returns:
         Calendar: Objeto icalendar.Calendar listo para serializar
@@ -239,7 +956,7 @@ def generate_ical_for_property(property_obj):
 
         event.add('dtstart', booking.arrival)
         event.add('dtend', booking.departure)
-        event.add('dtstamp', current_time)
+        event.add('dtstamp', dtstamp or current_time)
         event.add('summary', 'Reservado')
         event.add('uid', f'booking_{booking.id}@reyesestancias.com')
 
@@ -250,3 +967,73 @@ def generate_ical_for_property(property_obj):
         cal.add_component(event)
 
     return cal
+
+
+def _export_cache_key(ical_token):
+    return f'ical_export:{hashlib.sha256(ical_token.encode()).hexdigest()}'
+
+
+def get_cached_ical_export(ical_token):
+    """
+    Exportación .ics cacheada para un token, o None si no está en caché.
+
+    Returns:
+        dict | None: {'property_id', 'name', 'body', 'etag'}
+    """
+    return cache.get(_export_cache_key(ical_token))
+
+
+def build_ical_export(ical_token):
+    """
+    Genera y cachea la exportación .ics de la propiedad con ese token.
+
+    El contenido se cachea hasta que cambie la versión de disponibilidad de la
+    propiedad (bump_availability_version la invalida) o, como mucho, hasta que
+    expire el primer hold vigente, porque en ese momento su reserva deja de
+    exportarse sin que haya ninguna escritura.
+
+    Returns:
+        dict | None: como get_cached_ical_export(), o None si el token no existe
+    """
+    from django.db.models import Min
+    from properties.models import Property
+    from properties.utils.occupancy import availability_version
+
+    property_obj = Property.objects.filter(ical_token=ical_token).first()
+    if property_obj is None:
+        return None
+
+    version = availability_version(property_obj.pk)
+    dtstamp = datetime.fromtimestamp(version / 1e9, tz=dt_timezone.utc)
+    body = generate_ical_for_property(property_obj, dtstamp=dtstamp).to_ical()
+    export = {
+        'property_id': property_obj.pk,
+        'name': property_obj.name,
+        'body': body,
+        # ETag fuerte: mismo valor solo si el contenido es idéntico byte a byte
+        'etag': f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+    }
+
+    timeout = ICAL_EXPORT_CACHE_TIMEOUT
+    next_hold_expiry = property_obj.bookings.filter(
+        status='pending', hold_expires_at__gt=now()
+    ).aggregate(m=Min('hold_expires_at'))['m']
+    if next_hold_expiry is not None:
+        timeout = min(timeout, int((next_hold_expiry - now()).total_seconds()))
+
+    if timeout > 0:
+        key = _export_cache_key(ical_token)
+        cache.set(key, export, timeout)
+        # Si la disponibilidad cambió mientras se generaba, descartar lo cacheado
+        if availability_version(property_obj.pk) != version:
+            cache.delete(key)
+    return export
+
+
+def invalidate_ical_exports(property_ids):
+    """Elimina del caché las exportaciones .ics de varias propiedades."""
+    from properties.models import Property
+
+    tokens = Property.objects.filter(pk__in=list(property_ids)).exclude(ical_token__isnull=True) \
+                             .values_list('ical_token', flat=True)
+    cache.delete_many([_export_cache_key(token) for token in tokens])
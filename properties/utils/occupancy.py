@@ -0,0 +1,287 @@
+# properties/utils/occupancy.py
+"""
+Índice de ocupación por noche (OccupiedNight).
+
+Cada reserva local que bloquea fechas (confirmed o pending) y cada bloqueo
+importado de un calendario externo (ExternalBlock) se materializa como una fila
+por noche. Así, "¿están libres las noches [checkin, checkout)?" es una única
+consulta indexada por (property, night), sin importar cuántas reservas
+históricas tenga la propiedad.
+
+La noche N abarca desde las 12:00 del día N hasta las 12:00 del día N+1 (hora
+de México). Con las horas estándar (llegada 15:00, salida 12:00) una reserva
+[A, B) ocupa exactamente las noches A..B-1; si una reserva tiene horas atípicas
+se redondea hacia fuera, es decir, se bloquea de más y nunca de menos.
+
+Cada propiedad tiene además una "versión de disponibilidad" en caché que cambia
+cada vez que se modifica algo que afecta a sus fechas ocupadas; los datos
+derivados (p.ej. el .ics exportado) se cachean bajo esa versión.
+"""
+from datetime import time, timedelta
+import time as _time
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.timezone import localtime
+from core.tzutils import MX_TZ
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Estados de reserva que ocupan noches
+BLOCKING_STATUSES = ("confirmed", "pending")
+
+# Campos de Booking que afectan al índice (si un save() no toca ninguno, no se reindexa)
+INDEXED_FIELDS = {"property", "property_id", "arrival", "departure", "status"}
+
+# Campos de Booking que aparecen en el .ics exportado (además de los del índice):
+# cambiarlos solo invalida lo cacheado (touch_booking), sin rehacer las noches
+EXPORTED_FIELDS = INDEXED_FIELDS | {"person_num", "hold_expires_at"}
+
+NIGHT_BOUNDARY = timedelta(hours=12)
+
+
+def _version_key(property_id):
+    return f"availability_version:{property_id}"
+
+
+def availability_version(property_id):
+    """
+    Versión actual de la disponibilidad de una propiedad.
+
+    Es un timestamp en nanosegundos (nunca se reutiliza aunque la clave se
+    pierda del caché), así que también sirve como "última modificación".
+    """
+    key = _version_key(property_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_availability_version(*property_ids):
+    """
+    Marca como cambiada la disponibilidad de una o varias propiedades e invalida
+    los datos cacheados que dependen de ella.
+    """
+    from properties.utils.ical import invalidate_ical_exports
+
+    property_ids = {pid for pid in property_ids if pid is not None}
+    if not property_ids:
+        return
+    version = _time.time_ns()
+    cache.set_many({_version_key(pid): version for pid in property_ids}, None)
+    invalidate_ical_exports(property_ids)
+
+
+def _bump_on_write(*property_ids):
+    bump_availability_version(*property_ids)
+    # Dentro de una transacción, volver a invalidar tras el commit: una lectura
+    # concurrente pudo cachear el estado anterior mientras la transacción seguía abierta
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump_availability_version(*property_ids))
+
+
+def stay_nights(arrival, departure):
+    """
+    Convierte un intervalo [arrival, departure) en el rango de noches [first, end).
+
+    Args:
+        arrival: datetime aware de llegada
+        departure: datetime aware de salida
+
+    Returns:
+        tuple: (primera noche, noche siguiente a la última) como date
+    """
+    first = (localtime(arrival, MX_TZ) - NIGHT_BOUNDARY).date()
+    end_dt = localtime(departure, MX_TZ) - NIGHT_BOUNDARY
+    end = end_dt.date()
+    if end_dt.time() != time(0):
+        end += timedelta(days=1)
+    if end <= first:
+        end = first + timedelta(days=1)
+    return first, end
+
+
+def _nights_for_booking(booking):
+    from properties.models import OccupiedNight
+
+    first, end = stay_nights(booking.arrival, booking.departure)
+    return [
+        OccupiedNight(
+            property_id=booking.property_id,
+            booking_id=booking.pk,
+            night=first + timedelta(days=i),
+        )
+        for i in range((end - first).days)
+    ]
+
+
+def index_booking(booking):
+    """
+    (Re)construye las noches ocupadas por una reserva.
+
+    Se llama desde la señal post_save de Booking; es idempotente.
+
+    Returns:
+        int: número de noches indexadas
+    """
+    from properties.models import OccupiedNight
+
+    with transaction.atomic():
+        OccupiedNight.objects.filter(booking_id=booking.pk).delete()
+        rows = _nights_for_booking(booking) if booking.status in BLOCKING_STATUSES else []
+        OccupiedNight.objects.bulk_create(rows)
+    _bump_on_write(booking.property_id)
+    return len(rows)
+
+
+def touch_booking(booking):
+    """
+    Invalida lo cacheado de la propiedad de una reserva sin rehacer sus noches.
+
+    Para cambios que no afectan al índice pero sí al .ics exportado (EXPORTED_FIELDS).
+    """
+    _bump_on_write(booking.property_id)
+
+
+def _nights_for_external_block(block):
+    from properties.models import OccupiedNight
+
+    # Los bloqueos externos son fechas [start, end): la noche N es la fecha N
+    return [
+        OccupiedNight(
+            property_id=block.property_id,
+            external_block_id=block.pk,
+            night=block.start + timedelta(days=i),
+        )
+        for i in range(max((block.end - block.start).days, 1))
+    ]
+
+
+def index_external_blocks(blocks):
+    """
+    (Re)construye las noches ocupadas por varios bloqueos externos.
+
+    Returns:
+        int: número de noches indexadas
+    """
+    from properties.models import OccupiedNight
+
+    blocks = list(blocks)
+    if not blocks:
+        return 0
+    rows = [row for block in blocks for row in _nights_for_external_block(block)]
+    with transaction.atomic():
+        OccupiedNight.objects.filter(external_block_id__in=[b.pk for b in blocks]).delete()
+        OccupiedNight.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def release_bookings(bookings_qs):
+    """
+    Elimina del índice las noches de las reservas de un queryset.
+
+    Necesario antes de un queryset.update(status=...) masivo, que no dispara señales.
+    """
+    from properties.models import OccupiedNight
+
+    rows = list(bookings_qs.values_list("id", "property_id"))
+    deleted, _ = OccupiedNight.objects.filter(booking_id__in=[pk for pk, _ in rows]).delete()
+    property_ids = {pid for _, pid in rows}
+    _bump_on_write(*property_ids)
+    return deleted
+
+
+def nights_occupied(property_id, checkin_dt, checkout_dt, *, exclude_booking_id=None):
+    """
+    Indica si alguna noche de [checkin_dt, checkout_dt) está ocupada por una reserva
+    local o por un bloqueo externo.
+
+    Los holds vencidos los libera mark_expired_holds (cada pocos segundos), así que
+    cualquier fila del índice bloquea.
+
+    Returns:
+        bool: True si hay al menos una noche ocupada
+    """
+    from properties.models import OccupiedNight
+
+    first, end = stay_nights(checkin_dt, checkout_dt)
+    qs = OccupiedNight.objects.filter(
+        property_id=property_id,
+        night__gte=first,
+        night__lt=end,
+    )
+
+    if exclude_booking_id:
+        qs = qs.exclude(booking_id=exclude_booking_id)
+
+    return qs.exists()
+
+
+def occupied_property_ids(property_ids, checkin_dt, checkout_dt):
+    """
+    Versión en lote de nights_occupied: una sola consulta para varias propiedades.
+
+    Returns:
+        set: IDs de las propiedades con alguna noche ocupada en [checkin_dt, checkout_dt)
+    """
+    from properties.models import OccupiedNight
+
+    first, end = stay_nights(checkin_dt, checkout_dt)
+    return set(
+        OccupiedNight.objects.filter(
+            property_id__in=property_ids,
+            night__gte=first,
+            night__lt=end,
+        )
+        .values_list("property_id", flat=True)
+        .distinct()
+    )
+
+
+def rebuild_occupancy(property_id=None):
+    """
+    Reconstruye el índice desde cero a partir de las reservas y los bloqueos externos.
+
+    Args:
+        property_id: limitar a una propiedad (None = todas)
+
+    Returns:
+        int: número de noches indexadas
+    """
+    from bookings.models import Booking
+    from properties.models import ExternalBlock, OccupiedNight
+
+    bookings = Booking.objects.filter(status__in=BLOCKING_STATUSES)
+    blocks = ExternalBlock.objects.all()
+    stale = OccupiedNight.objects.all()
+    if property_id is not None:
+        bookings = bookings.filter(property_id=property_id)
+        blocks = blocks.filter(property_id=property_id)
+        stale = stale.filter(property_id=property_id)
+
+    total = 0
+    with transaction.atomic():
+        stale.delete()
+        batch = []
+        for booking in bookings.only(
+            "id", "property_id", "arrival", "departure", "status", "hold_expires_at"
+        ).iterator():
+            batch.extend(_nights_for_booking(booking))
+            if len(batch) >= 1000:
+                OccupiedNight.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        for block in blocks.only("id", "property_id", "start", "end").iterator():
+            batch.extend(_nights_for_external_block(block))
+            if len(batch) >= 1000:
+                OccupiedNight.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            OccupiedNight.objects.bulk_create(batch)
+            total += len(batch)
+
+    logger.info(f"Índice de ocupación reconstruido: {total} noches")
+    return total
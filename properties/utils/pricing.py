@@ -0,0 +1,151 @@
+# properties/utils/pricing.py
+"""
+Cotización en lote: muchas estancias y propiedades de una vez.
+
+Property.quote_total() calcula una estancia con Decimal. Aquí el mismo cálculo
+se hace con enteros en céntimos, que es exacto y mucho más rápido. El
+resultado coincide céntimo a céntimo con quote_total():
+
+    base      = precio_noche * noches
+    descuento = ROUND_HALF_UP(base * 10 % o 20 %)   (7+ / 30+ noches)
+    gravable  = base - descuento + limpieza
+    total     = gravable + ROUND_HALF_UP(gravable * 16 %)
+
+Como todo es entero y no negativo, ROUND_HALF_UP(x * p / 100) es
+(x * p + 50) // 100. De ahí:
+
+    base - descuento = (precio * noches * (100 - p) + 49) // 100
+    total            = (gravable * 116 + 50) // 100
+
+noches * (100 - p) depende solo del número de noches y se precalcula, así que
+cada estancia cuesta dos multiplicaciones y dos divisiones enteras.
+"""
+from array import array
+from datetime import date, datetime
+from decimal import Decimal
+
+CENT = Decimal("0.01")
+
+# (noches mínimas, % de descuento), de mayor a menor
+DISCOUNT_TIERS = ((30, 20), (7, 10))
+
+
+def to_cents(amount):
+    """Decimal con 2 decimales (o int/str) a céntimos enteros."""
+    return int(Decimal(amount).quantize(CENT) * 100)
+
+
+def from_cents(cents):
+    return (Decimal(cents) / 100).quantize(CENT)
+
+
+def discount_percent(nights):
+    """Porcentaje de descuento por duración de la estancia."""
+    for min_nights, percent in DISCOUNT_TIERS:
+        if nights >= min_nights:
+            return percent
+    return 0
+
+
+def _pricing_constants():
+    from properties.models import LIMPIEZA, TAX_IMPUESTOS
+
+    return to_cents(LIMPIEZA), 100 + int(TAX_IMPUESTOS * 100)
+
+
+def quote_totals_cents(nightly_cents, nights):
+    """
+    Núcleo del cálculo: totales en céntimos para pares (precio, noches).
+
+    Args:
+        nightly_cents: secuencia de precios por noche en céntimos
+        nights: secuencia de noches (> 0), de la misma longitud
+
+    Returns:
+        array('q'): total de cada estancia en céntimos
+    """
+    cleaning, tax_factor = _pricing_constants()
+    # noches * (100 - descuento), una vez por cada número de noches distinto
+    factors = {n: n * (100 - discount_percent(n)) for n in set(nights)}
+    return array("q", [
+        (((price * factors[n] + 49) // 100 + cleaning) * tax_factor + 50) // 100
+        for price, n in zip(nightly_cents, nights)
+    ])
+
+
+def subtotal_totals_cents(subtotal_cents, nights):
+    """
+    Como quote_totals_cents(), pero a partir del subtotal de cada estancia (antes
+    del descuento) en céntimos: para estancias con tarifas por noche (NightlyRate).
+    """
+    cleaning, tax_factor = _pricing_constants()
+    keep = {n: 100 - discount_percent(n) for n in set(nights)}
+    return array("q", [
+        (((subtotal * keep[n] + 49) // 100 + cleaning) * tax_factor + 50) // 100
+        for subtotal, n in zip(subtotal_cents, nights)
+    ])
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def quote_totals(properties, stays):
+    """
+    Totales de varias estancias para varias propiedades (todas las combinaciones),
+    con el mismo redondeo que Property.quote_total().
+
+    Para el listado (muchas propiedades, una estancia), para búsquedas de fechas
+    flexibles (una propiedad, muchas estancias) o para previsualizar cambios de fecha.
+
+    Las propiedades con tarifas por noche (NightlyRate) se cotizan con sus sumas
+    prefijas; el resto, con el núcleo de precio fijo.
+
+    Args:
+        properties: iterable de Property
+        stays: iterable de (checkin, checkout) como date, datetime o "YYYY-MM-DD"
+
+    Returns:
+        dict: {property_id: [total Decimal o None, uno por estancia]}. None donde
+              quote_total() lanzaría ValueError (sin tarifa o fechas mal configuradas).
+    """
+    from properties.utils.rates import get_rate_calendars
+
+    properties = list(properties)
+    stays = [(_as_date(checkin), _as_date(checkout)) for checkin, checkout in stays]
+    nights = [(checkout - checkin).days for checkin, checkout in stays]
+    valid = [i for i, n in enumerate(nights) if n > 0]
+    calendars = get_rate_calendars([p.id for p in properties]) if properties and valid else {}
+    result = {p.id: [None] * len(nights) for p in properties}
+
+    # Precio fijo: todas las combinaciones en dos arrays planos, propiedad-major
+    priced = [p for p in properties if p.nightly_price and not calendars.get(p.id)]
+    flat_nights = [nights[i] for i in valid] * len(priced)
+    flat_prices = [cents for cents in map(to_cents, (p.nightly_price for p in priced)) for _ in valid]
+    totals = iter(quote_totals_cents(flat_prices, flat_nights))
+    for prop in priced:
+        row = result[prop.id]
+        for i in valid:
+            row[i] = from_cents(next(totals))
+
+    # Tarifas por noche: subtotal de cada estancia en O(1) con las sumas prefijas
+    for prop in properties:
+        calendar = calendars.get(prop.id)
+        if not calendar:
+            continue
+        default = to_cents(prop.nightly_price) if prop.nightly_price else None
+        subtotals = {}
+        for i in valid:
+            try:
+                subtotals[i] = calendar.subtotal_cents(*stays[i], default)
+            except ValueError:
+                pass
+        row = result[prop.id]
+        quoted = subtotal_totals_cents(subtotals.values(), [nights[i] for i in subtotals])
+        for i, total in zip(subtotals, quoted):
+            row[i] = from_cents(total)
+    return result
@@ -0,0 +1,140 @@
+# properties/utils/quotes.py
+"""
+Cotizaciones memorizadas: Property.quote_total() una sola vez por estancia.
+
+Un mismo flujo cotiza la misma estancia varias veces (crear la reserva, pagar el
+depósito, previsualizar y aplicar un cambio de fechas...). get_quote() guarda el
+resultado en dos niveles:
+
+  1. Un LRU en memoria del proceso (QUOTE_LRU_SIZE entradas), sin red.
+  2. El caché compartido (QUOTE_CACHE_TIMEOUT), para el resto de workers.
+
+La clave es (propiedad, versión de precios, checkin, checkout). La versión de
+precios cambia al guardar la propiedad o sus tarifas por noche, así que una
+cotización antigua nunca se vuelve a servir: sus entradas simplemente caducan.
+"""
+from collections import OrderedDict
+from threading import Lock
+import time as _time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+QUOTE_LRU_SIZE = getattr(settings, 'QUOTE_LRU_SIZE', 1024)  # cotizaciones en memoria por proceso
+QUOTE_CACHE_TIMEOUT = getattr(settings, 'QUOTE_CACHE_TIMEOUT', 3600)  # 1 hora en el caché compartido
+
+
+class _LRU:
+    """Diccionario acotado con expulsión de la entrada menos usada; seguro entre hilos."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_local_quotes = _LRU(QUOTE_LRU_SIZE)
+
+
+def _version_key(property_id):
+    return f"pricing_version:{property_id}"
+
+
+def pricing_version(property_id):
+    """
+    Versión actual de los precios de una propiedad (nightly_price y NightlyRate).
+
+    Como occupancy.availability_version, es un timestamp en nanosegundos que no se
+    reutiliza aunque la clave se pierda del caché.
+    """
+    key = _version_key(property_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_pricing_version(*property_ids):
+    """Invalida las cotizaciones memorizadas de una o varias propiedades."""
+    property_ids = {pid for pid in property_ids if pid is not None}
+    if not property_ids:
+        return
+
+    def bump():
+        version = _time.time_ns()
+        cache.set_many({_version_key(pid): version for pid in property_ids}, None)
+
+    bump()
+    # Tras el commit otra vez: una cotización concurrente pudo leer los precios anteriores
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
+
+
+def _quote_cache_key(property_id, version, checkin, checkout):
+    return f"quote:{property_id}:{version}:{checkin.isoformat()}:{checkout.isoformat()}"
+
+
+def get_quote(prop, checkin, checkout):
+    """
+    Igual que prop.quote_total(checkin, checkout), memorizado.
+
+    Se cotiza con los precios guardados, releídos tras leer la versión: una
+    instancia cargada antes de un cambio de precio no deja una cotización antigua
+    bajo la versión nueva, y cambiar nightly_price en memoria sin guardar no se
+    refleja hasta llamar a save(). Si la versión cambia mientras se calcula, el
+    resultado se devuelve pero no se memoriza.
+
+    Returns:
+        dict: copia del desglose de quote_total()
+
+    Raises:
+        ValueError: como quote_total() (los errores no se memorizan)
+    """
+    if not prop.pk:
+        return prop.quote_total(checkin, checkout)
+
+    checkin, checkout = prop._to_date(checkin), prop._to_date(checkout)
+    version = pricing_version(prop.pk)
+    local_key = (prop.pk, version, checkin, checkout)
+
+    quote = _local_quotes.get(local_key)
+    if quote is None:
+        shared_key = _quote_cache_key(prop.pk, version, checkin, checkout)
+        quote = cache.get(shared_key)
+        if quote is None:
+            from properties.models import Property
+
+            priced = Property.objects.only("id", "nightly_price").get(pk=prop.pk)
+            quote = priced.quote_total(checkin, checkout)
+            if pricing_version(prop.pk) != version:
+                return dict(quote)
+            cache.set(shared_key, quote, QUOTE_CACHE_TIMEOUT)
+        _local_quotes.set(local_key, quote)
+    return dict(quote)
+
+
+def clear_local_quotes():
+    """Vacía el LRU del proceso (el caché compartido se invalida por versión)."""
+    _local_quotes.clear()
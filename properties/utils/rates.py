@@ -0,0 +1,197 @@
+# properties/utils/rates.py
+"""
+Tarifas por noche (NightlyRate): fines de semana, temporadas, festivos...
+
+Property.nightly_price es la tarifa por defecto; cada NightlyRate la sustituye
+para una noche concreta. Para cotizar una estancia sin recorrer sus noches, las
+tarifas de una propiedad se guardan en caché como sumas prefijas (RateCalendar):
+dos arrays indexados por noche desde la primera tarifa, uno con los céntimos
+acumulados y otro con el número de noches con tarifa. El subtotal de cualquier
+estancia sale de dos restas:
+
+    noches con tarifa = count[b] - count[a]
+    subtotal          = (cents[b] - cents[a]) + precio_por_defecto * (noches - noches con tarifa)
+
+donde [a, b) es la estancia recortada al tramo que cubren las tarifas.
+"""
+from array import array
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import transaction
+
+from properties.utils.pricing import from_cents, to_cents
+
+NIGHTLY_RATES_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+class RateCalendar:
+    """
+    Tarifas por noche de una propiedad como sumas prefijas en céntimos.
+
+    start es el ordinal de la primera noche con tarifa; cents[i] y count[i] acumulan
+    las noches [start, start + i). Una propiedad sin tarifas es un RateCalendar vacío.
+    """
+
+    __slots__ = ("start", "cents", "count")
+
+    def __init__(self, start=0, cents=(0,), count=(0,)):
+        self.start = start
+        self.cents = array("q", cents)
+        self.count = array("i", count)
+
+    @classmethod
+    def from_rates(cls, rates):
+        """rates: iterable de (night, price) con noches distintas."""
+        by_night = {night.toordinal(): to_cents(price) for night, price in rates}
+        if not by_night:
+            return cls()
+        start = min(by_night)
+        cents, count = [0], [0]
+        for night in range(start, max(by_night) + 1):
+            price = by_night.get(night)
+            cents.append(cents[-1] + (price or 0))
+            count.append(count[-1] + (price is not None))
+        return cls(start, cents, count)
+
+    def __bool__(self):
+        return self.count[-1] > 0
+
+    def __getstate__(self):
+        return self.start, self.cents.tobytes(), self.count.tobytes()
+
+    def __setstate__(self, state):
+        self.start, cents, count = state
+        self.cents, self.count = array("q"), array("i")
+        self.cents.frombytes(cents)
+        self.count.frombytes(count)
+
+    def window(self, checkin, checkout):
+        """
+        Tarifas de las noches [checkin, checkout) en O(1).
+
+        Returns:
+            tuple: (céntimos de las noches con tarifa, número de noches con tarifa)
+        """
+        last = len(self.count) - 1
+        a = min(max(checkin.toordinal() - self.start, 0), last)
+        b = min(max(checkout.toordinal() - self.start, 0), last)
+        if b <= a:
+            return 0, 0
+        return self.cents[b] - self.cents[a], self.count[b] - self.count[a]
+
+    def subtotal_cents(self, checkin, checkout, default_cents):
+        """
+        Subtotal en céntimos de la estancia: tarifas propias más la tarifa por defecto
+        en el resto de noches.
+
+        Raises:
+            ValueError: si alguna noche no tiene tarifa y no hay precio por defecto
+        """
+        nights = (checkout - checkin).days
+        cents, covered = self.window(checkin, checkout)
+        if covered < nights:
+            if default_cents is None:
+                raise ValueError("Faltan tarifas por configurar")
+            cents += default_cents * (nights - covered)
+        return cents
+
+
+def _cache_key(property_id):
+    return f"nightly_rates:{property_id}"
+
+
+def _load_calendars(property_ids):
+    from properties.models import NightlyRate
+
+    rates = {pid: [] for pid in property_ids}
+    for property_id, night, price in NightlyRate.objects.filter(
+        property_id__in=property_ids
+    ).values_list("property_id", "night", "price"):
+        rates[property_id].append((night, price))
+    calendars = {pid: RateCalendar.from_rates(rows) for pid, rows in rates.items()}
+    cache.set_many({_cache_key(pid): calendar for pid, calendar in calendars.items()}, NIGHTLY_RATES_CACHE_TIMEOUT)
+    return calendars
+
+
+def get_rate_calendars(property_ids):
+    """
+    RateCalendar de varias propiedades: un cache.get_many y, para las que falten,
+    una sola consulta.
+
+    Returns:
+        dict: {property_id: RateCalendar}
+    """
+    property_ids = list(dict.fromkeys(property_ids))
+    cached = cache.get_many([_cache_key(pid) for pid in property_ids])
+    calendars = {pid: cached[_cache_key(pid)] for pid in property_ids if _cache_key(pid) in cached}
+    missing = [pid for pid in property_ids if pid not in calendars]
+    if missing:
+        calendars.update(_load_calendars(missing))
+    return calendars
+
+
+def get_rate_calendar(property_id):
+    return get_rate_calendars([property_id])[property_id]
+
+
+def invalidate_rate_calendar(property_id):
+    """
+    Descarta el RateCalendar cacheado (también al confirmar la transacción en curso)
+    y las cotizaciones memorizadas de la propiedad.
+    """
+    from properties.utils.quotes import bump_pricing_version
+
+    cache.delete(_cache_key(property_id))
+    transaction.on_commit(lambda: cache.delete(_cache_key(property_id)))
+    bump_pricing_version(property_id)
+
+
+def stay_subtotal(prop, checkin, checkout):
+    """
+    Subtotal (antes de descuentos, limpieza e impuestos) de una estancia válida.
+
+    Returns:
+        tuple: (subtotal Decimal, True si alguna noche tiene tarifa propia)
+
+    Raises:
+        ValueError: si alguna noche no tiene tarifa y no hay nightly_price
+    """
+    calendar = get_rate_calendar(prop.pk) if prop.pk else RateCalendar()
+    default = to_cents(prop.nightly_price) if prop.nightly_price else None
+    if not calendar.window(checkin, checkout)[1]:
+        if default is None:
+            raise ValueError("Faltan tarifas por configurar")
+        return (prop.nightly_price * (checkout - checkin).days).quantize(Decimal("0.01")), False
+    return from_cents(calendar.subtotal_cents(checkin, checkout, default)), True
+
+
+def set_nightly_rates(prop, start, end, price, weekdays=None):
+    """
+    Fija la tarifa de las noches [start, end) de una propiedad (temporadas, fines de semana).
+
+    Args:
+        prop: Property o su ID
+        start, end: date, fin exclusivo
+        price: Decimal, o None para volver a la tarifa por defecto
+        weekdays: días de la semana (0=lunes ... 6=domingo) a los que aplicar; todos si None
+
+    Returns:
+        int: noches modificadas
+    """
+    from properties.models import NightlyRate
+
+    property_id = getattr(prop, "pk", prop)
+    nights = [
+        start + timedelta(days=i)
+        for i in range((end - start).days)
+        if weekdays is None or (start + timedelta(days=i)).weekday() in weekdays
+    ]
+    with transaction.atomic():
+        NightlyRate.objects.filter(property_id=property_id, night__in=nights).delete()
+        if price is not None:
+            NightlyRate.objects.bulk_create(
+                [NightlyRate(property_id=property_id, night=night, price=price) for night in nights]
+            )
+        invalidate_rate_calendar(property_id)
+    return len(nights)
@@ -3,21 +3,24 @@ from django.views.generic.list import ListView
 from django.views.generic.detail import DetailView
 from django.shortcuts import redirect, render
 from django.urls import reverse, reverse_lazy
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, HttpResponseNotModified, Http404
 from django.views import View
-from .models import Property, PropertyImage
+from .models import Property, PropertyImage, _parse_stay, bulk_availability
 from .forms import BookingForm
 from bookings.models import Booking
 from django.db.models import Prefetch
 from core.tzutils import compose_aware_dt
 from django.utils import timezone
-from datetime import date, timedelta
-from properties.utils.ical import fetch_ical_bookings, generate_ical_for_property
+from datetime import date
+from properties.utils.date_picker import get_disabled_dates
+from properties.utils.ical import build_ical_export, get_cached_ical_export
+from properties.utils.pricing import quote_totals
 import json
 from django.utils.safestring import mark_safe
 import logging
-from django_ratelimit.decorators import ratelimit
-from django.utils.decorators import method_decorator
+from django_ratelimit.core import is_ratelimited
+from django_ratelimit.exceptions import Ratelimited
+from django.utils.http import parse_etags
 
 # Configurar logger
 logger = logging.getLogger(__name__)
@@ -55,14 +58,25 @@ class PropertiesList(ListView):
 
         props = list(ctx["property_list"])
 
-        # Disponibilidad como ya hacías
+        # Disponibilidad de todo el catálogo en lote (1 consulta + 1 contador de caché;
+        # si hay calendarios caducados, además 1 cache.get_many y el encolado de sus refrescos)
         if checkin and checkout and cant_personas:
+            availability = bulk_availability(props, checkin, checkout, cant_personas)
             for p in props:
-                p.available = p.is_available(checkin, checkout, cant_personas)
+                p.available = availability[p.id]
         else:
             for p in props:
                 p.available = None
 
+        # Total de la estancia por propiedad, cotizado en lote (solo estancias válidas,
+        # como en is_available: futuras y de MIN_NIGHTS a MAX_NIGHTS noches)
+        stay_totals = {}
+        stay = _parse_stay(checkin, checkout, 1) if checkin and checkout else None
+        if stay:
+            stay_totals = quote_totals(props, [(stay[0].date(), stay[1].date())])
+        for p in props:
+            p.stay_total = stay_totals.get(p.id, [None])[0]
+
         # Flags por usuario
         user = self.request.user
         for p in props:
@@ -182,26 +196,14 @@ class PropertyDetail(DetailView):
             context["available"] = None
             context["form"] = BookingForm()
 
-        #Config para el calendario sincronizado
-        if self.object.airbnb_ical_url:
-            try:
-                blocked_ranges = fetch_ical_bookings(self.object.airbnb_ical_url)
-                # Expandir a días individuales
-                blocked_dates = []
-                for start, end in blocked_ranges:
-                    current = start
-                    while current < end:
-                        blocked_dates.append(current.isoformat())
-                        current += timedelta(days=1)
-                # Serializar como JSON de forma segura
-                context["blocked_dates"] = mark_safe(json.dumps(blocked_dates))
-                context["booked_ranges"] = [
-                    f"{start.toordinal()}_{end.toordinal()}" for start, end in blocked_ranges
-                ]
-            except Exception as e:
-                # En caso de error, usar lista vacía serializada
-                context["blocked_dates"] = mark_safe(json.dumps([]))
-                context["booked_ranges"] = []
+        #Config para el calendario: reservas, holds vigentes y calendarios externos,
+        #ya serializado y cacheado por versión de disponibilidad (ver date_picker.py)
+        try:
+            context["blocked_dates"] = mark_safe(get_disabled_dates(self.object.pk)["dates"])
+        except Exception as e:
+            # En caso de error, usar lista vacía serializada
+            logger.error(f"Error calculando fechas bloqueadas de propiedad {self.object.pk}: {e}")
+            context["blocked_dates"] = mark_safe(json.dumps([]))
 
         return context
     
@@ -224,53 +226,100 @@ class PropertyDetail(DetailView):
             return self.render_to_response(context)
 
 
-@method_decorator(ratelimit(key='ip', rate='20/h', method='GET', block=True), name='dispatch')
+class DisabledDatesView(View):
+    """
+    Fechas deshabilitadas del selector de fechas de una propiedad, en JSON.
+    URL: /properties/<pk>/disabled-dates/
+
+    Es el mismo contenido que la ficha incrusta en la página, para clientes que
+    lo cargan aparte. Lleva un ETag fuerte: si el cliente envía If-None-Match con
+    el mismo valor se responde 304 sin cuerpo.
+    """
+
+    def get(self, request, pk):
+        if not Property.objects.filter(pk=pk).exists():
+            raise Http404("Propiedad no encontrada")
+        payload = get_disabled_dates(pk)
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+            if '*' in etags or payload['etag'] in etags:
+                response = HttpResponseNotModified()
+                response['ETag'] = payload['etag']
+                return response
+
+        response = HttpResponse(payload['body'], content_type='application/json')
+        response['ETag'] = payload['etag']
+        # Los navegadores siempre revalidan: las fechas cambian con cada reserva
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
 class ExportCalendarView(View):
     """
     Vista pública para exportar calendario iCal de una propiedad.
     URL: /properties/calendar/<ical_token>/
     No requiere autenticación (para que Airbnb pueda acceder).
 
-    Rate limiting: Máximo 20 peticiones por hora por IP para prevenir
-    ataques de enumeración de tokens.
+    El .ics se cachea por propiedad (ver build_ical_export) y se invalida cuando
+    cambian sus reservas, así que el sondeo periódico de Airbnb cuesta una lectura
+    de caché y ninguna consulta. Lleva un ETag fuerte: si el cliente envía
+    If-None-Match con el mismo valor se responde 304 sin cuerpo.
+
+    Rate limiting: Máximo 20 tokens inválidos por hora por IP para prevenir
+    ataques de enumeración de tokens. Las respuestas servidas desde caché no
+    cuentan (solo puede estar en caché un token válido).
     """
 
+    RATELIMIT = dict(group='ical_export', key='ip', rate='20/h', method='GET')
+
     def get(self, request, ical_token):
         # Obtener IP del cliente para logging
         ip_address = self._get_client_ip(request)
 
-        # Buscar propiedad por token
-        try:
-            property_obj = Property.objects.get(ical_token=ical_token)
-
-            # Log de acceso exitoso (solo en DEBUG o con nivel INFO)
-            logger.info(
-                f"iCal calendar accessed successfully: "
-                f"property={property_obj.name} (ID: {property_obj.id}), "
-                f"token={ical_token[:8]}..., ip={ip_address}"
-            )
-
-        except Property.DoesNotExist:
-            # Log de intento fallido (IMPORTANTE para detectar ataques)
-            logger.warning(
-                f"Invalid iCal token attempt: "
-                f"token={ical_token[:8]}... (length: {len(ical_token)}), "
-                f"ip={ip_address}, "
-                f"user_agent={request.META.get('HTTP_USER_AGENT', 'Unknown')[:100]}"
-            )
-            raise Http404("Calendario no encontrado")
-
-        # Generar calendario
-        cal = generate_ical_for_property(property_obj)
+        export = get_cached_ical_export(ical_token)
+        if export is None:
+            if is_ratelimited(request, increment=False, **self.RATELIMIT):
+                raise Ratelimited()
+
+            # Buscar propiedad por token y generar el calendario
+            export = build_ical_export(ical_token)
+            if export is None:
+                limited = is_ratelimited(request, increment=True, **self.RATELIMIT)
+                # Log de intento fallido (IMPORTANTE para detectar ataques)
+                logger.warning(
+                    f"Invalid iCal token attempt: "
+                    f"token={ical_token[:8]}... (length: {len(ical_token)}), "
+                    f"ip={ip_address}, "
+                    f"user_agent={request.META.get('HTTP_USER_AGENT', 'Unknown')[:100]}"
+                )
+                if limited:
+                    raise Ratelimited()
+                raise Http404("Calendario no encontrado")
+
+        # Log de acceso exitoso (solo en DEBUG o con nivel INFO)
+        logger.info(
+            f"iCal calendar accessed successfully: "
+            f"property={export['name']} (ID: {export['property_id']}), "
+            f"token={ical_token[:8]}..., ip={ip_address}"
+        )
 
-        # Serializar a formato .ics
-        ical_content = cal.to_ical()
+        # Revalidación: mismo ETag => 304 sin cuerpo
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+            if '*' in etags or export['etag'] in etags:
+                response = HttpResponseNotModified()
+                response['ETag'] = export['etag']
+                return response
 
         # Crear response
-        response = HttpResponse(ical_content, content_type='text/calendar; charset=utf-8')
+        response = HttpResponse(export['body'], content_type='text/calendar; charset=utf-8')
+        response['ETag'] = export['etag']
 
         # Nombre de archivo seguro (sanitizar para evitar problemas)
-        filename = self._sanitize_filename(property_obj.name)
+        filename = self._sanitize_filename(export['name'])
         response['Content-Disposition'] = f'attachment; filename="{filename}.ics"'
 
         return response
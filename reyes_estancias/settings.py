@@ -245,7 +245,36 @@ STRIPE_WEBHOOK_SECRET = env("STRIPE_WEBHOOK_SECRET")  # lo pondrás tras crear e
 # iCal Fetch Security Settings
 ICAL_REQUEST_TIMEOUT = env.int('ICAL_REQUEST_TIMEOUT', default=10)  # segundos
 ICAL_MAX_SIZE = env.int('ICAL_MAX_SIZE', default=5 * 1024 * 1024)  # 5 MB en bytes
-ICAL_CACHE_TIMEOUT = env.int('ICAL_CACHE_TIMEOUT', default=900)  # 15 minutos en segundos
+ICAL_CACHE_TIMEOUT = env.int('ICAL_CACHE_TIMEOUT', default=900)  # 15 minutos en segundos (TTL blando: caché de descargas no forzadas; las vistas refrescan como pronto pasado el intervalo máximo de sondeo)
+ICAL_CACHE_HARD_TIMEOUT = env.int('ICAL_CACHE_HARD_TIMEOUT', default=7200)  # 2 horas (TTL duro: pasado este tiempo el calendario cuenta como no disponible)
+ICAL_EXPORT_CACHE_TIMEOUT = env.int('ICAL_EXPORT_CACHE_TIMEOUT', default=3600)  # 1 hora (máximo que se cachea el .ics exportado)
+# Sincronización concurrente de calendarios (sync_all_property_calendars)
+ICAL_SYNC_MAX_WORKERS = env.int('ICAL_SYNC_MAX_WORKERS', default=16)  # descargas simultáneas en total
+ICAL_SYNC_PER_HOST_LIMIT = env.int('ICAL_SYNC_PER_HOST_LIMIT', default=4)  # descargas simultáneas por host
+ICAL_SYNC_DEADLINE = env.int('ICAL_SYNC_DEADLINE', default=480)  # segundos; por debajo de CELERY_TASK_SOFT_TIME_LIMIT
+# Cliente HTTP compartido para descargar calendarios (keep-alive y reintentos)
+ICAL_HTTP_POOL_MAXSIZE = env.int('ICAL_HTTP_POOL_MAXSIZE', default=ICAL_SYNC_PER_HOST_LIMIT)  # conexiones abiertas por host
+ICAL_HTTP_RETRIES = env.int('ICAL_HTTP_RETRIES', default=2)  # reintentos ante errores de conexión y 429/5xx
+ICAL_HTTP_BACKOFF = env.float('ICAL_HTTP_BACKOFF', default=0.5)  # segundos; se duplica en cada reintento
+# Feeds caídos: error cacheado por feed y circuit breaker por host
+ICAL_FAILURE_CACHE_TIMEOUT = env.int('ICAL_FAILURE_CACHE_TIMEOUT', default=120)  # segundos que se recuerda el error de un feed
+ICAL_BREAKER_THRESHOLD = env.int('ICAL_BREAKER_THRESHOLD', default=5)  # fallos seguidos de un host que abren el circuito
+ICAL_BREAKER_COOLDOWN = env.int('ICAL_BREAKER_COOLDOWN', default=300)  # segundos sin peticiones al host con el circuito abierto
+# Sondeo adaptativo de calendarios (sync_due_calendars)
+ICAL_POLL_MIN_INTERVAL = env.int('ICAL_POLL_MIN_INTERVAL', default=600)  # 10 minutos (feeds que cambian a menudo)
+ICAL_POLL_DEFAULT_INTERVAL = env.int('ICAL_POLL_DEFAULT_INTERVAL', default=1800)  # 30 minutos (feeds nuevos y propiedades ocupadas)
+ICAL_POLL_MAX_INTERVAL = env.int('ICAL_POLL_MAX_INTERVAL', default=5400)  # 1,5 horas; por debajo de ICAL_CACHE_HARD_TIMEOUT
+ICAL_POLL_ERROR_MAX_INTERVAL = env.int('ICAL_POLL_ERROR_MAX_INTERVAL', default=5400)  # 1,5 horas (máximo backoff de feeds con errores); por debajo de ICAL_CACHE_HARD_TIMEOUT
+ICAL_POLL_MAX_PER_TICK = env.int('ICAL_POLL_MAX_PER_TICK', default=50)  # feeds descargados como mucho en cada tick
+# Métricas por calendario externo (comando calendar_health y Admin)
+ICAL_METRICS_HISTORY = env.int('ICAL_METRICS_HISTORY', default=20)  # descargas recientes guardadas por feed
+ICAL_METRICS_SLOW_MS = env.int('ICAL_METRICS_SLOW_MS', default=3000)  # mediana de latencia a partir de la cual un feed es "lento"
+# Selector de fechas de la ficha (fechas deshabilitadas)
+DATE_PICKER_MONTHS = env.int('DATE_PICKER_MONTHS', default=12)  # meses que cubre, además del actual
+DATE_PICKER_CACHE_TIMEOUT = env.int('DATE_PICKER_CACHE_TIMEOUT', default=3600)  # 1 hora (máximo; se invalida con cada cambio de disponibilidad)
+# Cotizaciones memorizadas (properties.utils.quotes)
+QUOTE_LRU_SIZE = env.int('QUOTE_LRU_SIZE', default=1024)  # cotizaciones en memoria por proceso
+QUOTE_CACHE_TIMEOUT = env.int('QUOTE_CACHE_TIMEOUT', default=3600)  # 1 hora en el caché compartido (se invalida al cambiar precios)
 ICAL_ALLOWED_HOSTS = env.list('ICAL_ALLOWED_HOSTS', default=[
     'airbnb.com',
     'airbnb.es',
@@ -281,6 +310,8 @@ CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND', default='redis://127.0.0.1:
 CELERY_TASK_ALWAYS_EAGER = False
 CELERY_TIMEZONE = "America/Mexico_City"
 CELERY_ENABLE_UTC = True
+# Cada cuántos segundos se liberan los holds vencidos (bookings.tasks.mark_expired_holds)
+HOLD_EXPIRY_POLL_SECONDS = env.int('HOLD_EXPIRY_POLL_SECONDS', default=10)
 CELERY_BEAT_SCHEDULE = {
     "charge-balances-every-15-min": {
         "task": "payments.tasks.scan_and_charge_balances",
@@ -295,13 +326,14 @@ CELERY_BEAT_SCHEDULE = {
         "task": "bookings.tasks.mark_completed_bookings",
         "schedule": crontab(hour=3, minute=15),  # 3:15 AM, tras mark-expired
     },
-    "mark-expired-holds-hourly": {
+    "mark-expired-holds-poll": {
         "task": "bookings.tasks.mark_expired_holds",
-        "schedule": crontab(minute=0),  # Cada hora en punto
+        "schedule": float(HOLD_EXPIRY_POLL_SECONDS),  # Cada pocos segundos; solo lee los holds vencidos
+        "options": {"expires": HOLD_EXPIRY_POLL_SECONDS},  # no acumular pasadas si el worker se atrasa
     },
-    "sync-property-calendars-every-30-min": {
-        "task": "properties.tasks.sync_all_property_calendars",
-        "schedule": crontab(minute="*/30"),  # Cada 30 minutos
+    "sync-due-calendars-every-5-min": {
+        "task": "properties.tasks.sync_due_calendars",
+        "schedule": crontab(minute="*/5"),  # Cada 5 minutos; solo los feeds vencidos
     },
 }
 CELERY_TASK_SERIALIZER = "json"
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Benchmark de la detección de solapamiento de reservas
+
+Mide el coste de Booking.objects.overlapping(...).exists() y de
+Property.is_available() para una propiedad con un histórico creciente de
+reservas pasadas. Todo se ejecuta dentro de una transacción que se revierte
+al final, así que no deja datos en la base de datos.
+
+Uso:
+    python scripts/bench_availability.py
+    python scripts/bench_availability.py --sizes 0 1000 10000 50000 --repeat 200
+"""
+
+import os
+import sys
+import argparse
+import time
+from pathlib import Path
+
+# Agregar el directorio raíz del proyecto al path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+import django
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reyes_estancias.settings')
+django.setup()
+
+from datetime import date, timedelta
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from bookings.models import Booking
+from core.tzutils import compose_aware_dt
+from properties.models import Property
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _dt(days, hour):
+    return compose_aware_dt(date.today() + timedelta(days=days), hour=hour)
+
+
+def _add_history(prop, user, count, offset):
+    Booking.objects.bulk_create([
+        Booking(
+            user=user,
+            property=prop,
+            person_num=2,
+            # Estancias consecutivas de 2 noches hacia el pasado (sin solaparse entre sí)
+            arrival=_dt(-2 * (i + 1) - 5, 15),
+            departure=_dt(-2 * i - 5, 12),
+            status="confirmed" if i % 3 else "completed",
+        )
+        for i in range(offset, offset + count)
+    ], batch_size=2000)
+
+
+def _time(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de disponibilidad")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    checkin, checkout = _dt(10, 15), _dt(13, 12)
+
+    print(f"{'reservas pasadas':>18} | {'overlapping EXISTS (ms)':>24} | {'is_available (ms)':>18}")
+    print("-" * 68)
+    try:
+        with transaction.atomic():
+            user = get_user_model().objects.create(username=f"bench-{time.time_ns()}")
+            prop = Property.objects.create(name="Bench", description="-", max_people=4,
+                                           nightly_price=100, address="-")
+            loaded = 0
+            for size in sorted(args.sizes):
+                _add_history(prop, user, size - loaded, loaded)
+                loaded = size
+
+                exists_ms = _time(
+                    lambda: Booking.objects.overlapping(prop.id, checkin, checkout).exists(), args.repeat
+                )
+                avail_ms = _time(
+                    lambda: prop.is_available(checkin.date(), checkout.date(), 2), args.repeat
+                )
+                print(f"{size:>18} | {exists_ms:>24.3f} | {avail_ms:>18.3f}")
+            raise _Rollback()
+    except _Rollback:
+        pass
+
+
+if __name__ == "__main__":
+    main()
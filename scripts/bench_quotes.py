@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Benchmark de la cotización de estancias
+
+Compara Property.quote_total() (Decimal, una estancia por llamada) con la
+cotización en lote de properties.utils.pricing: quote_totals() (propiedades x
+estancias, devuelve Decimal) y su núcleo en céntimos quote_totals_cents().
+Las propiedades se crean en memoria; solo se consulta la base de datos (migrada)
+para leer sus tarifas por noche, que quedan en caché tras la primera pasada.
+
+Uso:
+    python scripts/bench_quotes.py
+    python scripts/bench_quotes.py --properties 200 --stays 365 --repeat 5
+"""
+
+import os
+import sys
+import argparse
+import random
+import time
+from pathlib import Path
+
+# Agregar el directorio raíz del proyecto al path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+import django
+
+# Setup Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reyes_estancias.settings')
+django.setup()
+
+from datetime import date, timedelta
+from decimal import Decimal
+from properties.models import Property
+from properties.utils.pricing import quote_totals, quote_totals_cents, to_cents
+
+
+def _best(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de cotizaciones")
+    parser.add_argument("--properties", type=int, default=100)
+    parser.add_argument("--stays", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    props = [
+        Property(id=i + 1, name=f"Bench {i}", nightly_price=Decimal(rng.randint(50000, 500000)) / 100)
+        for i in range(args.properties)
+    ]
+    today = date.today()
+    stays = []
+    for _ in range(args.stays):
+        checkin = today + timedelta(days=rng.randint(1, 300))
+        stays.append((checkin, checkin + timedelta(days=rng.randint(2, 45))))
+    count = len(props) * len(stays)
+
+    def one_by_one():
+        return {p.id: [p.quote_total(ci, co)["total"] for ci, co in stays] for p in props}
+
+    batch = quote_totals(props, stays)
+    assert batch == one_by_one(), "quote_totals no coincide con quote_total"
+
+    prices = [to_cents(p.nightly_price) for p in props for _ in stays]
+    nights = [(co - ci).days for ci, co in stays] * len(props)
+
+    print(f"{count} cotizaciones ({len(props)} propiedades x {len(stays)} estancias)")
+    print(f"{'método':>22} | {'ms':>9} | {'cotizaciones/ms':>16}")
+    print("-" * 54)
+    for label, fn in (
+        ("quote_total (Decimal)", one_by_one),
+        ("quote_totals", lambda: quote_totals(props, stays)),
+        ("quote_totals_cents", lambda: quote_totals_cents(prices, nights)),
+    ):
+        ms = _best(fn, args.repeat)
+        print(f"{label:>22} | {ms:>9.2f} | {count / ms:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
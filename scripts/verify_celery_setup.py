@@ -101,7 +101,7 @@ def verify_beat_schedule():
     expected_tasks = [
         'charge-balances-every-15-min',
         'mark-expired-bookings-daily',
-        'mark-expired-holds-hourly',
+        'mark-expired-holds-poll',
     ]
 
     schedule = settings.CELERY_BEAT_SCHEDULE
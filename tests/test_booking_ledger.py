@@ -0,0 +1,162 @@
+"""
+Tests del saldo desnormalizado de las reservas (payments.BookingLedger).
+
+Cubre:
+  - Se mantiene al crear y cambiar pagos y reembolsos, y al cambiar el total
+  - Pago y saldo se confirman juntos (si falla el saldo, el pago no se guarda)
+  - Las lecturas de saldo son una sola fila
+  - verify_ledgers / comando verify_ledgers detectan y reparan desfases
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from model_bakery import baker
+
+from core.tzutils import compose_aware_dt
+from payments.ledger import verify_ledgers
+from payments.models import BookingLedger, Payment
+from payments.services import compute_balance_due_snapshot, get_paid_deposit_amount
+
+
+def _dt(days, hour):
+    return compose_aware_dt(date.today() + timedelta(days=days), hour=hour)
+
+
+@pytest.fixture
+def booking():
+    prop = baker.make("properties.Property", max_people=4, nightly_price=Decimal("100.00"), airbnb_ical_url=None)
+    return baker.make(
+        "bookings.Booking", property=prop, status="confirmed", person_num=2,
+        arrival=_dt(10, 15), departure=_dt(13, 12),
+        total_amount=Decimal("1000.00"), deposit_amount=Decimal("300.00"),
+    )
+
+
+def _pay(booking, payment_type, amount, status="paid", **kwargs):
+    return baker.make("payments.Payment", booking=booking, payment_type=payment_type, status=status,
+                      amount=Decimal(amount), **kwargs)
+
+
+def _ledger(booking):
+    return BookingLedger.objects.get(booking=booking)
+
+
+@pytest.mark.django_db
+class TestLedgerUpdates:
+
+    def test_se_crea_con_la_reserva(self, booking):
+        ledger = _ledger(booking)
+        assert ledger.paid_deposit == Decimal("0.00")
+        assert ledger.net_due == Decimal("1000.00")
+
+    def test_pagos_y_reembolsos(self, booking):
+        deposit = _pay(booking, "deposit", "300.00", status="pending")
+        assert _ledger(booking).paid_deposit == Decimal("0.00")
+
+        deposit.status = "paid"
+        deposit.save(update_fields=["status"])
+        _pay(booking, "extension", "120.00")
+        _pay(booking, "balance", "700.00", status="requires_action")
+        assert (_ledger(booking).paid_deposit, _ledger(booking).net_due) == (Decimal("300.00"), Decimal("580.00"))
+
+        deposit.refunded_amount = Decimal("100.00")
+        deposit.refund_status = "paid"
+        deposit.save(update_fields=["refunded_amount", "refund_status"])
+
+        ledger = _ledger(booking)
+        assert ledger.net_deposit == Decimal("200.00")
+        assert ledger.refunded_total == Decimal("100.00")
+        assert ledger.net_due == Decimal("680.00")
+        assert verify_ledgers([booking.pk]) == []
+
+    def test_cambio_de_total(self, booking):
+        _pay(booking, "deposit", "300.00")
+        booking.total_amount = Decimal("1500.00")
+        booking.save(update_fields=["total_amount"])
+        assert _ledger(booking).net_due == Decimal("1200.00")
+
+    def test_save_completo_solo_recalcula_si_cambia_el_total(self, booking):
+        _pay(booking, "deposit", "300.00")
+        booking = type(booking).objects.get(pk=booking.pk)
+        with patch("bookings.signals.refresh_ledger") as refresh:
+            booking.person_num = 3
+            booking.save()
+        refresh.assert_not_called()
+
+        booking.total_amount = Decimal("1500.00")
+        booking.save()
+        assert _ledger(booking).net_due == Decimal("1200.00")
+
+    def test_si_falla_el_saldo_no_se_guarda_el_pago(self, booking):
+        deposit = _pay(booking, "deposit", "300.00", status="pending")
+        deposit.status = "paid"
+        with patch("payments.signals.refresh_ledger", side_effect=RuntimeError("db caída")):
+            with pytest.raises(RuntimeError):
+                deposit.save(update_fields=["status"])
+
+        assert Payment.objects.get(pk=deposit.pk).status == "pending"
+        assert verify_ledgers([booking.pk]) == []
+
+    def test_borrar_pago(self, booking):
+        payment = _pay(booking, "balance", "700.00")
+        payment.delete()
+        assert _ledger(booking).paid_balance == Decimal("0.00")
+        booking.delete()
+        assert not BookingLedger.objects.exists()
+
+
+@pytest.mark.django_db
+class TestLedgerReads:
+
+    def test_lecturas_de_una_fila(self, booking, django_assert_num_queries):
+        _pay(booking, "deposit", "300.00", refunded_amount=Decimal("50.00"), refund_status="paid")
+        _pay(booking, "balance", "400.00")
+
+        with django_assert_num_queries(1):
+            assert get_paid_deposit_amount(booking) == Decimal("250.00")
+        with django_assert_num_queries(1):
+            assert compute_balance_due_snapshot(booking) == Decimal("350.00")
+        with django_assert_num_queries(1):
+            assert booking.balance_due_runtime() == Decimal("350.00")
+
+    def test_el_total_en_memoria_manda_en_el_snapshot(self, booking):
+        _pay(booking, "deposit", "300.00")
+        booking.total_amount = Decimal("2000.00")  # aún sin guardar (webhook de cambio de fechas)
+        assert compute_balance_due_snapshot(booking) == Decimal("1700.00")
+
+
+@pytest.mark.django_db
+class TestVerifyLedgers:
+
+    def test_detecta_y_repara_desfases(self, booking):
+        payment = _pay(booking, "deposit", "300.00")
+        # update() en lote no pasa por las señales
+        Payment.objects.filter(pk=payment.pk).update(refunded_amount=Decimal("300.00"), refund_status="paid")
+
+        mismatches = verify_ledgers()
+        assert {(m["field"], m["expected"]) for m in mismatches} == {
+            ("deposit_refunded", Decimal("300.00")),
+            ("refunded_total", Decimal("300.00")),
+            ("net_due", Decimal("1000.00")),
+        }
+
+        out = StringIO()
+        with pytest.raises(CommandError) as excinfo:
+            call_command("verify_ledgers", stdout=out)
+        assert excinfo.value.returncode == 1
+        assert f"Reserva {booking.pk} · net_due" in out.getvalue()
+
+        call_command("verify_ledgers", "--fix", stdout=StringIO())
+        assert verify_ledgers() == []
+        assert _ledger(booking).net_due == Decimal("1000.00")
+
+    def test_saldo_ausente(self, booking):
+        BookingLedger.objects.all().delete()
+        assert {m["stored"] for m in verify_ledgers(fix=True)} == {None}
+        assert _ledger(booking).net_due == Decimal("1000.00")
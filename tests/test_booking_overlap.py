@@ -0,0 +1,105 @@
+"""
+Tests de la detección de solapamiento en SQL (Booking.objects.overlapping).
+
+Cubre:
+  - Qué reservas bloquean (confirmed, pending con hold vigente)
+  - Que la consulta es un único EXISTS servido por booking_avail_idx
+  - Que el coste no depende del histórico de reservas de la propiedad
+"""
+
+from datetime import date, timedelta
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+from model_bakery import baker
+
+from bookings.models import Booking
+from core.tzutils import compose_aware_dt
+
+
+def _dt(days, hour):
+    return compose_aware_dt(date.today() + timedelta(days=days), hour=hour)
+
+
+@pytest.fixture
+def prop():
+    return baker.make("properties.Property", max_people=4, nightly_price="100.00", airbnb_ical_url=None)
+
+
+def _booking(prop, status="confirmed", start=10, nights=3, hold_delta=None):
+    hold = timezone.now() + timedelta(hours=hold_delta) if hold_delta is not None else None
+    return baker.make(
+        "bookings.Booking",
+        property=prop,
+        status=status,
+        arrival=_dt(start, 15),
+        departure=_dt(start + nights, 12),
+        person_num=2,
+        hold_expires_at=hold,
+    )
+
+
+def _overlaps(prop, start, end, **kwargs):
+    return Booking.objects.overlapping(prop.id, _dt(start, 15), _dt(end, 12), **kwargs).exists()
+
+
+@pytest.mark.django_db
+class TestOverlapping:
+
+    def test_confirmed_solapada_bloquea(self, prop):
+        _booking(prop, start=10, nights=3)
+        assert _overlaps(prop, 11, 14) is True
+
+    def test_confirmed_con_hold_antiguo_sigue_bloqueando(self, prop):
+        # Una reserva confirmada conserva el hold_expires_at de cuando era pending
+        _booking(prop, status="confirmed", start=10, nights=3, hold_delta=-5)
+        assert _overlaps(prop, 11, 14) is True
+
+    def test_pending_con_hold_expirado_no_bloquea(self, prop):
+        _booking(prop, status="pending", start=10, nights=3, hold_delta=-1)
+        assert _overlaps(prop, 11, 14) is False
+
+    def test_cancelled_no_bloquea(self, prop):
+        _booking(prop, status="cancelled", start=10, nights=3)
+        assert _overlaps(prop, 11, 14) is False
+
+    def test_fechas_contiguas_no_solapan(self, prop):
+        _booking(prop, start=10, nights=3)
+        assert _overlaps(prop, 13, 15) is False
+
+    def test_exclude_booking_id(self, prop):
+        b = _booking(prop, start=10, nights=3)
+        assert _overlaps(prop, 11, 14, exclude_booking_id=b.id) is False
+
+
+@pytest.mark.django_db
+class TestOverlappingCost:
+
+    HISTORY = 20_000
+
+    def _bulk_history(self, prop):
+        # bulk_create no dispara señales: solo llena la tabla de reservas
+        user = baker.make("accounts.User")
+        Booking.objects.bulk_create([
+            Booking(
+                user=user,
+                property=prop,
+                person_num=2,
+                # Estancias consecutivas de 2 noches hacia el pasado
+                arrival=_dt(-2 * (i + 1) - 5, 15),
+                departure=_dt(-2 * i - 5, 12),
+                status="confirmed" if i % 3 else "completed",
+            )
+            for i in range(self.HISTORY)
+        ], batch_size=2000)
+
+    def test_un_solo_exists_con_historial_grande(self, prop, django_assert_num_queries):
+        self._bulk_history(prop)
+        with django_assert_num_queries(1):
+            assert _overlaps(prop, 10, 13) is False
+
+    @pytest.mark.skipif(connection.vendor != "sqlite", reason="formato de EXPLAIN específico de SQLite")
+    def test_usa_booking_avail_idx(self, prop):
+        qs = Booking.objects.overlapping(prop.id, _dt(10, 15), _dt(13, 12))
+        assert "booking_avail_idx" in qs.explain()
@@ -0,0 +1,88 @@
+"""
+Tests del listado "Mis reservas" (BookingsList).
+
+Cubre:
+  - Número de consultas constante, sin importar cuántas reservas y pagos haya
+  - Los importes anotados coinciden con los métodos de Booking sin anotar
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+
+from bookings.models import Booking
+from core.tzutils import compose_aware_dt
+
+
+def _dt(days, hour):
+    return compose_aware_dt(date.today() + timedelta(days=days), hour=hour)
+
+
+@pytest.fixture
+def user():
+    return baker.make("accounts.User")
+
+
+@pytest.fixture
+def prop():
+    return baker.make("properties.Property", max_people=4, nightly_price=Decimal("100.00"), airbnb_ical_url=None)
+
+
+def _booking_with_payments(user, prop, n):
+    booking = baker.make(
+        "bookings.Booking", user=user, property=prop, status="confirmed", person_num=2,
+        arrival=_dt(10 + 5 * n, 15), departure=_dt(13 + 5 * n, 12),
+        total_amount=Decimal("1000.00"), deposit_amount=Decimal("300.00"),
+    )
+    baker.make("payments.Payment", booking=booking, payment_type="deposit", status="failed", amount=Decimal("300.00"))
+    baker.make("payments.Payment", booking=booking, payment_type="deposit", status="paid",
+               amount=Decimal("300.00"), refunded_amount=Decimal("50.00"))
+    if n % 2:
+        baker.make("payments.Payment", booking=booking, payment_type="balance", status="requires_action",
+                   amount=Decimal("700.00"))
+        baker.make("payments.Payment", booking=booking, payment_type="extension", status="paid",
+                   amount=Decimal("120.00"))
+    return booking
+
+
+def _queries_for_list(client):
+    with CaptureQueriesContext(connection) as ctx:
+        resp = client.get(reverse("bookings_list"))
+    assert resp.status_code == 200
+    return len(ctx), resp
+
+
+@pytest.mark.django_db
+class TestBookingsListQueries:
+
+    def test_consultas_constantes(self, client, user, prop):
+        client.force_login(user)
+        _booking_with_payments(user, prop, 0)
+        few, _ = _queries_for_list(client)
+
+        for n in range(1, 20):
+            _booking_with_payments(user, prop, n)
+        many, resp = _queries_for_list(client)
+
+        assert many == few
+        assert len(resp.context["bookings"]) == 20
+
+    def test_anotaciones_coinciden_con_los_metodos(self, user, prop):
+        for n in range(3):
+            _booking_with_payments(user, prop, n)
+
+        annotated = {b.id: b for b in Booking.objects.filter(user=user).with_payment_summary()}
+        for booking in Booking.objects.filter(user=user):
+            fast = annotated[booking.id]
+            assert fast.dep_before_chage_dates() == booking.dep_before_chage_dates()
+            assert fast.net_deposit_paid() == booking.net_deposit_paid() == Decimal("250.00")
+            assert fast.balance_due_runtime() == booking.balance_due_runtime()
+            assert fast.deposit_payment() == booking.deposit_payment()
+            assert fast.deposit_paid() is booking.deposit_paid() is True
+            assert fast.balance_payment() == booking.balance_payment()
+            assert fast.balance_paid() is booking.balance_paid()
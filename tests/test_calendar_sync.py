@@ -5,20 +5,38 @@ Cubre:
   - fetch_ical_bookings: caché, whitelist de hosts, errores HTTP, tamaño
   - generate_ical_for_property: qué reservas se incluyen en el .ics exportado
   - ExportCalendarView: token válido/inválido, contenido del .ics
+  - Caché del .ics exportado: ETag, 304, invalidación al cambiar reservas
   - Property.is_available: bloqueo por calendario externo (Airbnb → web)
+  - Caché stale-while-revalidate: TTL blando/duro, refresco en Celery
+  - force_refresh y contadores de hit/miss del caché
+  - GET condicional (ETag / Last-Modified, 304 Not Modified)
+  - Errores cacheados por feed y circuit breaker por host
+  - parse_ical_stream: lector en streaming, mismos resultados que icalendar
   - sync_all_property_calendars: tarea Celery de sincronización masiva
 """
 
 from datetime import date, timedelta
 from unittest.mock import MagicMock, patch
 
+import time
+
 import pytest
 from django.core.cache import cache as django_cache
 from django.utils import timezone
 from icalendar import Calendar
 from model_bakery import baker
 
-from properties.utils.ical import fetch_ical_bookings, generate_ical_for_property
+from properties.utils import ical as ical_module
+from properties.utils.ical import (
+    ICAL_CACHE_HARD_TIMEOUT,
+    ICAL_CACHE_TIMEOUT,
+    ICAL_STALE_AFTER,
+    _cache_key,
+    fetch_ical_bookings,
+    generate_ical_for_property,
+    get_ical_cache_stats,
+    parse_ical_stream,
+)
 
 
 @pytest.fixture(autouse=True)
@@ -53,11 +71,12 @@ def _make_ical(events: list[tuple[date, date]]) -> bytes:
     return "\r\n".join(lines).encode()
 
 
-def _mock_response(body: bytes, status_code: int = 200, content_length: int | None = None):
+def _mock_response(body: bytes, status_code: int = 200, content_length: int | None = None,
+                   headers: dict | None = None):
     """Devuelve un mock de requests.Response."""
     resp = MagicMock()
     resp.status_code = status_code
-    resp.headers = {"content-length": str(content_length or len(body))}
+    resp.headers = {"content-length": str(content_length or len(body)), **(headers or {})}
     resp.iter_content = lambda chunk_size: iter([body])
     resp.raise_for_status = MagicMock()
     resp.close = MagicMock()
@@ -80,7 +99,7 @@ class TestFetchIcalBookings:
         today = date.today()
         body = _make_ical([(today, today + timedelta(days=3))])
 
-        with patch("requests.get", return_value=_mock_response(body)):
+        with patch("requests.Session.get", return_value=_mock_response(body)):
             result = fetch_ical_bookings(self.VALID_URL)
 
         assert len(result) == 1
@@ -92,7 +111,7 @@ class TestFetchIcalBookings:
         today = date.today()
         body = _make_ical([(today, today + timedelta(days=2))])
 
-        with patch("requests.get", return_value=_mock_response(body)) as mock_get:
+        with patch("requests.Session.get", return_value=_mock_response(body)) as mock_get:
             fetch_ical_bookings(self.VALID_URL)
             fetch_ical_bookings(self.VALID_URL)
 
@@ -112,19 +131,19 @@ class TestFetchIcalBookings:
             fetch_ical_bookings("https:///sin-host.ics")
 
     def test_error_http_lanza_valueerror(self):
-        with patch("requests.get", return_value=_mock_response(b"", status_code=404)):
+        with patch("requests.Session.get", return_value=_mock_response(b"", status_code=404)):
             with pytest.raises(ValueError, match="Error HTTP"):
                 fetch_ical_bookings(self.VALID_URL)
 
     def test_archivo_demasiado_grande_rechazado(self):
         oversized = 6 * 1024 * 1024  # 6 MB > límite de 5 MB
         resp = _mock_response(b"x", content_length=oversized)
-        with patch("requests.get", return_value=resp):
+        with patch("requests.Session.get", return_value=resp):
             with pytest.raises(ValueError, match="grande"):
                 fetch_ical_bookings(self.VALID_URL)
 
     def test_ical_malformado_lanza_valueerror(self):
-        with patch("requests.get", return_value=_mock_response(b"NO_ES_ICAL")):
+        with patch("requests.Session.get", return_value=_mock_response(b"NO_ES_ICAL")):
             with pytest.raises(ValueError, match="parsear"):
                 fetch_ical_bookings(self.VALID_URL)
 
@@ -134,14 +153,14 @@ class TestFetchIcalBookings:
             (today, today + timedelta(days=2)),
             (today + timedelta(days=10), today + timedelta(days=15)),
         ])
-        with patch("requests.get", return_value=_mock_response(body)):
+        with patch("requests.Session.get", return_value=_mock_response(body)):
             result = fetch_ical_bookings(self.VALID_URL)
 
         assert len(result) == 2
 
     def test_acepta_subdominio_de_host_permitido(self):
         body = _make_ical([])
-        with patch("requests.get", return_value=_mock_response(body)):
+        with patch("requests.Session.get", return_value=_mock_response(body)):
             result = fetch_ical_bookings("https://www.airbnb.com/calendar/ical/test.ics")
         assert result == []
 
@@ -331,6 +350,85 @@ class TestExportCalendarView:
         assert resp.status_code == 200
 
 
+# ---------------------------------------------------------------------------
+# ExportCalendarView — caché por propiedad y revalidación con ETag
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+class TestExportCalendarCache:
+
+    def _url(self, prop):
+        return f"/properties/calendar/{prop.ical_token}/"
+
+    def _booking(self, prop, **kwargs):
+        arrival = timezone.now() + timedelta(days=5)
+        params = dict(property=prop, status="confirmed", arrival=arrival,
+                      departure=arrival + timedelta(days=3), person_num=2)
+        params.update(kwargs)
+        return baker.make("bookings.Booking", **params)
+
+    def test_etag_fuerte_y_estable_entre_peticiones(self, client):
+        prop = baker.make("properties.Property", max_people=2, nightly_price="80.00")
+        first = client.get(self._url(prop))
+        second = client.get(self._url(prop))
+        assert first["ETag"].startswith('"')
+        assert first["ETag"] == second["ETag"]
+        assert first.content == second.content
+
+    def test_if_none_match_coincidente_devuelve_304(self, client):
+        prop = baker.make("properties.Property", max_people=2, nightly_price="80.00")
+        etag = client.get(self._url(prop))["ETag"]
+        resp = client.get(self._url(prop), HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 304
+        assert resp["ETag"] == etag
+        assert resp.content == b""
+
+    def test_if_none_match_distinto_devuelve_200(self, client):
+        prop = baker.make("properties.Property", max_people=2, nightly_price="80.00")
+        resp = client.get(self._url(prop), HTTP_IF_NONE_MATCH='"otro"')
+        assert resp.status_code == 200
+
+    def test_sondeo_con_cache_caliente_no_consulta_la_bd(self, client, django_assert_num_queries):
+        prop = baker.make("properties.Property", max_people=2, nightly_price="80.00")
+        self._booking(prop)
+        etag = client.get(self._url(prop))["ETag"]
+        with django_assert_num_queries(0):
+            assert client.get(self._url(prop)).status_code == 200
+            assert client.get(self._url(prop), HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    def test_nueva_reserva_invalida_el_cache(self, client):
+        prop = baker.make("properties.Property", max_people=4, nightly_price="100.00")
+        etag = client.get(self._url(prop))["ETag"]
+        b = self._booking(prop)
+        resp = client.get(self._url(prop), HTTP_IF_NONE_MATCH=etag)
+        assert resp.status_code == 200
+        assert resp["ETag"] != etag
+        assert f"booking_{b.id}@reyesestancias.com".encode() in resp.content
+
+    def test_cancelar_reserva_invalida_el_cache(self, client):
+        prop = baker.make("properties.Property", max_people=4, nightly_price="100.00")
+        b = self._booking(prop)
+        assert f"booking_{b.id}@".encode() in client.get(self._url(prop)).content
+        b.status = "cancelled"
+        b.save(update_fields=["status"])
+        assert f"booking_{b.id}@".encode() not in client.get(self._url(prop)).content
+
+    def test_ttl_acotado_por_el_vencimiento_del_hold(self, client):
+        prop = baker.make("properties.Property", max_people=4, nightly_price="100.00")
+        self._booking(prop, status="pending", hold_expires_at=timezone.now() + timedelta(minutes=5))
+        with patch("properties.utils.ical.cache.set", wraps=django_cache.set) as spy:
+            client.get(self._url(prop))
+        timeouts = [c.args[2] for c in spy.call_args_list if c.args[0].startswith("ical_export:")]
+        assert timeouts and 0 < timeouts[0] <= 300
+
+    def test_rate_limit_solo_cuenta_tokens_invalidos(self, client):
+        prop = baker.make("properties.Property", max_people=2, nightly_price="80.00")
+        assert all(client.get(self._url(prop)).status_code == 200 for _ in range(25))
+        codes = [client.get(f"/properties/calendar/invalido-{i}/").status_code for i in range(21)]
+        assert codes[:20] == [404] * 20
+        assert codes[20] == 403
+
+
 # ---------------------------------------------------------------------------
 # Property.is_available — bloqueo por calendario externo (Airbnb → web)
 # ---------------------------------------------------------------------------
@@ -348,6 +446,12 @@ class TestIsAvailableWithExternalCalendar:
             airbnb_ical_url=self.ICAL_URL if with_ical else None,
         )
 
+    def _sync(self, prop):
+        from properties.tasks import sync_single_property_calendar
+
+        assert sync_single_property_calendar(prop.id)["success"] is True
+        prop.refresh_from_db()
+
     def _checkin(self, days_ahead=10):
         return (date.today() + timedelta(days=days_ahead)).isoformat()
 
@@ -357,7 +461,8 @@ class TestIsAvailableWithExternalCalendar:
     def test_fechas_libres_en_airbnb_permiten_reserva(self):
         prop = self._prop()
         body = _make_ical([])
-        with patch("requests.get", return_value=_mock_response(body)):
+        with patch("requests.Session.get", return_value=_mock_response(body)):
+            self._sync(prop)  # bloqueos importados por Celery
             assert prop.is_available(self._checkin(), self._checkout(), 2) is True
 
     def test_fechas_bloqueadas_en_airbnb_rechazan_reserva(self):
@@ -366,7 +471,8 @@ class TestIsAvailableWithExternalCalendar:
         blocked_start = today + timedelta(days=9)
         blocked_end = today + timedelta(days=14)
         body = _make_ical([(blocked_start, blocked_end)])
-        with patch("requests.get", return_value=_mock_response(body)):
+        with patch("requests.Session.get", return_value=_mock_response(body)):
+            self._sync(prop)  # bloqueos importados por Celery
             assert prop.is_available(self._checkin(10), self._checkout(13), 2) is False
 
     def test_fechas_contiguas_no_solapan(self):
@@ -374,7 +480,8 @@ class TestIsAvailableWithExternalCalendar:
         today = date.today()
         # Reserva en Airbnb: días 5-10. Solicitud: días 10-13. No deben solapar.
         body = _make_ical([(today + timedelta(days=5), today + timedelta(days=10))])
-        with patch("requests.get", return_value=_mock_response(body)):
+        with patch("requests.Session.get", return_value=_mock_response(body)):
+            self._sync(prop)  # bloqueos importados por Celery
             assert prop.is_available(self._checkin(10), self._checkout(13), 2) is True
 
     def test_sin_ical_url_ignora_calendario_externo(self):
@@ -383,7 +490,7 @@ class TestIsAvailableWithExternalCalendar:
 
     def test_fallo_en_fetch_bloquea_por_seguridad(self):
         prop = self._prop()
-        with patch("requests.get", side_effect=Exception("network down")):
+        with patch("requests.Session.get", side_effect=Exception("network down")):
             assert prop.is_available(self._checkin(), self._checkout(), 2) is False
 
     def test_host_no_permitido_bloquea_por_seguridad(self):
@@ -396,6 +503,161 @@ class TestIsAvailableWithExternalCalendar:
         assert prop.is_available(self._checkin(), self._checkout(), 2) is False
 
 
+# ---------------------------------------------------------------------------
+# Frescura de la sincronización — las vistas nunca hacen HTTP
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+class TestStaleWhileRevalidate:
+
+    ICAL_URL = "https://airbnb.com/calendar/ical/swr.ics"
+
+    def _seed(self, ranges, age):
+        django_cache.set(
+            _cache_key(self.ICAL_URL),
+            {"bookings": ranges, "fetched_at": time.time() - age},
+        )
+
+    def _prop(self, synced_ago=None, blocked=None):
+        from properties.utils.external_blocks import update_calendar_summary
+
+        prop = baker.make(
+            "properties.Property", max_people=4, nightly_price="100.00", airbnb_ical_url=self.ICAL_URL,
+        )
+        feed = prop.calendar_feeds.get()
+        if synced_ago is not None:
+            feed.synced_at = timezone.now() - timedelta(seconds=synced_ago)
+            feed.save()
+            update_calendar_summary(prop.pk, property_obj=prop)
+        if blocked:
+            from properties.utils.occupancy import index_external_blocks
+
+            today = date.today()
+            block = baker.make(
+                "properties.ExternalBlock", property=prop, feed=feed, uid="b1",
+                start=today + timedelta(days=blocked[0]), end=today + timedelta(days=blocked[1]),
+            )
+            index_external_blocks([block])
+        return prop
+
+    def _days(self, a, b):
+        today = date.today()
+        return (today + timedelta(days=a)).isoformat(), (today + timedelta(days=b)).isoformat()
+
+    def test_sincronizacion_fresca_no_encola_refresco(self):
+        prop = self._prop(synced_ago=0)
+        with patch("properties.tasks.refresh_property_calendars.delay") as delay, \
+                patch("requests.Session.get") as mock_get:
+            assert prop.is_available(*self._days(10, 13), 2) is True
+        delay.assert_not_called()
+        mock_get.assert_not_called()
+
+    def test_sincronizacion_caducada_se_usa_y_encola_refresco(self):
+        prop = self._prop(synced_ago=ICAL_STALE_AFTER + 60, blocked=(9, 14))
+        with patch("properties.tasks.refresh_property_calendars.delay") as delay, \
+                patch("requests.Session.get") as mock_get:
+            assert prop.is_available(*self._days(10, 13), 2) is False
+            assert prop.is_available(*self._days(20, 23), 2) is True
+        delay.assert_called_once_with(prop.id)
+        mock_get.assert_not_called()
+
+    def test_sin_sincronizar_cuenta_como_no_disponible_sin_http(self):
+        prop = self._prop()
+        with patch("properties.tasks.refresh_property_calendars.delay") as delay, \
+                patch("requests.Session.get") as mock_get:
+            assert prop.is_available(*self._days(10, 13), 2) is False
+        delay.assert_called_once_with(prop.id)
+        mock_get.assert_not_called()
+
+    def test_pasado_el_ttl_duro_no_disponible(self):
+        prop = self._prop(synced_ago=ICAL_CACHE_HARD_TIMEOUT + 60)
+        with patch("properties.tasks.refresh_property_calendars.delay"):
+            assert prop.is_available(*self._days(10, 13), 2) is False
+
+    def test_broker_caido_no_rompe_la_peticion(self):
+        prop = self._prop(synced_ago=ICAL_STALE_AFTER + 60)
+        with patch("properties.tasks.refresh_property_calendars.delay", side_effect=Exception("broker down")):
+            assert prop.is_available(*self._days(10, 13), 2) is True
+
+    def test_refresh_task_importa_bloqueos(self):
+        from properties.models import ExternalBlock
+        from properties.tasks import refresh_property_calendars
+
+        prop = self._prop()
+        today = date.today()
+        body = _make_ical([(today + timedelta(days=9), today + timedelta(days=14))])
+        with patch("requests.Session.get", return_value=_mock_response(body)):
+            result = refresh_property_calendars(prop.id)
+
+        assert result == {"success": True, "bookings_count": 1}
+        prop.refresh_from_db()
+        assert prop.ical_synced_at is not None
+        assert ExternalBlock.objects.filter(property=prop).count() == 1
+        with patch("properties.tasks.refresh_property_calendars.delay") as delay:
+            assert prop.is_available(*self._days(10, 13), 2) is False
+        delay.assert_not_called()
+
+    def test_refresh_task_solo_descarga_feeds_vencidos_y_los_replanifica(self):
+        from properties.tasks import refresh_property_calendars
+
+        prop = self._prop()
+        feed = prop.calendar_feeds.get()
+        body = _make_ical([])
+        with patch("requests.Session.get", return_value=_mock_response(body)) as mock_get:
+            refresh_property_calendars(prop.id)
+            feed.refresh_from_db()
+            assert feed.next_poll_at > timezone.now()
+            # Ya replanificado: un segundo refresco no vuelve a descargar
+            assert refresh_property_calendars(prop.id) == {"success": True, "bookings_count": 0}
+        assert mock_get.call_count == 1
+
+    def test_refresh_task_recupera_feeds_caducados_en_backoff(self):
+        from properties.models import CalendarFeed
+        from properties.tasks import refresh_property_calendars
+
+        prop = self._prop(synced_ago=ICAL_CACHE_HARD_TIMEOUT + 60)
+        feed = prop.calendar_feeds.get()
+        # Dos fallos seguidos: el siguiente sondeo aún no toca
+        CalendarFeed.objects.filter(pk=feed.pk).update(
+            consecutive_errors=2, next_poll_at=timezone.now() + timedelta(hours=1),
+        )
+        with patch("properties.tasks.refresh_property_calendars.delay"):
+            assert prop.is_available(*self._days(10, 13), 2) is False
+
+        # El host se recuperó: el refresco de la vista lo descarga igualmente
+        with patch("requests.Session.get", return_value=_mock_response(_make_ical([]))) as mock_get:
+            assert refresh_property_calendars(prop.id) == {"success": True, "bookings_count": 0}
+        assert mock_get.call_count == 1
+        feed.refresh_from_db()
+        assert feed.consecutive_errors == 0
+        prop.refresh_from_db()
+        with patch("properties.tasks.refresh_property_calendars.delay"):
+            assert prop.is_available(*self._days(10, 13), 2) is True
+
+    def test_sincronizacion_al_dia_segun_el_sondeo_no_encola_refresco(self):
+        prop = self._prop(synced_ago=ICAL_CACHE_TIMEOUT + 60)
+        with patch("properties.tasks.refresh_property_calendars.delay") as delay:
+            assert prop.is_available(*self._days(10, 13), 2) is True
+        delay.assert_not_called()
+
+    def test_fetch_en_worker_descarga_tras_ttl_blando(self):
+        self._seed([], age=ICAL_CACHE_TIMEOUT + 60)
+        body = _make_ical([(date.today(), date.today() + timedelta(days=2))])
+        with patch("requests.Session.get", return_value=_mock_response(body)) as mock_get:
+            assert len(fetch_ical_bookings(self.ICAL_URL)) == 1
+        assert mock_get.call_count == 1
+
+    def test_detalle_de_propiedad_no_hace_http(self, client):
+        from django.urls import reverse
+
+        prop = self._prop()
+        with patch("properties.tasks.refresh_property_calendars.delay"), \
+                patch("requests.Session.get") as mock_get:
+            response = client.get(reverse("property_detail", args=[prop.pk]))
+        assert response.status_code == 200
+        mock_get.assert_not_called()
+
+
 # ---------------------------------------------------------------------------
 # sync_all_property_calendars — tarea Celery
 # ---------------------------------------------------------------------------
@@ -414,7 +676,7 @@ class TestSyncAllPropertyCalendars:
         from properties.tasks import sync_all_property_calendars
         baker.make("properties.Property", airbnb_ical_url=self.ICAL_URL)
         body = _make_ical([])
-        with patch("requests.get", return_value=_mock_response(body)):
+        with patch("requests.Session.get", return_value=_mock_response(body)):
             result = sync_all_property_calendars()
         assert result["total"] == 1
         assert result["success"] == 1
@@ -442,7 +704,7 @@ class TestSyncAllPropertyCalendars:
                 raise Exception("timeout simulado")
             return _mock_response(body)
 
-        with patch("requests.get", side_effect=flaky_get):
+        with patch("requests.Session.get", side_effect=flaky_get):
             result = sync_all_property_calendars()
 
         assert result["total"] == 2
@@ -457,6 +719,316 @@ class TestSyncAllPropertyCalendars:
             (today + timedelta(days=5), today + timedelta(days=8)),
             (today + timedelta(days=15), today + timedelta(days=20)),
         ])
-        with patch("requests.get", return_value=_mock_response(body)):
+        with patch("requests.Session.get", return_value=_mock_response(body)):
             result = sync_all_property_calendars()
         assert result["total_bookings"] == 2
+
+
+# ---------------------------------------------------------------------------
+# force_refresh — la sincronización periódica siempre descarga
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+class TestForceRefresh:
+
+    ICAL_URL = "https://airbnb.com/calendar/ical/force.ics"
+
+    def _body(self, n):
+        today = date.today()
+        return _make_ical([(today + timedelta(days=10 * i), today + timedelta(days=10 * i + 2)) for i in range(n)])
+
+    def test_descarga_aunque_el_cache_este_fresco(self):
+        with patch("requests.Session.get", return_value=_mock_response(self._body(1))):
+            fetch_ical_bookings(self.ICAL_URL)
+        with patch("requests.Session.get", return_value=_mock_response(self._body(3))) as mock_get:
+            assert len(fetch_ical_bookings(self.ICAL_URL, force_refresh=True)) == 3
+        assert mock_get.call_count == 1
+        assert len(django_cache.get(_cache_key(self.ICAL_URL))["bookings"]) == 3
+
+    def test_fallo_conserva_el_valor_anterior(self):
+        with patch("requests.Session.get", return_value=_mock_response(self._body(2))):
+            fetch_ical_bookings(self.ICAL_URL)
+        with patch("requests.Session.get", return_value=_mock_response(b"no es un calendario")):
+            with pytest.raises(ValueError):
+                fetch_ical_bookings(self.ICAL_URL, force_refresh=True)
+        assert len(django_cache.get(_cache_key(self.ICAL_URL))["bookings"]) == 2
+
+    def test_sync_periodico_refresca_entradas_frescas(self):
+        from properties.tasks import sync_all_property_calendars
+
+        baker.make("properties.Property", airbnb_ical_url=self.ICAL_URL)
+        with patch("requests.Session.get", return_value=_mock_response(self._body(1))):
+            sync_all_property_calendars()
+        with patch("requests.Session.get", return_value=_mock_response(self._body(2))) as mock_get:
+            result = sync_all_property_calendars()
+        assert mock_get.call_count == 1
+        assert result["total_bookings"] == 2
+
+    def test_contadores_de_vistas_tras_sync(self):
+        from properties.tasks import sync_all_property_calendars
+
+        prop = baker.make("properties.Property", max_people=4, airbnb_ical_url=self.ICAL_URL)
+        checkin = (date.today() + timedelta(days=3)).isoformat()
+        checkout = (date.today() + timedelta(days=5)).isoformat()
+        with patch("properties.tasks.refresh_property_calendars.delay"):
+            assert prop.is_available(checkin, checkout, 2) is False
+        with patch("requests.Session.get", return_value=_mock_response(self._body(1))):
+            sync_all_property_calendars()
+        prop.refresh_from_db()
+        for _ in range(5):
+            assert prop.is_available(checkin, checkout, 2) is True
+
+        stats = get_ical_cache_stats()
+        assert stats["request_miss"] == 1
+        assert stats["request_hit"] == 5
+        assert stats["fetch_http"] == 1
+
+
+# ---------------------------------------------------------------------------
+# GET condicional — ETag / Last-Modified
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+class TestConditionalGet:
+
+    ICAL_URL = "https://airbnb.com/calendar/ical/conditional.ics"
+    ETAG = '"abc123"'
+    LAST_MODIFIED = "Wed, 01 Jan 2025 10:00:00 GMT"
+
+    def _body(self):
+        today = date.today()
+        return _make_ical([(today + timedelta(days=3), today + timedelta(days=6))])
+
+    def _warm(self, headers):
+        with patch("requests.Session.get", return_value=_mock_response(self._body(), headers=headers)):
+            return fetch_ical_bookings(self.ICAL_URL)
+
+    def test_envia_if_none_match_y_reutiliza_parseo_en_304(self):
+        ranges = self._warm({"ETag": self.ETAG})
+        not_modified = _mock_response(b"", status_code=304)
+        with patch("requests.Session.get", return_value=not_modified) as mock_get, \
+                patch("properties.utils.ical.Calendar.from_ical") as from_ical:
+            result = fetch_ical_bookings(self.ICAL_URL, force_refresh=True)
+
+        assert result == ranges
+        assert mock_get.call_args.kwargs["headers"]["If-None-Match"] == self.ETAG
+        from_ical.assert_not_called()
+        assert get_ical_cache_stats()["fetch_not_modified"] == 1
+
+    def test_envia_if_modified_since(self):
+        self._warm({"Last-Modified": self.LAST_MODIFIED})
+        with patch("requests.Session.get", return_value=_mock_response(b"", status_code=304)) as mock_get:
+            fetch_ical_bookings(self.ICAL_URL, force_refresh=True)
+        headers = mock_get.call_args.kwargs["headers"]
+        assert headers["If-Modified-Since"] == self.LAST_MODIFIED
+        assert "If-None-Match" not in headers
+
+    def test_304_renueva_el_ttl_blando(self):
+        self._warm({"ETag": self.ETAG})
+        entry = django_cache.get(_cache_key(self.ICAL_URL))
+        entry["fetched_at"] -= ICAL_CACHE_TIMEOUT + 60
+        django_cache.set(_cache_key(self.ICAL_URL), entry)
+
+        with patch("requests.Session.get", return_value=_mock_response(b"", status_code=304)):
+            fetch_ical_bookings(self.ICAL_URL)
+
+        # El caché vuelve a estar fresco: la siguiente llamada no descarga
+        with patch("requests.Session.get") as mock_get:
+            assert len(fetch_ical_bookings(self.ICAL_URL)) == 1
+        mock_get.assert_not_called()
+        assert django_cache.get(_cache_key(self.ICAL_URL))["etag"] == self.ETAG
+
+    def test_sin_validadores_no_envia_cabeceras_condicionales(self):
+        self._warm({})
+        with patch("requests.Session.get", return_value=_mock_response(self._body())) as mock_get:
+            fetch_ical_bookings(self.ICAL_URL, force_refresh=True)
+        headers = mock_get.call_args.kwargs["headers"]
+        assert "If-None-Match" not in headers
+        assert "If-Modified-Since" not in headers
+
+
+# ---------------------------------------------------------------------------
+# Feeds caídos — error cacheado por feed y circuit breaker por host
+# ---------------------------------------------------------------------------
+
+@pytest.mark.django_db
+class TestFeedFailures:
+
+    HOST = "airbnb.com"
+
+    def _url(self, n=0):
+        return f"https://{self.HOST}/calendar/ical/{n}.ics"
+
+    def _timeout(self):
+        from requests.exceptions import Timeout
+        return patch("requests.Session.get", side_effect=Timeout())
+
+    def test_error_se_cachea_por_feed(self):
+        with self._timeout() as mock_get:
+            with pytest.raises(ValueError, match="Timeout"):
+                fetch_ical_bookings(self._url())
+            with pytest.raises(ValueError, match="Timeout"):
+                fetch_ical_bookings(self._url())
+        assert mock_get.call_count == 1
+        assert get_ical_cache_stats()["fetch_failure_cached"] == 1
+
+    def test_force_refresh_ignora_el_error_cacheado(self):
+        with self._timeout():
+            with pytest.raises(ValueError):
+                fetch_ical_bookings(self._url())
+        body = _make_ical([(date.today(), date.today() + timedelta(days=2))])
+        with patch("requests.Session.get", return_value=_mock_response(body)):
+            assert len(fetch_ical_bookings(self._url(), force_refresh=True)) == 1
+        # La descarga correcta borra el error cacheado
+        assert len(fetch_ical_bookings(self._url())) == 1
+
+    def test_breaker_se_abre_tras_fallos_seguidos_del_host(self, monkeypatch):
+        from properties.utils.ical import CircuitOpenError, get_circuit_breaker_state
+
+        monkeypatch.setattr(ical_module, "ICAL_BREAKER_THRESHOLD", 3)
+        with self._timeout() as mock_get:
+            for n in range(3):
+                with pytest.raises(ValueError):
+                    fetch_ical_bookings(self._url(n))
+            # Otro feed del mismo host: rechazado sin petición, también con force_refresh
+            with pytest.raises(CircuitOpenError):
+                fetch_ical_bookings(self._url(10), force_refresh=True)
+        assert mock_get.call_count == 3
+        assert get_circuit_breaker_state([self.HOST]) == {self.HOST: {"open": True, "failures": 3}}
+        assert get_ical_cache_stats()["fetch_short_circuit"] == 1
+
+    def test_breaker_no_afecta_a_otros_hosts(self, monkeypatch):
+        monkeypatch.setattr(ical_module, "ICAL_BREAKER_THRESHOLD", 1)
+        with self._timeout():
+            with pytest.raises(ValueError):
+                fetch_ical_bookings(self._url())
+        body = _make_ical([(date.today(), date.today() + timedelta(days=2))])
+        with patch("requests.Session.get", return_value=_mock_response(body)):
+            assert len(fetch_ical_bookings("https://calendar.google.com/cal.ics")) == 1
+
+    def test_404_no_cuenta_para_el_breaker(self, monkeypatch):
+        from properties.utils.ical import get_circuit_breaker_state
+
+        monkeypatch.setattr(ical_module, "ICAL_BREAKER_THRESHOLD", 2)
+        with patch("requests.Session.get", return_value=_mock_response(b"", status_code=404)):
+            for n in range(3):
+                with pytest.raises(ValueError, match="404"):
+                    fetch_ical_bookings(self._url(n))
+        assert get_circuit_breaker_state([self.HOST])[self.HOST] == {"open": False, "failures": 0}
+
+    def test_descarga_correcta_reinicia_el_contador(self, monkeypatch):
+        from properties.utils.ical import get_circuit_breaker_state
+
+        monkeypatch.setattr(ical_module, "ICAL_BREAKER_THRESHOLD", 2)
+        body = _make_ical([(date.today(), date.today() + timedelta(days=2))])
+        with self._timeout():
+            with pytest.raises(ValueError):
+                fetch_ical_bookings(self._url(0))
+        with patch("requests.Session.get", return_value=_mock_response(body)):
+            fetch_ical_bookings(self._url(1))
+        with self._timeout():
+            with pytest.raises(ValueError):
+                fetch_ical_bookings(self._url(2))
+        assert get_circuit_breaker_state([self.HOST])[self.HOST] == {"open": False, "failures": 1}
+
+    def test_resumen_del_sync_incluye_circuitos_abiertos(self, monkeypatch):
+        from properties.tasks import sync_all_property_calendars
+
+        monkeypatch.setattr(ical_module, "ICAL_BREAKER_THRESHOLD", 2)
+        monkeypatch.setattr(ical_module, "ICAL_SYNC_PER_HOST_LIMIT", 1)
+        for n in range(4):
+            baker.make("properties.Property", airbnb_ical_url=self._url(n))
+        with self._timeout() as mock_get:
+            result = sync_all_property_calendars()
+        assert result["errors"] == 4
+        assert result["open_circuits"] == [self.HOST]
+        # Tras el segundo fallo, los otros dos feeds no llegan a hacer la petición
+        assert mock_get.call_count == 2
+
+
+# ---------------------------------------------------------------------------
+# parse_ical_stream — lector en streaming
+# ---------------------------------------------------------------------------
+
+def _parse_with_icalendar(body: bytes):
+    """Referencia: el parseo anterior con Calendar.from_ical(...).walk()."""
+    from datetime import datetime
+
+    result = []
+    for component in Calendar.from_ical(body).walk("VEVENT"):
+        start, end = component.get("dtstart").dt, component.get("dtend").dt
+        start = start.date() if isinstance(start, datetime) else start
+        end = end.date() if isinstance(end, datetime) else end
+        result.append((start, end))
+    return result
+
+
+def _chunks(body: bytes, size: int):
+    return (body[i:i + size] for i in range(0, len(body), size))
+
+
+class TestParseIcalStream:
+
+    def _ranges(self, events):
+        return [(start, end) for _, start, end in events]
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64, 8192])
+    def test_coincide_con_icalendar_en_los_fixtures(self, chunk_size):
+        today = date.today()
+        fixtures = [
+            _make_ical([]),
+            _make_ical([(today, today + timedelta(days=3))]),
+            _make_ical([(today, today + timedelta(days=2)), (today + timedelta(days=10), today + timedelta(days=15))]),
+        ]
+        for body in fixtures:
+            events = parse_ical_stream(_chunks(body, chunk_size))
+            assert self._ranges(events) == _parse_with_icalendar(body)
+
+    def test_devuelve_uid_de_cada_evento(self):
+        today = date.today()
+        body = _make_ical([(today, today + timedelta(days=2))])
+        assert parse_ical_stream([body]) == [("test-event-0@test.com", today, today + timedelta(days=2))]
+
+    def test_lineas_plegadas_fechas_con_hora_y_componentes_anidados(self):
+        body = (
+            "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+            "BEGIN:VEVENT\r\n"
+            "UID:evento-con-uid-muy-\r\n largo@airbnb.com\r\n"
+            "DTSTART;TZID=\"America/Mexico_City\":20250110T150000\r\n"
+            "DTEND:20250113T120000Z\r\n"
+            "BEGIN:VALARM\r\nTRIGGER:-PT15M\r\nEND:VALARM\r\n"
+            "END:VEVENT\r\n"
+            "END:VCALENDAR\r\n"
+        ).encode()
+        events = parse_ical_stream(_chunks(body, 5))
+        assert events == [("evento-con-uid-muy-largo@airbnb.com", date(2025, 1, 10), date(2025, 1, 13))]
+        assert self._ranges(events) == _parse_with_icalendar(body)
+
+    def test_evento_sin_dtend_se_omite(self):
+        body = (
+            "BEGIN:VCALENDAR\nBEGIN:VEVENT\nUID:a\nDTSTART;VALUE=DATE:20250110\nEND:VEVENT\n"
+            "BEGIN:VEVENT\nUID:b\nDTSTART;VALUE=DATE:20250120\nDTEND;VALUE=DATE:20250122\nEND:VEVENT\n"
+            "END:VCALENDAR\n"
+        ).encode()
+        assert parse_ical_stream([body]) == [("b", date(2025, 1, 20), date(2025, 1, 22))]
+
+    @pytest.mark.parametrize("body", [
+        b"NO_ES_ICAL",
+        b"BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\n",
+        b"BEGIN:VCALENDAR\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n",
+    ])
+    def test_contenido_malformado_lanza_valueerror(self, body):
+        with pytest.raises(ValueError, match="parsear"):
+            parse_ical_stream([body])
+
+    def test_limite_de_tamano_sin_content_length(self):
+        body = _make_ical([(date.today(), date.today() + timedelta(days=2))] * 50)
+        with pytest.raises(ValueError, match="tamaño máximo"):
+            parse_ical_stream(_chunks(body, 100), max_size=len(body) - 1)
+
+    def test_fetch_no_llama_a_calendar_from_ical(self):
+        body = _make_ical([(date.today(), date.today() + timedelta(days=2))])
+        with patch("requests.Session.get", return_value=_mock_response(body, content_length=0)), \
+                patch("properties.utils.ical.Calendar.from_ical") as from_ical:
+            assert len(fetch_ical_bookings("https://airbnb.com/calendar/ical/stream.ics")) == 1
+        from_ical.assert_not_called()
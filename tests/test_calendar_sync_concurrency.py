@@ -0,0 +1,265 @@
+"""
+Tests de la sincronización concurrente de calendarios.
+
+Levanta un servidor HTTP local que sirve muchos .ics lentos y comprueba que
+sync_all_property_calendars:
+  - descarga en paralelo (mucho menos que la suma de las latencias)
+  - respeta el límite de peticiones simultáneas por host
+  - un host lento no acapara el pool: los demás hosts siguen descargando
+  - respeta el plazo global y cuenta lo pendiente como error
+  - mantiene el mismo resumen de resultados
+  - reutiliza conexiones keep-alive de la sesión HTTP compartida y reintenta 5xx
+    solo si los reintentos caben en el plazo
+"""
+
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+from django.core.cache import cache as django_cache
+from model_bakery import baker
+
+from properties.utils import ical
+
+FEEDS = 20
+DELAY = 0.3
+
+
+def _ical_body(n):
+    start = date.today() + timedelta(days=10 + n)
+    end = start + timedelta(days=2)
+    return (
+        "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Test//Test//EN\r\n"
+        "BEGIN:VEVENT\r\n"
+        f"DTSTART;VALUE=DATE:{start.strftime('%Y%m%d')}\r\n"
+        f"DTEND;VALUE=DATE:{end.strftime('%Y%m%d')}\r\n"
+        f"UID:slow-{n}@test.com\r\n"
+        "END:VEVENT\r\nEND:VCALENDAR\r\n"
+    ).encode()
+
+
+class _SlowFeedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.failures = {}  # path -> respuestas 503 pendientes antes de servir el feed
+        self.connections = 0
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), _SlowFeedHandler)
+
+
+class _SlowFeedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            if server.failures.get(self.path):
+                server.failures[self.path] -= 1
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+            body = _ical_body(int(self.path.strip("/").split(".")[0]))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/calendar")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    django_cache.clear()
+    yield
+    django_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def _fresh_http_session():
+    ical.close_http_session()
+    yield
+    ical.close_http_session()
+
+
+@pytest.fixture
+def feed_server(monkeypatch):
+    servers = []
+
+    def start(delay=DELAY):
+        server = _SlowFeedServer(delay)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        host = f"127.0.0.1:{server.server_address[1]}"
+        monkeypatch.setattr(ical, "ICAL_ALLOWED_HOSTS", [host])
+        return server, f"http://{host}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _props(base_url, count=FEEDS):
+    return [
+        baker.make("properties.Property", airbnb_ical_url=f"{base_url}/{n}.ics")
+        for n in range(count)
+    ]
+
+
+@pytest.mark.django_db
+class TestSyncConcurrente:
+
+    def test_descarga_en_paralelo_con_mismo_resumen(self, feed_server, monkeypatch):
+        from properties.tasks import sync_all_property_calendars
+
+        monkeypatch.setattr(ical, "ICAL_SYNC_MAX_WORKERS", 10)
+        monkeypatch.setattr(ical, "ICAL_SYNC_PER_HOST_LIMIT", 10)
+        _, base_url = feed_server()
+        _props(base_url)
+
+        started = time.monotonic()
+        result = sync_all_property_calendars()
+        elapsed = time.monotonic() - started
+
+        assert result == {
+            "total": FEEDS,
+            "success": FEEDS,
+            "errors": 0,
+            "total_bookings": FEEDS,
+            "open_circuits": [],
+            "message": f"{FEEDS}/{FEEDS} calendars synced successfully",
+        }
+        # En serie serían FEEDS * DELAY = 6 s
+        assert elapsed < FEEDS * DELAY / 2
+
+    def test_respeta_limite_por_host(self, feed_server, monkeypatch):
+        from properties.tasks import sync_all_property_calendars
+
+        monkeypatch.setattr(ical, "ICAL_SYNC_MAX_WORKERS", 16)
+        monkeypatch.setattr(ical, "ICAL_SYNC_PER_HOST_LIMIT", 3)
+        server, base_url = feed_server(delay=0.1)
+        _props(base_url)
+
+        result = sync_all_property_calendars()
+
+        assert result["success"] == FEEDS
+        assert 1 < server.max_active <= 3
+
+    def test_host_lento_no_acapara_el_pool(self, feed_server, monkeypatch):
+        slow, slow_url = feed_server(delay=1.0)
+        fast, fast_url = feed_server(delay=0.05)
+        monkeypatch.setattr(ical, "ICAL_ALLOWED_HOSTS", [urlparse(slow_url).netloc, urlparse(fast_url).netloc])
+        monkeypatch.setattr(ical, "ICAL_HTTP_RETRIES", 0)
+        # Primero todos los feeds del host lento, como llegarían por orden de propiedad
+        jobs = [(f"slow-{n}", f"{slow_url}/{n}.ics") for n in range(8)]
+        jobs += [(f"fast-{n}", f"{fast_url}/{n}.ics") for n in range(8)]
+
+        results = ical.fetch_ical_bookings_concurrently(jobs, max_workers=4, per_host_limit=2, deadline=0.6)
+
+        assert all(isinstance(results[f"fast-{n}"], list) for n in range(8))
+        assert all(isinstance(results[f"slow-{n}"], Exception) for n in range(8))
+        assert slow.max_active <= 2
+        assert slow.requests == 2  # el resto del host lento no llegó a enviarse
+
+    def test_plazo_global_cuenta_pendientes_como_error(self, feed_server, monkeypatch):
+        from properties.tasks import sync_all_property_calendars
+
+        monkeypatch.setattr(ical, "ICAL_SYNC_MAX_WORKERS", 4)
+        monkeypatch.setattr(ical, "ICAL_SYNC_PER_HOST_LIMIT", 4)
+        monkeypatch.setattr(ical, "ICAL_SYNC_DEADLINE", 0.5)
+        _, base_url = feed_server(delay=0.4)
+        _props(base_url, count=12)
+
+        started = time.monotonic()
+        result = sync_all_property_calendars()
+        elapsed = time.monotonic() - started
+
+        # Solo cabe una tanda de 4 descargas antes del plazo
+        assert result["total"] == 12
+        assert result["success"] == 4
+        assert result["errors"] == 8
+        assert elapsed < 1.5
+
+
+@pytest.mark.django_db
+class TestSesionHttpCompartida:
+
+    def test_reutiliza_conexiones_keep_alive(self, feed_server, monkeypatch):
+        from properties.tasks import sync_all_property_calendars
+
+        monkeypatch.setattr(ical, "ICAL_SYNC_PER_HOST_LIMIT", 3)
+        monkeypatch.setattr(ical, "ICAL_HTTP_POOL_MAXSIZE", 3)
+        server, base_url = feed_server(delay=0.05)
+        _props(base_url)
+
+        sync_all_property_calendars()
+        sync_all_property_calendars()
+
+        # 40 descargas sobre como mucho 3 conexiones (una por hueco del pool)
+        assert server.requests == 2 * FEEDS
+        assert server.connections <= 3
+
+    def test_reintenta_errores_5xx(self, feed_server, monkeypatch):
+        monkeypatch.setattr(ical, "ICAL_HTTP_BACKOFF", 0)
+        server, base_url = feed_server(delay=0)
+        server.failures["/1.ics"] = 2
+
+        events = ical.fetch_ical_events(f"{base_url}/1.ics")
+
+        assert len(events) == 1
+        assert server.requests == 3
+
+    def test_agota_reintentos_y_falla(self, feed_server, monkeypatch):
+        monkeypatch.setattr(ical, "ICAL_HTTP_BACKOFF", 0)
+        monkeypatch.setattr(ical, "ICAL_HTTP_RETRIES", 1)
+        server, base_url = feed_server(delay=0)
+        server.failures["/1.ics"] = 5
+
+        with pytest.raises(ValueError, match="Error HTTP 503"):
+            ical.fetch_ical_events(f"{base_url}/1.ics")
+        assert server.requests == 2
+
+    def test_sin_reintentos_si_no_caben_en_el_plazo(self, feed_server, monkeypatch):
+        monkeypatch.setattr(ical, "ICAL_HTTP_BACKOFF", 0)
+        server, base_url = feed_server(delay=0)
+        server.failures["/1.ics"] = 2
+
+        # Un timeout por intento cabe, tres no: un solo intento
+        with pytest.raises(ValueError, match="Error HTTP 503"):
+            ical.fetch_ical_events(f"{base_url}/1.ics", timeout=ical.ICAL_REQUEST_TIMEOUT * 2)
+        assert server.requests == 1
+
+        # Con plazo para todos los intentos se reintenta como siempre
+        events = ical.fetch_ical_events(f"{base_url}/1.ics", force_refresh=True, timeout=ical._retries_worst_case())
+        assert len(events) == 1
+        assert server.requests == 3
+
+    def test_close_http_session_recrea_la_sesion(self):
+        first = ical.get_http_session()
+        assert ical.get_http_session() is first
+        ical.close_http_session()
+        assert ical.get_http_session() is not first
@@ -0,0 +1,122 @@
+"""
+Tests de las fechas deshabilitadas del selector de fechas (properties.utils.date_picker).
+
+Cubre:
+  - Combinación de reservas confirmadas, holds vigentes y bloqueos externos
+  - Caché versionado: invalidación al cambiar la disponibilidad y al expirar un hold
+  - Endpoint JSON con ETag y la ficha de la propiedad
+"""
+
+import json
+from datetime import date, timedelta
+
+import pytest
+from django.core.cache import cache as django_cache
+from django.utils import timezone
+from model_bakery import baker
+
+from bookings.tasks import mark_expired_holds
+from core.tzutils import compose_aware_dt
+from properties.utils.date_picker import _horizon, get_disabled_dates
+from properties.utils.external_blocks import sync_external_blocks
+
+ICAL_URL = "https://airbnb.com/calendar/ical/blocks.ics"
+
+
+def _day(n):
+    return date.today() + timedelta(days=n)
+
+
+def _booking(prop, status="confirmed", start=10, nights=2, hold_delta=None):
+    hold = timezone.now() + timedelta(hours=hold_delta) if hold_delta is not None else None
+    return baker.make(
+        "bookings.Booking",
+        property=prop,
+        status=status,
+        arrival=compose_aware_dt(_day(start), hour=15),
+        departure=compose_aware_dt(_day(start + nights), hour=12),
+        person_num=2,
+        hold_expires_at=hold,
+    )
+
+
+def _dates(prop):
+    return json.loads(get_disabled_dates(prop.id)["dates"])
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    django_cache.clear()
+    yield
+    django_cache.clear()
+
+
+@pytest.fixture
+def prop():
+    return baker.make("properties.Property", max_people=4, nightly_price="100.00", airbnb_ical_url=None)
+
+
+@pytest.mark.django_db
+class TestDisabledDates:
+
+    def test_combina_reservas_holds_y_bloqueos_externos(self, prop):
+        prop.airbnb_ical_url = ICAL_URL
+        prop.save()
+        feed = prop.calendar_feeds.get()
+        feed.property = prop
+        sync_external_blocks(feed, [("a", _day(30), _day(32))])
+        _booking(prop, start=10)
+        _booking(prop, status="pending", start=20, hold_delta=1)
+        _booking(prop, status="pending", start=40, hold_delta=-1)   # hold expirado
+        _booking(prop, status="cancelled", start=50)
+        mark_expired_holds()
+
+        expected = [_day(n).isoformat() for n in (10, 11, 20, 21, 30, 31)]
+        assert _dates(prop) == expected
+
+    def test_horizonte_cubre_los_meses_siguientes(self, prop):
+        assert _horizon(date(2025, 1, 15), 12) == date(2026, 2, 1)
+        assert _horizon(date(2025, 12, 31), 12) == date(2027, 1, 1)
+        _booking(prop, start=500)
+        assert _dates(prop) == []
+
+    def test_cache_se_invalida_al_cambiar_la_disponibilidad(self, prop, django_assert_num_queries):
+        _booking(prop, start=10)
+        first = get_disabled_dates(prop.id)
+        with django_assert_num_queries(0):
+            assert get_disabled_dates(prop.id) == first
+
+        b = _booking(prop, start=20)
+        assert _day(20).isoformat() in _dates(prop)
+        b.status = "cancelled"
+        b.save(update_fields=["status"])
+        assert _day(20).isoformat() not in _dates(prop)
+
+    def test_cache_se_invalida_al_expirar_el_hold(self, prop):
+        _booking(prop, status="pending", start=10, hold_delta=-0.01)
+        assert _day(10).isoformat() in _dates(prop)
+
+        mark_expired_holds()
+        assert _day(10).isoformat() not in _dates(prop)
+
+
+@pytest.mark.django_db
+class TestDisabledDatesViews:
+
+    def test_endpoint_json_con_etag_y_304(self, client, prop):
+        _booking(prop, start=10)
+        url = f"/properties/{prop.id}/disabled-dates/"
+        resp = client.get(url)
+        assert resp.status_code == 200
+        assert resp["Content-Type"] == "application/json"
+        assert resp.json()["disabled"] == [_day(10).isoformat(), _day(11).isoformat()]
+
+        not_modified = client.get(url, HTTP_IF_NONE_MATCH=resp["ETag"])
+        assert not_modified.status_code == 304
+        assert client.get("/properties/999999/disabled-dates/").status_code == 404
+
+    def test_ficha_incluye_reservas_locales_sin_calendario_externo(self, client, prop):
+        _booking(prop, start=10)
+        resp = client.get(f"/properties/{prop.id}/")
+        assert resp.status_code == 200
+        assert json.loads(resp.context["blocked_dates"]) == [_day(10).isoformat(), _day(11).isoformat()]
@@ -0,0 +1,293 @@
+"""
+Tests de los bloqueos externos persistidos (ExternalBlock).
+
+Cubre:
+  - sync_external_blocks: alta, cambio y baja de eventos por diferencia (UID)
+  - synced_at: fecha de la descarga real, no la de servir el caché
+  - Índice OccupiedNight para bloqueos externos
+  - Disponibilidad con una sola consulta para reservas locales y externas
+  - Tareas de sincronización: persistencia y limpieza
+  - Varios calendarios por propiedad (CalendarFeed): rangos fusionados, alta/baja
+"""
+
+from datetime import date, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.core.cache import cache as django_cache
+from django.utils import timezone
+from model_bakery import baker
+
+from properties.models import CalendarFeed, ExternalBlock, OccupiedNight
+from properties.utils.external_blocks import (
+    merge_ranges,
+    sync_external_blocks,
+)
+from properties.utils.occupancy import rebuild_occupancy
+
+ICAL_URL = "https://airbnb.com/calendar/ical/blocks.ics"
+
+
+def _day(n):
+    return date.today() + timedelta(days=n)
+
+
+def _nights(prop):
+    return sorted(
+        OccupiedNight.objects.filter(property=prop, external_block__isnull=False).values_list("night", flat=True)
+    )
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    django_cache.clear()
+    yield
+    django_cache.clear()
+
+
+@pytest.fixture
+def prop():
+    return baker.make("properties.Property", max_people=4, nightly_price="100.00", airbnb_ical_url=ICAL_URL)
+
+
+@pytest.fixture
+def feed(prop):
+    feed = prop.calendar_feeds.get()
+    feed.property = prop  # la sincronización actualiza el resumen de esta misma instancia
+    return feed
+
+
+@pytest.mark.django_db
+class TestSyncExternalBlocks:
+
+    def test_primera_sincronizacion_crea_bloqueos_y_noches(self, prop, feed):
+        result = sync_external_blocks(feed, [("a", _day(10), _day(13))])
+        assert result == {"created": 1, "updated": 0, "deleted": 0, "unchanged": 0}
+        assert _nights(prop) == [_day(10), _day(11), _day(12)]
+
+    def test_solo_escribe_las_diferencias(self, prop, feed):
+        sync_external_blocks(feed, [
+            ("igual", _day(5), _day(7)),
+            ("cambia", _day(10), _day(12)),
+            ("desaparece", _day(20), _day(22)),
+        ])
+        igual_pk = ExternalBlock.objects.get(uid="igual").pk
+
+        result = sync_external_blocks(feed, [
+            ("igual", _day(5), _day(7)),
+            ("cambia", _day(11), _day(14)),
+            ("nuevo", _day(30), _day(31)),
+        ])
+
+        assert result == {"created": 1, "updated": 1, "deleted": 1, "unchanged": 1}
+        assert ExternalBlock.objects.get(uid="igual").pk == igual_pk
+        assert set(ExternalBlock.objects.values_list("uid", flat=True)) == {"igual", "cambia", "nuevo"}
+        assert _nights(prop) == [_day(5), _day(6), _day(11), _day(12), _day(13), _day(30)]
+
+    def test_cambio_de_url_elimina_bloqueos_del_calendario_anterior(self, prop, feed):
+        sync_external_blocks(feed, [("a", _day(10), _day(12))])
+        prop.airbnb_ical_url = "https://airbnb.com/calendar/ical/otro.ics"
+        prop.save()
+        assert list(prop.calendar_feeds.values_list("url", flat=True)) == [prop.airbnb_ical_url]
+        assert ExternalBlock.objects.filter(property=prop).count() == 0
+        assert _nights(prop) == []
+
+    def test_actualiza_synced_at_del_feed_y_de_la_propiedad(self, prop, feed):
+        assert prop.ical_synced_at is None
+        sync_external_blocks(feed, [])
+        feed.refresh_from_db()
+        prop.refresh_from_db()
+        assert feed.synced_at is not None
+        assert prop.ical_synced_at == feed.synced_at
+
+    def test_eventos_del_cache_conservan_la_fecha_de_descarga(self, prop, feed):
+        from properties.utils.ical import fetch_ical_events
+
+        body = (
+            "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nBEGIN:VEVENT\r\nUID:a\r\n"
+            f"DTSTART;VALUE=DATE:{_day(10):%Y%m%d}\r\nDTEND;VALUE=DATE:{_day(12):%Y%m%d}\r\n"
+            "END:VEVENT\r\nEND:VCALENDAR\r\n"
+        ).encode()
+        response = MagicMock(status_code=200, headers={"content-length": str(len(body))})
+        response.iter_content = lambda chunk_size: iter([body])
+        with patch("requests.Session.get", return_value=response):
+            downloaded = fetch_ical_events(ICAL_URL)
+        sync_external_blocks(feed, downloaded)
+        feed.refresh_from_db()
+        first_sync = feed.synced_at
+
+        # Más tarde, el mismo calendario servido desde el caché (sin HTTP)
+        with patch("requests.Session.get") as mock_get, \
+                patch("properties.utils.external_blocks.now", return_value=timezone.now() + timedelta(minutes=5)):
+            cached = fetch_ical_events(ICAL_URL)
+            sync_external_blocks(feed, cached)
+        mock_get.assert_not_called()
+        feed.refresh_from_db()
+        prop.refresh_from_db()
+        assert abs(feed.synced_at - first_sync) < timedelta(seconds=1)
+        assert prop.ical_synced_at == feed.synced_at
+
+    def test_rebuild_incluye_bloqueos_externos(self, prop, feed):
+        sync_external_blocks(feed, [("a", _day(10), _day(12))])
+        OccupiedNight.objects.all().delete()
+        rebuild_occupancy(prop.id)
+        assert _nights(prop) == [_day(10), _day(11)]
+
+
+@pytest.mark.django_db
+class TestAvailabilityWithExternalBlocks:
+
+    def test_bloqueo_externo_rechaza_y_contiguo_no(self, prop, feed):
+        sync_external_blocks(feed, [("a", _day(10), _day(13))])
+        assert prop.is_available(_day(12).isoformat(), _day(15).isoformat(), 2) is False
+        assert prop.is_available(_day(13).isoformat(), _day(15).isoformat(), 2) is True
+        assert prop.is_available(_day(8).isoformat(), _day(10).isoformat(), 2) is True
+
+    def test_una_sola_consulta_para_locales_y_externos(self, prop, feed, django_assert_num_queries):
+        from properties.models import Property, bulk_availability
+
+        sync_external_blocks(feed, [("a", _day(10), _day(13))])
+        local = baker.make("properties.Property", max_people=4, nightly_price="100.00", airbnb_ical_url=None)
+        baker.make(
+            "bookings.Booking", property=local, status="confirmed", person_num=2,
+            arrival=timezone.now() + timedelta(days=10), departure=timezone.now() + timedelta(days=12),
+        )
+        libre = baker.make("properties.Property", max_people=4, nightly_price="100.00", airbnb_ical_url=None)
+        props = list(Property.objects.all())
+
+        with django_assert_num_queries(1):
+            result = bulk_availability(props, _day(10).isoformat(), _day(12).isoformat(), 2)
+
+        assert result == {prop.id: False, local.id: False, libre.id: True}
+
+
+@pytest.mark.django_db
+class TestSyncTasksPersistBlocks:
+
+    def _response(self, ranges):
+        lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Test//Test//EN"]
+        for i, (start, end) in enumerate(ranges):
+            lines += [
+                "BEGIN:VEVENT",
+                f"DTSTART;VALUE=DATE:{start.strftime('%Y%m%d')}",
+                f"DTEND;VALUE=DATE:{end.strftime('%Y%m%d')}",
+                f"UID:evt-{i}@airbnb.com",
+                "END:VEVENT",
+            ]
+        body = "\r\n".join(lines + ["END:VCALENDAR"]).encode()
+        resp = MagicMock(status_code=200, headers={"content-length": str(len(body))})
+        resp.iter_content = lambda chunk_size: iter([body])
+        return resp
+
+    def test_sync_all_guarda_uids_del_feed(self, prop, feed):
+        from properties.tasks import sync_all_property_calendars
+
+        with patch("requests.Session.get", return_value=self._response([(_day(10), _day(12)), (_day(20), _day(25))])):
+            result = sync_all_property_calendars()
+
+        assert result["success"] == 1
+        assert set(ExternalBlock.objects.values_list("uid", flat=True)) == {"evt-0@airbnb.com", "evt-1@airbnb.com"}
+
+    def test_fallo_de_descarga_conserva_bloqueos(self, prop, feed):
+        from properties.tasks import sync_all_property_calendars
+
+        sync_external_blocks(feed, [("a", _day(10), _day(12))])
+        prop.refresh_from_db()
+        synced_at = prop.ical_synced_at
+        with patch("requests.Session.get", side_effect=Exception("network down")):
+            result = sync_all_property_calendars()
+
+        assert result["errors"] == 1
+        assert ExternalBlock.objects.count() == 1
+        prop.refresh_from_db()
+        assert prop.ical_synced_at == synced_at
+
+    def test_propiedad_sin_url_pierde_sus_bloqueos(self, prop, feed):
+        from properties.tasks import sync_all_property_calendars
+
+        sync_external_blocks(feed, [("a", _day(10), _day(12))])
+        prop.airbnb_ical_url = ""
+        prop.save()
+        sync_all_property_calendars()
+        assert ExternalBlock.objects.count() == 0
+        assert _nights(prop) == []
+
+
+@pytest.mark.django_db
+class TestMultipleFeeds:
+
+    BOOKING_URL = "https://admin.booking.com/hotel/ical/blocks.ics"
+
+    def _second_feed(self, prop):
+        return CalendarFeed.objects.create(property=prop, name="Booking.com", url=self.BOOKING_URL)
+
+    def test_merge_ranges_fusiona_solapes_y_contiguos(self):
+        ranges = [
+            (_day(10), _day(12)),
+            (_day(1), _day(3)),
+            (_day(11), _day(15)),   # solapa con el primero
+            (_day(15), _day(16)),   # contiguo
+            (_day(20), _day(20)),   # vacío
+            (_day(2), _day(3)),     # contenido en otro
+        ]
+        assert merge_ranges(ranges) == [(_day(1), _day(3)), (_day(10), _day(16))]
+
+    def test_get_blocked_ranges_combina_todos_los_feeds(self, prop, feed):
+        booking = self._second_feed(prop)
+        sync_external_blocks(feed, [("a", _day(10), _day(13)), ("b", _day(30), _day(32))])
+        sync_external_blocks(booking, [("x", _day(12), _day(15)), ("y", _day(15), _day(16))])
+        prop.refresh_from_db()
+        assert prop.ical_feed_count == 2
+        assert prop.get_blocked_ranges() == [(_day(10), _day(16)), (_day(30), _day(32))]
+
+    def test_bloqueos_de_cualquier_feed_rechazan(self, prop, feed):
+        booking = self._second_feed(prop)
+        sync_external_blocks(feed, [])
+        sync_external_blocks(booking, [("x", _day(20), _day(22))])
+        prop.refresh_from_db()
+        assert prop.is_available(_day(20).isoformat(), _day(23).isoformat(), 2) is False
+        assert prop.is_available(_day(10).isoformat(), _day(13).isoformat(), 2) is True
+
+    def test_feed_nunca_sincronizado_vuelve_no_disponible_la_propiedad(self, prop, feed):
+        sync_external_blocks(feed, [])
+        self._second_feed(prop)
+        prop.refresh_from_db()
+        assert prop.ical_synced_at is None
+        with patch("properties.tasks.refresh_property_calendars.delay"):
+            assert prop.is_available(_day(10).isoformat(), _day(13).isoformat(), 2) is False
+
+    def test_desactivar_o_borrar_un_feed_libera_sus_noches(self, prop, feed):
+        booking = self._second_feed(prop)
+        sync_external_blocks(feed, [("a", _day(10), _day(12))])
+        sync_external_blocks(booking, [("x", _day(20), _day(22))])
+
+        booking.active = False
+        booking.save()
+        assert _nights(prop) == [_day(10), _day(11)]
+
+        feed.delete()
+        assert _nights(prop) == []
+        prop.refresh_from_db()
+        assert prop.ical_feed_count == 0
+
+    def test_sync_all_descarga_todos_los_feeds(self, prop, feed):
+        from properties.tasks import sync_all_property_calendars
+
+        self._second_feed(prop)
+        responses = {
+            ICAL_URL: [(_day(10), _day(12))],
+            self.BOOKING_URL: [(_day(12), _day(14)), (_day(30), _day(31))],
+        }
+
+        def fake_get(url, **kwargs):
+            return TestSyncTasksPersistBlocks()._response(responses[url])
+
+        with patch("requests.Session.get", side_effect=fake_get):
+            result = sync_all_property_calendars()
+
+        assert result["total"] == 2
+        assert result["success"] == 2
+        assert result["total_bookings"] == 3
+        prop.refresh_from_db()
+        assert prop.get_blocked_ranges() == [(_day(10), _day(14)), (_day(30), _day(31))]
+
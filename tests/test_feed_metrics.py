@@ -0,0 +1,200 @@
+"""
+Tests de las métricas por calendario externo (properties.utils.feed_metrics).
+
+Cubre:
+  - Muestras registradas por fetch_ical_events: descarga, caché, 304 y errores
+  - Estado de salud de cada feed (stale / error / slow / ok)
+  - Comando calendar_health y listado de calendarios del Admin (incluido el borrado en lote)
+"""
+
+import json
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.core.cache import cache as django_cache
+from django.core.management import call_command
+from django.utils import timezone
+from model_bakery import baker
+from requests.exceptions import HTTPError
+
+from properties.models import CalendarFeed
+from properties.utils import feed_metrics
+from properties.utils.feed_metrics import feed_health, feed_health_report, get_feed_metrics, record_fetch
+from properties.utils.ical import _cache_key, fetch_ical_events
+
+ICAL_URL = "https://airbnb.com/calendar/ical/metrics.ics"
+
+
+def _body(events=1):
+    today = date.today()
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Test//Test//EN"]
+    for i in range(events):
+        lines += [
+            "BEGIN:VEVENT",
+            f"DTSTART;VALUE=DATE:{(today + timedelta(days=3 + 5 * i)).strftime('%Y%m%d')}",
+            f"DTEND;VALUE=DATE:{(today + timedelta(days=5 + 5 * i)).strftime('%Y%m%d')}",
+            f"UID:evt-{i}@airbnb.com",
+            "END:VEVENT",
+        ]
+    return "\r\n".join(lines + ["END:VCALENDAR"]).encode()
+
+
+def _response(body=b"", status_code=200, headers=None):
+    resp = MagicMock(status_code=status_code, headers={"content-length": str(len(body)), **(headers or {})})
+    resp.iter_content = lambda chunk_size: iter([body[:100], body[100:]])
+    if status_code >= 400:
+        resp.raise_for_status.side_effect = HTTPError(response=resp)
+    return resp
+
+
+def _metrics(url=ICAL_URL):
+    return get_feed_metrics([url])[url]
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    django_cache.clear()
+    yield
+    django_cache.clear()
+
+
+@pytest.mark.django_db
+class TestRecordedSamples:
+
+    def test_descarga_registra_latencia_bytes_parseo_y_eventos(self):
+        body = _body(events=3)
+        with patch("requests.Session.get", return_value=_response(body)):
+            fetch_ical_events(ICAL_URL)
+
+        metrics = _metrics()
+        last = metrics["last"]
+        assert last["outcome"] == "fetched"
+        assert last["status"] == 200
+        assert last["bytes"] == len(body)
+        assert last["events"] == 3
+        assert last["latency_ms"] >= 0 and last["parse_ms"] >= 0 and last["download_ms"] >= 0
+        assert metrics["last_success"] is not None
+        assert metrics["hit_ratio"] == 0
+
+    def test_acierto_de_cache_y_304(self):
+        with patch("requests.Session.get", return_value=_response(_body(), headers={"ETag": '"v1"'})):
+            fetch_ical_events(ICAL_URL)
+        fetch_ical_events(ICAL_URL)  # caché fresco, sin HTTP
+        with patch("requests.Session.get", return_value=_response(status_code=304)):
+            fetch_ical_events(ICAL_URL, force_refresh=True)
+
+        metrics = _metrics()
+        assert metrics["samples"] == 3
+        assert metrics["hit_ratio"] == pytest.approx(1 / 3)
+        assert metrics["last"]["outcome"] == "not_modified"
+        assert metrics["last"]["status"] == 304
+
+    def test_error_conserva_la_ultima_descarga_correcta(self):
+        with patch("requests.Session.get", return_value=_response(_body())):
+            fetch_ical_events(ICAL_URL)
+        last_success = _metrics()["last_success"]
+
+        with patch("requests.Session.get", return_value=_response(status_code=404)):
+            with pytest.raises(ValueError):
+                fetch_ical_events(ICAL_URL, force_refresh=True)
+        django_cache.delete(_cache_key(ICAL_URL))
+        with pytest.raises(ValueError):
+            fetch_ical_events(ICAL_URL)  # error cacheado, sin HTTP
+
+        metrics = _metrics()
+        assert [metrics["last"]["outcome"], metrics["errors"]] == ["failure_cached", 2]
+        assert metrics["last_success"] == last_success
+
+    def test_historial_acotado(self, monkeypatch):
+        monkeypatch.setattr(feed_metrics, "ICAL_METRICS_HISTORY", 3)
+        for i in range(5):
+            record_fetch(ICAL_URL, "fetched", latency_ms=100 * (i + 1))
+        metrics = _metrics()
+        assert metrics["samples"] == 3
+        assert (metrics["latency_p50_ms"], metrics["latency_max_ms"]) == (400, 500)
+
+
+@pytest.mark.django_db
+class TestFeedHealth:
+
+    def _feed(self, n=1, synced_minutes_ago=5, **kwargs):
+        prop = baker.make("properties.Property", name=f"Casa {n}", max_people=4, nightly_price="100.00",
+                          airbnb_ical_url=f"https://airbnb.com/calendar/ical/{n}.ics")
+        synced_at = timezone.now() - timedelta(minutes=synced_minutes_ago) if synced_minutes_ago is not None else None
+        CalendarFeed.objects.filter(property=prop).update(synced_at=synced_at, **kwargs)
+        return CalendarFeed.objects.select_related("property").get(property=prop)
+
+    def test_estados(self):
+        ok = self._feed(1)
+        stale = self._feed(2, synced_minutes_ago=None)
+        failing = self._feed(3, consecutive_errors=2)
+        slow = self._feed(4)
+        record_fetch(slow.url, "fetched", latency_ms=feed_metrics.ICAL_METRICS_SLOW_MS + 1)
+
+        assert feed_health(ok) == "ok"
+        assert feed_health(stale) == "stale"
+        assert feed_health(failing) == "error"
+        assert feed_health(slow, _metrics(slow.url)) == "slow"
+
+        report = feed_health_report()
+        assert [row["health"] for row in report] == ["stale", "error", "slow", "ok"]
+
+    def test_comando_json_y_filtro_de_problemas(self):
+        ok = self._feed(1)
+        stale = self._feed(2, synced_minutes_ago=600)
+        record_fetch(ok.url, "fetched", status=200, latency_ms=120, bytes_read=2048, events=4)
+
+        out = StringIO()
+        call_command("calendar_health", "--json", stdout=out)
+        rows = {row["feed_id"]: row for row in json.loads(out.getvalue())}
+        assert rows[stale.id]["health"] == "stale"
+        assert rows[ok.id]["metrics"]["last"]["bytes"] == 2048
+
+        out = StringIO()
+        call_command("calendar_health", "--problems", stdout=out)
+        assert "Casa 2" in out.getvalue()
+        assert "Casa 1" not in out.getvalue()
+
+    def test_listado_del_admin(self, client):
+        feed = self._feed(1)
+        record_fetch(feed.url, "fetched", status=200, latency_ms=250, bytes_read=4096, parse_ms=3, events=2)
+        client.force_login(baker.make("accounts.User", is_staff=True, is_superuser=True))
+
+        resp = client.get("/admin/properties/calendarfeed/")
+        assert resp.status_code == 200
+        content = resp.content.decode()
+        assert "250 / 250" in content
+        assert "4.0" in content
+
+    def test_listado_del_admin_lee_las_metricas_una_vez(self, client):
+        feeds = [self._feed(n) for n in (1, 2, 3)]
+        for feed in feeds:
+            record_fetch(feed.url, "fetched", status=200, latency_ms=100)
+        client.force_login(baker.make("accounts.User", is_staff=True, is_superuser=True))
+
+        with patch.object(feed_metrics.cache, "get_many", wraps=django_cache.get_many) as get_many:
+            resp = client.get("/admin/properties/calendarfeed/")
+        assert resp.status_code == 200
+        assert get_many.call_count == 1
+
+    def test_borrado_en_lote_desde_el_admin(self, client):
+        from properties.models import ExternalBlock, OccupiedNight, Property
+        from properties.utils.external_blocks import sync_external_blocks
+
+        feed = self._feed(1)
+        start = date.today() + timedelta(days=10)
+        sync_external_blocks(feed, [("evt-1", start, start + timedelta(days=2))])
+        client.force_login(baker.make("accounts.User", is_staff=True, is_superuser=True))
+
+        resp = client.post("/admin/properties/calendarfeed/", {
+            "action": "delete_selected", "_selected_action": [feed.pk], "post": "yes",
+        })
+        assert resp.status_code == 302
+        prop = Property.objects.get(pk=feed.property_id)
+        assert not CalendarFeed.objects.filter(pk=feed.pk).exists()
+        assert prop.ical_feed_count == 0
+        assert prop.ical_synced_at is None
+        assert not ExternalBlock.objects.filter(property=prop).exists()
+        assert not OccupiedNight.objects.filter(property=prop).exists()
@@ -0,0 +1,176 @@
+"""
+Tests del sondeo adaptativo de calendarios externos (properties.utils.feed_scheduler).
+
+Cubre:
+  - next_interval: acortar con cambios, alargar sin cambios, backoff con errores
+  - due_feeds: solo feeds vencidos, prioridad por ocupación, límite por tick
+  - Tarea sync_due_calendars: descarga y replanificación de cada feed, hosts con
+    el circuit breaker abierto
+"""
+
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache as django_cache
+from django.utils import timezone
+from model_bakery import baker
+
+from core.tzutils import compose_aware_dt
+from properties.models import CalendarFeed
+from properties.utils import feed_scheduler
+from properties.utils.feed_scheduler import (
+    ICAL_POLL_DEFAULT_INTERVAL,
+    ICAL_POLL_ERROR_MAX_INTERVAL,
+    ICAL_POLL_MAX_INTERVAL,
+    ICAL_POLL_MIN_INTERVAL,
+    JITTER_RATIO,
+    POLL_TICK_SECONDS,
+    due_feeds,
+    next_interval,
+    reschedule_feed,
+)
+from properties.utils.ical import ICAL_CACHE_HARD_TIMEOUT
+
+ICAL_URL = "https://airbnb.com/calendar/ical/{}.ics"
+
+
+def _day(n):
+    return date.today() + timedelta(days=n)
+
+
+def _feed(n, **kwargs):
+    prop = baker.make("properties.Property", max_people=4, nightly_price="100.00", airbnb_ical_url=ICAL_URL.format(n))
+    feed = prop.calendar_feeds.get()
+    if kwargs:
+        CalendarFeed.objects.filter(pk=feed.pk).update(**kwargs)
+        feed.refresh_from_db()
+    return feed
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    django_cache.clear()
+    yield
+    django_cache.clear()
+
+
+class TestNextInterval:
+
+    def test_cambios_acortan_hasta_el_minimo(self):
+        assert next_interval(1800, changed=True) == 900
+        assert next_interval(ICAL_POLL_MIN_INTERVAL, changed=True) == ICAL_POLL_MIN_INTERVAL
+
+    def test_sin_cambios_alarga_hasta_el_maximo(self):
+        assert next_interval(None) == int(ICAL_POLL_DEFAULT_INTERVAL * 1.5)
+        assert next_interval(ICAL_POLL_MAX_INTERVAL) == ICAL_POLL_MAX_INTERVAL
+
+    def test_propiedad_ocupada_no_pasa_del_intervalo_por_defecto(self):
+        assert next_interval(ICAL_POLL_MAX_INTERVAL, busy=True) == ICAL_POLL_DEFAULT_INTERVAL
+
+    def test_errores_retroceden_exponencialmente(self):
+        first = next_interval(600, failed=True, errors=1)
+        second = next_interval(first, failed=True, errors=2)
+        assert first == ICAL_POLL_DEFAULT_INTERVAL * 2
+        assert second == min(first * 2, ICAL_POLL_ERROR_MAX_INTERVAL)
+        assert next_interval(600, failed=True, errors=50) == ICAL_POLL_ERROR_MAX_INTERVAL
+
+    def test_backoff_de_errores_no_pasa_del_ttl_duro(self):
+        # Con su desfase y un tick de retraso, el reintento llega antes de que caduque
+        assert ICAL_POLL_ERROR_MAX_INTERVAL * (1 + JITTER_RATIO) + POLL_TICK_SECONDS < ICAL_CACHE_HARD_TIMEOUT
+
+
+@pytest.mark.django_db
+class TestDueFeeds:
+
+    def test_solo_feeds_vencidos_y_nuevos_primero(self):
+        at = timezone.now()
+        later = _feed(1, next_poll_at=at + timedelta(minutes=10))
+        overdue = _feed(2, next_poll_at=at - timedelta(minutes=10))
+        new = _feed(3)
+        _feed(4, next_poll_at=at - timedelta(minutes=20), active=False)
+
+        feeds, _ = due_feeds(at=at)
+        assert [f.id for f in feeds] == [new.id, overdue.id]
+        assert later.id not in [f.id for f in feeds]
+
+    def test_propiedades_ocupadas_van_primero_y_limite_por_tick(self):
+        at = timezone.now()
+        idle = _feed(1, next_poll_at=at - timedelta(hours=1))
+        busy = _feed(2, next_poll_at=at - timedelta(minutes=1))
+        baker.make(
+            "bookings.Booking", property=busy.property, status="confirmed", person_num=2,
+            arrival=compose_aware_dt(_day(0), hour=15), departure=compose_aware_dt(_day(25), hour=12),
+        )
+
+        feeds, busy_ids = due_feeds(at=at)
+        assert busy_ids == {busy.property_id}
+        assert [f.id for f in feeds] == [busy.id, idle.id]
+        assert [f.id for f in due_feeds(at=at, limit=1)[0]] == [busy.id]
+
+    def test_reschedule_reparte_feeds_con_el_mismo_intervalo(self):
+        at = timezone.now()
+        feeds = [_feed(n) for n in range(5)]
+        next_polls = {reschedule_feed(feed, at=at) for feed in feeds}
+        assert len(next_polls) > 1
+        expected = next_interval(None)
+        for feed in feeds:
+            feed.refresh_from_db()
+            assert feed.poll_interval == expected
+            assert abs((feed.next_poll_at - at).total_seconds() - expected) <= expected * feed_scheduler.JITTER_RATIO
+
+
+@pytest.mark.django_db
+class TestSyncDueCalendars:
+
+    def test_replanifica_segun_cambios_y_errores(self):
+        from properties.tasks import sync_due_calendars
+
+        changing = _feed(1)
+        failing = _feed(2, consecutive_errors=1)
+        _feed(3, next_poll_at=timezone.now() + timedelta(hours=1))
+
+        def fake_fetch(url, **kwargs):
+            if url == failing.url:
+                raise ValueError("HTTP 500")
+            return [("a", _day(10), _day(12))]
+
+        with patch("properties.tasks.fetch_ical_events", side_effect=fake_fetch) as fetch:
+            result = sync_due_calendars()
+
+        assert fetch.call_count == 2
+        assert result == {"due": 2, "success": 1, "errors": 1, "changed": 1, "open_circuits": []}
+
+        changing.refresh_from_db()
+        failing.refresh_from_db()
+        assert changing.poll_interval == ICAL_POLL_DEFAULT_INTERVAL // 2
+        assert changing.last_changed_at is not None
+        assert changing.consecutive_errors == 0
+        assert failing.consecutive_errors == 2
+        assert failing.poll_interval == min(ICAL_POLL_DEFAULT_INTERVAL * 4, ICAL_POLL_ERROR_MAX_INTERVAL)
+
+        # En el siguiente tick ya no hay nada vencido
+        with patch("properties.tasks.fetch_ical_events") as fetch:
+            assert sync_due_calendars()["due"] == 0
+        fetch.assert_not_called()
+
+    def test_informa_de_los_circuit_breakers_abiertos(self):
+        from properties.tasks import sync_due_calendars
+        from properties.utils.ical import _breaker_open_key
+
+        _feed(1, next_poll_at=timezone.now() + timedelta(hours=1))
+        django_cache.set(_breaker_open_key("airbnb.com"), 1, 60)
+
+        # Sin feeds vencidos también se informa
+        with patch("properties.tasks.fetch_ical_events") as fetch:
+            assert sync_due_calendars()["open_circuits"] == ["airbnb.com"]
+        fetch.assert_not_called()
+
+    def test_sin_cambios_alarga_el_intervalo(self):
+        from properties.tasks import sync_due_calendars
+
+        feed = _feed(1)
+        with patch("properties.tasks.fetch_ical_events", return_value=[]):
+            assert sync_due_calendars()["changed"] == 0
+        feed.refresh_from_db()
+        assert feed.poll_interval == int(ICAL_POLL_DEFAULT_INTERVAL * 1.5)
@@ -0,0 +1,93 @@
+"""
+Tests de bookings.tasks.mark_expired_holds (cola de holds por vencimiento).
+
+Cubre:
+  - Expira los holds vencidos, libera sus noches e invalida la disponibilidad
+  - No toca holds vigentes ni reservas confirmadas
+  - Recorrido por tramos de HOLD_EXPIRY_BATCH_SIZE
+  - Las consultas de disponibilidad no miran el vencimiento del hold
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.core.cache import cache as django_cache
+from django.utils import timezone
+from model_bakery import baker
+
+from bookings import tasks
+from bookings.models import Booking
+from core.tzutils import compose_aware_dt
+from properties.models import OccupiedNight
+from properties.utils.occupancy import availability_version, nights_occupied
+
+
+def _day(n):
+    return date.today() + timedelta(days=n)
+
+
+def _booking(prop, status="pending", start=10, nights=3, hold_delta=None):
+    hold = timezone.now() + timedelta(seconds=hold_delta) if hold_delta is not None else None
+    return baker.make(
+        "bookings.Booking", property=prop, status=status, person_num=2,
+        arrival=compose_aware_dt(_day(start), hour=15),
+        departure=compose_aware_dt(_day(start + nights), hour=12),
+        hold_expires_at=hold,
+    )
+
+
+@pytest.fixture
+def prop():
+    return baker.make("properties.Property", max_people=4, nightly_price=Decimal("100.00"), airbnb_ical_url=None)
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    django_cache.clear()
+    yield
+    django_cache.clear()
+
+
+@pytest.mark.django_db
+class TestMarkExpiredHolds:
+
+    def test_expira_hold_vencido_y_libera_sus_noches(self, prop):
+        hold = _booking(prop, hold_delta=-5)
+        before = availability_version(prop.id)
+
+        assert tasks.mark_expired_holds() == "holds_expired=1"
+
+        hold.refresh_from_db()
+        assert hold.status == "expired"
+        assert not OccupiedNight.objects.filter(booking=hold).exists()
+        assert availability_version(prop.id) != before
+        assert prop.is_available(_day(10).isoformat(), _day(13).isoformat(), 2) is True
+
+    def test_no_toca_holds_vigentes_ni_confirmadas(self, prop):
+        vigente = _booking(prop, hold_delta=600, start=10)
+        confirmada = _booking(prop, status="confirmed", start=20)
+
+        assert tasks.mark_expired_holds() == "holds_expired=0"
+
+        assert Booking.objects.get(pk=vigente.pk).status == "pending"
+        assert Booking.objects.get(pk=confirmada.pk).status == "confirmed"
+        assert OccupiedNight.objects.filter(booking=vigente).count() == 3
+
+    def test_recorre_por_tramos(self, prop, monkeypatch):
+        monkeypatch.setattr(tasks, "HOLD_EXPIRY_BATCH_SIZE", 2)
+        holds = [_booking(prop, hold_delta=-60 + i, start=10 + 4 * i) for i in range(5)]
+
+        assert tasks.mark_expired_holds() == "holds_expired=5"
+
+        assert set(Booking.objects.filter(pk__in=[h.pk for h in holds]).values_list("status", flat=True)) == {"expired"}
+        assert not OccupiedNight.objects.filter(property=prop).exists()
+
+    def test_hold_vencido_bloquea_hasta_que_pasa_la_cola(self, prop):
+        _booking(prop, hold_delta=-5)
+        checkin, checkout = compose_aware_dt(_day(10), 15), compose_aware_dt(_day(13), 12)
+
+        # La consulta de disponibilidad solo lee el índice; el hold lo libera la tarea
+        assert nights_occupied(prop.id, checkin, checkout) is True
+        tasks.mark_expired_holds()
+        assert nights_occupied(prop.id, checkin, checkout) is False
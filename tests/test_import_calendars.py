@@ -0,0 +1,107 @@
+"""
+Tests del comando import_calendars.
+
+Cubre:
+  - Resumen por calendario y filtro --property
+  - --workers y --per-host llegan a la descarga concurrente
+  - --diff contra los bloqueos guardados y --save
+  - Salida --json y código de salida ante errores
+"""
+
+import json
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache as django_cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from model_bakery import baker
+
+from properties.models import ExternalBlock
+from properties.utils.external_blocks import sync_external_blocks
+
+FETCH = "properties.management.commands.import_calendars.fetch_ical_events"
+
+
+def _day(n):
+    return date.today() + timedelta(days=n)
+
+
+def _feed(n):
+    prop = baker.make("properties.Property", name=f"Casa {n}", max_people=4, nightly_price="100.00",
+                      airbnb_ical_url=f"https://airbnb.com/calendar/ical/{n}.ics")
+    feed = prop.calendar_feeds.get()
+    feed.property = prop
+    return feed
+
+
+def _run(*args):
+    out = StringIO()
+    call_command("import_calendars", *args, stdout=out, stderr=StringIO())
+    return out.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    django_cache.clear()
+    yield
+    django_cache.clear()
+
+
+@pytest.mark.django_db
+class TestImportCalendars:
+
+    def test_resumen_por_calendario_y_filtro_por_propiedad(self):
+        first, second = _feed(1), _feed(2)
+        events = [("a", _day(10), _day(12)), ("b", _day(11), _day(14))]
+        with patch(FETCH, return_value=events) as fetch:
+            output = _run("--property", str(first.property_id), "--workers", "2")
+
+        assert fetch.call_count == 1
+        assert "Casa 1 (Airbnb): 2 bloqueos, 4 noches" in output
+        assert "Casa 2" not in output
+        assert not ExternalBlock.objects.exists()  # sin --save no escribe
+
+    def test_workers_y_limite_por_host(self):
+        feed = _feed(1)
+        with patch("properties.management.commands.import_calendars.fetch_ical_bookings_concurrently",
+                   return_value={feed.id: []}) as fetch:
+            _run("--workers", "8", "--per-host", "8")
+        assert fetch.call_args.kwargs["max_workers"] == 8
+        assert fetch.call_args.kwargs["per_host_limit"] == 8
+
+    def test_diff_solo_muestra_cambios(self):
+        feed = _feed(1)
+        sync_external_blocks(feed, [("a", _day(10), _day(12)), ("b", _day(20), _day(22))])
+        events = [("a", _day(10), _day(12)), ("c", _day(30), _day(31))]
+
+        with patch(FETCH, return_value=events):
+            data = json.loads(_run("--diff", "--json"))
+
+        row = data["feeds"][0]
+        assert [b["uid"] for b in row["added"]] == ["c"]
+        assert [b["uid"] for b in row["removed"]] == ["b"]
+
+        with patch(FETCH, return_value=events):
+            _run("--save")
+        with patch(FETCH, return_value=events):
+            assert "sin cambios" in _run("--diff")
+
+    def test_error_sale_con_codigo_1(self):
+        ok, failing = _feed(1), _feed(2)
+
+        def fake_fetch(url, **kwargs):
+            if url == failing.url:
+                raise ValueError("Error HTTP 500 al obtener el calendario")
+            return []
+
+        out = StringIO()
+        with patch(FETCH, side_effect=fake_fetch), pytest.raises(CommandError) as excinfo:
+            call_command("import_calendars", "--json", stdout=out)
+
+        assert excinfo.value.returncode == 1
+        rows = {row["feed_id"]: row for row in json.loads(out.getvalue())["feeds"]}
+        assert rows[failing.id]["error"].startswith("Error HTTP 500")
+        assert "error" not in rows[ok.id]
@@ -0,0 +1,84 @@
+"""
+Tests de bookings.tasks.mark_completed_bookings.
+
+Cubre:
+  - Mismas reservas y mismo recuento que comprobar compute_balance_due_snapshot una a una
+  - Recorrido por tramos (keyset) con un número de consultas que no depende de las reservas
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+
+from bookings import tasks
+from bookings.models import Booking
+from core.tzutils import compose_aware_dt
+from payments.services import compute_balance_due_snapshot
+
+
+def _dt(days, hour):
+    return compose_aware_dt(date.today() + timedelta(days=days), hour=hour)
+
+
+@pytest.fixture
+def prop():
+    return baker.make("properties.Property", max_people=4, nightly_price=Decimal("100.00"), airbnb_ical_url=None)
+
+
+def _booking(prop, paid, status="confirmed", start=-10, refunded=None):
+    booking = baker.make(
+        "bookings.Booking", property=prop, status=status, person_num=2,
+        arrival=_dt(start, 15), departure=_dt(start + 3, 12), total_amount=Decimal("1000.00"),
+    )
+    for payment_type, amount in paid:
+        baker.make("payments.Payment", booking=booking, payment_type=payment_type, status="paid",
+                   amount=Decimal(amount), refunded_amount=Decimal(refunded or "0.00"),
+                   refund_status="paid" if refunded else "none")
+    return booking
+
+
+def _scenario(prop):
+    return [
+        _booking(prop, [("deposit", "300.00"), ("balance", "700.00")]),                     # pagada
+        _booking(prop, [("deposit", "300.00"), ("balance", "500.00"), ("extension", "200.00")]),
+        _booking(prop, [("deposit", "300.00")]),                                             # debe 700
+        _booking(prop, [("deposit", "300.00"), ("balance", "700.00")], refunded="100.00"),  # reembolso
+        _booking(prop, [("deposit", "300.00"), ("balance", "800.00")]),                     # pagó de más
+        _booking(prop, [("deposit", "300.00"), ("balance", "700.00")], start=5),            # aún no sale
+        _booking(prop, [("deposit", "300.00"), ("balance", "700.00")], status="cancelled"),
+    ]
+
+
+@pytest.mark.django_db
+class TestMarkCompletedBookings:
+
+    def test_mismo_resultado_que_reserva_a_reserva(self, prop, monkeypatch):
+        monkeypatch.setattr(tasks, "COMPLETED_BATCH_SIZE", 2)
+        bookings = _scenario(prop)
+        expected = {
+            b.pk for b in bookings
+            if b.status == "confirmed" and b.departure < _dt(0, 0) and compute_balance_due_snapshot(b) == 0
+        }
+
+        assert tasks.mark_completed_bookings() == f"completed={len(expected)}"
+        completed = set(Booking.objects.filter(status="completed").values_list("pk", flat=True))
+        assert completed == expected == {bookings[0].pk, bookings[1].pk, bookings[4].pk}
+        assert tasks.mark_completed_bookings() == "completed=0"
+
+    def test_consultas_por_tramo(self, prop, monkeypatch):
+        monkeypatch.setattr(tasks, "COMPLETED_BATCH_SIZE", 1000)
+        _scenario(prop)
+        with CaptureQueriesContext(connection) as few:
+            tasks.mark_completed_bookings()
+
+        Booking.objects.filter(status="completed").update(status="confirmed")
+        for _ in range(10):
+            _scenario(prop)
+        with CaptureQueriesContext(connection) as many:
+            assert tasks.mark_completed_bookings() == "completed=33"
+
+        assert len(many) == len(few)
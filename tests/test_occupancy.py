@@ -0,0 +1,237 @@
+"""
+Tests del índice de ocupación por noche (OccupiedNight).
+
+Cubre:
+  - stay_nights: conversión de llegada/salida a noches
+  - Mantenimiento del índice al crear, cancelar, expirar y cambiar fechas
+  - Property.is_available contra reservas locales
+  - bulk_availability: una consulta y acceso al caché en lote
+"""
+
+from datetime import date, timedelta
+
+import pytest
+from django.utils import timezone
+from model_bakery import baker
+
+from core.tzutils import compose_aware_dt
+from properties.models import OccupiedNight
+from properties.utils.occupancy import rebuild_occupancy, stay_nights
+
+
+def _day(n):
+    return date.today() + timedelta(days=n)
+
+
+def _booking(prop, status="confirmed", start=10, nights=3, hold_delta=None):
+    hold = timezone.now() + timedelta(hours=hold_delta) if hold_delta is not None else None
+    return baker.make(
+        "bookings.Booking",
+        property=prop,
+        status=status,
+        arrival=compose_aware_dt(_day(start), hour=15),
+        departure=compose_aware_dt(_day(start + nights), hour=12),
+        person_num=2,
+        hold_expires_at=hold,
+    )
+
+
+def _nights(booking):
+    return sorted(OccupiedNight.objects.filter(booking=booking).values_list("night", flat=True))
+
+
+@pytest.fixture
+def prop():
+    return baker.make("properties.Property", max_people=4, nightly_price="100.00", airbnb_ical_url=None)
+
+
+class TestStayNights:
+
+    def test_horas_estandar_ocupan_noches_exactas(self):
+        first, end = stay_nights(compose_aware_dt(_day(10), 15), compose_aware_dt(_day(13), 12))
+        assert (first, end) == (_day(10), _day(13))
+
+    def test_horas_atipicas_se_redondean_hacia_fuera(self):
+        # Llegada por la mañana y salida por la tarde: bloquea la noche anterior y la del día de salida
+        first, end = stay_nights(compose_aware_dt(_day(10), 9), compose_aware_dt(_day(13), 18))
+        assert (first, end) == (_day(9), _day(14))
+
+
+@pytest.mark.django_db
+class TestIndexMaintenance:
+
+    def test_crear_reserva_indexa_sus_noches(self, prop):
+        b = _booking(prop)
+        assert _nights(b) == [_day(10), _day(11), _day(12)]
+
+    def test_cancelar_libera_noches(self, prop):
+        b = _booking(prop)
+        b.status = "cancelled"
+        b.save(update_fields=["status"])
+        assert _nights(b) == []
+
+    def test_cambio_de_fechas_reindexa(self, prop):
+        b = _booking(prop)
+        b.arrival = compose_aware_dt(_day(20), 15)
+        b.departure = compose_aware_dt(_day(22), 12)
+        b.save(update_fields=["arrival", "departure"])
+        assert _nights(b) == [_day(20), _day(21)]
+
+    def test_campos_solo_exportados_no_reindexan(self, prop):
+        from properties.utils.occupancy import availability_version
+
+        b = _booking(prop, status="pending", hold_delta=1)
+        ids = set(OccupiedNight.objects.filter(booking=b).values_list("id", flat=True))
+        version = availability_version(prop.id)
+
+        b.person_num = 3
+        b.hold_expires_at = timezone.now() + timedelta(hours=2)
+        b.save(update_fields=["person_num", "hold_expires_at"])
+
+        # Mismas filas (no se borraron y recrearon), pero el .ics cacheado se invalida
+        assert set(OccupiedNight.objects.filter(booking=b).values_list("id", flat=True)) == ids
+        assert availability_version(prop.id) != version
+
+    def test_mark_expired_holds_libera_noches(self, prop):
+        from bookings.tasks import mark_expired_holds
+
+        b = _booking(prop, status="pending", hold_delta=-1)
+        assert _nights(b)
+        mark_expired_holds()
+        assert _nights(b) == []
+
+    def test_rebuild_reproduce_el_indice(self, prop):
+        b = _booking(prop)
+        _booking(prop, status="cancelled", start=30)
+        OccupiedNight.objects.all().delete()
+        assert rebuild_occupancy() == 3
+        assert _nights(b) == [_day(10), _day(11), _day(12)]
+
+
+@pytest.mark.django_db
+class TestIsAvailableWithLocalBookings:
+
+    def test_solape_con_reserva_confirmada_rechaza(self, prop):
+        _booking(prop, start=10, nights=3)
+        assert prop.is_available(_day(11).isoformat(), _day(14).isoformat(), 2) is False
+
+    def test_fechas_contiguas_no_solapan(self, prop):
+        _booking(prop, start=10, nights=3)
+        assert prop.is_available(_day(13).isoformat(), _day(15).isoformat(), 2) is True
+        assert prop.is_available(_day(8).isoformat(), _day(10).isoformat(), 2) is True
+
+    def test_hold_vigente_bloquea_y_hold_expirado_no(self, prop):
+        from bookings.tasks import mark_expired_holds
+
+        _booking(prop, status="pending", start=10, hold_delta=1)
+        _booking(prop, status="pending", start=20, hold_delta=-1)
+        mark_expired_holds()  # los holds vencidos se liberan desde la cola, no en cada consulta
+        assert prop.is_available(_day(10).isoformat(), _day(12).isoformat(), 2) is False
+        assert prop.is_available(_day(20).isoformat(), _day(22).isoformat(), 2) is True
+
+    def test_exclude_booking_id_ignora_la_propia_reserva(self, prop):
+        b = _booking(prop, start=10, nights=3)
+        assert prop.is_available(_day(10).isoformat(), _day(14).isoformat(), 2, exclude_booking_id=b.id) is True
+
+    def test_reservas_historicas_no_afectan(self, prop):
+        for i in range(5):
+            _booking(prop, status="completed", start=-40 + i * 5, nights=2)
+        assert prop.is_available(_day(10).isoformat(), _day(12).isoformat(), 2) is True
+
+
+@pytest.mark.django_db
+class TestBulkAvailability:
+
+    def test_coincide_con_is_available(self, prop):
+        from properties.models import Property, bulk_availability
+
+        libre = prop
+        ocupada = baker.make("properties.Property", max_people=4, nightly_price="100.00", airbnb_ical_url=None)
+        pequena = baker.make("properties.Property", max_people=1, nightly_price="100.00", airbnb_ical_url=None)
+        _booking(ocupada, start=10, nights=3)
+
+        checkin, checkout = _day(11).isoformat(), _day(13).isoformat()
+        props = list(Property.objects.all())
+        result = bulk_availability(props, checkin, checkout, 2)
+
+        assert result == {p.id: p.is_available(checkin, checkout, 2) for p in props}
+        assert result == {libre.id: True, ocupada.id: False, pequena.id: False}
+
+    def test_available_between_filtra_el_queryset(self, prop):
+        from properties.models import Property
+
+        ocupada = baker.make("properties.Property", max_people=4, nightly_price="100.00", airbnb_ical_url=None)
+        _booking(ocupada, start=10, nights=3)
+
+        qs = Property.objects.available_between(_day(11).isoformat(), _day(13).isoformat(), 2)
+        assert list(qs.values_list("id", flat=True)) == [prop.id]
+
+    def test_una_sola_consulta_para_todo_el_catalogo(self, prop, django_assert_num_queries):
+        from properties.models import Property, bulk_availability
+
+        for _ in range(10):
+            p = baker.make("properties.Property", max_people=4, nightly_price="100.00", airbnb_ical_url=None)
+            _booking(p, start=10, nights=3)
+        props = list(Property.objects.all())
+
+        with django_assert_num_queries(1):
+            bulk_availability(props, _day(11).isoformat(), _day(13).isoformat(), 2)
+
+    def test_frescura_de_calendarios_en_lote(self, prop, django_assert_num_queries):
+        from unittest.mock import patch
+
+        from django.core.cache import cache as django_cache
+
+        from properties.models import Property, bulk_availability
+        from properties.utils import ical
+
+        for n in range(10):
+            baker.make("properties.Property", max_people=4, nightly_price="100.00",
+                       airbnb_ical_url=f"https://airbnb.com/calendar/ical/{n}.ics")
+        Property.objects.exclude(pk=prop.pk).update(ical_feed_count=1, ical_synced_at=timezone.now())
+        props = list(Property.objects.all())
+        args = (_day(11).isoformat(), _day(13).isoformat(), 2)
+
+        calls = []
+        nested = []
+
+        def counted(name):
+            method = getattr(django_cache, name)
+
+            def call(*a, **kw):
+                # Solo las llamadas de la aplicación (LocMemCache.get_many usa get)
+                if not nested:
+                    calls.append(name)
+                nested.append(name)
+                try:
+                    return method(*a, **kw)
+                finally:
+                    nested.pop()
+            return call
+
+        def run():
+            calls.clear()
+            with patch.multiple(ical.cache, **{n: counted(n) for n in ("get", "get_many", "add", "incr", "set")}), \
+                    patch("properties.tasks.refresh_property_calendars.delay") as delay, \
+                    django_assert_num_queries(1):
+                result = bulk_availability(props, *args)
+            return result, delay
+
+        # Todas al día: un solo incremento de contador (ya creado)
+        run()
+        result, _ = run()
+        assert all(result.values())
+        assert calls == ["incr"]
+
+        # Caducadas: una lectura de los locks y un refresco encolado por propiedad
+        Property.objects.exclude(pk=prop.pk).update(ical_synced_at=None)
+        props = list(Property.objects.all())
+        result, delay = run()
+        assert result == {p.id: p.id == prop.id for p in props}
+        assert calls.count("get_many") == 1
+        assert delay.call_count == 10
+
+        # Con los refrescos ya en marcha, nada más que el contador y los locks
+        _, delay = run()
+        assert calls == ["incr", "get_many"]
+        delay.assert_not_called()
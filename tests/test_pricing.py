@@ -0,0 +1,107 @@
+"""
+Tests de la cotización en lote (properties.utils.pricing).
+
+Cubre:
+  - Equivalencia céntimo a céntimo con Property.quote_total()
+  - Tramos de descuento (7 y 30 noches) y redondeos en el límite
+  - None donde quote_total() lanzaría error
+  - Total de la estancia en el listado de propiedades
+"""
+
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.core.cache import cache as django_cache
+from django.urls import reverse
+from model_bakery import baker
+
+from properties.models import Property
+from properties.utils.pricing import discount_percent, quote_totals, quote_totals_cents, to_cents
+
+
+def _day(n):
+    return date.today() + timedelta(days=n)
+
+
+def _prop(pid, price):
+    return Property(id=pid, name=f"Casa {pid}", nightly_price=Decimal(price) if price is not None else None)
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    django_cache.clear()
+    yield
+    django_cache.clear()
+
+
+@pytest.mark.django_db
+class TestQuoteTotals:
+
+    def test_coincide_con_quote_total(self):
+        rng = random.Random(7)
+        # Precios con céntimos que caen en x.xx5 tras aplicar descuento e impuestos
+        props = [_prop(i + 1, Decimal(rng.randint(1, 999999)) / 100) for i in range(40)]
+        props += [_prop(100, "0.05"), _prop(101, "1234.55"), _prop(102, "999.95")]
+        stays = [(_day(1), _day(1 + n)) for n in list(range(1, 40)) + [59, 60, 61, 90, 183, 365, 400]]
+
+        totals = quote_totals(props, stays)
+
+        for prop in props:
+            expected = [prop.quote_total(checkin, checkout)["total"] for checkin, checkout in stays]
+            assert totals[prop.id] == expected
+
+    def test_tramos_de_descuento(self):
+        assert [discount_percent(n) for n in (1, 6, 7, 29, 30, 200)] == [0, 0, 10, 10, 20, 20]
+        prop = _prop(1, "100.00")
+        totals = quote_totals([prop], [(_day(0), _day(6)), (_day(0), _day(7)), (_day(0), _day(30))])[1]
+        assert totals == [prop.quote_total(_day(0), _day(n))["total"] for n in (6, 7, 30)]
+
+    def test_invalidos_devuelven_none(self):
+        stays = [(_day(5), _day(3)), (_day(3), _day(3)), (_day(3), _day(5))]
+        totals = quote_totals([_prop(1, None), _prop(2, "150.00")], stays)
+
+        assert totals[1] == [None, None, None]
+        assert totals[2][:2] == [None, None]
+        assert totals[2][2] == _prop(2, "150.00").quote_total(_day(3), _day(5))["total"]
+
+    def test_acepta_cadenas_y_nucleo_en_centimos(self):
+        prop = _prop(1, "80.10")
+        checkin, checkout = _day(2), _day(10)
+        by_string = quote_totals([prop], [(checkin.isoformat(), checkout.isoformat())])[1][0]
+        cents = quote_totals_cents([to_cents(prop.nightly_price)], [8])[0]
+
+        assert by_string == prop.quote_total(checkin, checkout)["total"]
+        assert cents == to_cents(by_string)
+
+
+@pytest.mark.django_db
+class TestPropertyListTotals:
+
+    def test_listado_muestra_total_de_la_estancia(self, client):
+        prop = baker.make("properties.Property", name="Casa Total", max_people=4,
+                          nightly_price=Decimal("100.00"))
+        checkin, checkout = _day(10), _day(13)
+        expected = prop.quote_total(checkin, checkout)["total"]
+
+        resp = client.get(reverse("property_list"), {"checkin": checkin.isoformat(), "checkout": checkout.isoformat()})
+        assert resp.status_code == 200
+        listed = next(p for p in resp.context["property_list"] if p.id == prop.id)
+        assert listed.stay_total == expected
+
+        resp = client.get(reverse("property_list"), {"checkin": "no-es-fecha", "checkout": checkout.isoformat()})
+        assert resp.status_code == 200
+        assert all(p.stay_total is None for p in resp.context["property_list"])
+
+    def test_listado_no_cotiza_estancias_invalidas(self, client):
+        baker.make("properties.Property", max_people=4, nightly_price=Decimal("100.00"))
+        invalid = [
+            ("0001-01-01", "9999-12-31"),                               # más de MAX_NIGHTS
+            (_day(-5).isoformat(), _day(-2).isoformat()),               # en el pasado
+            (_day(13).isoformat(), _day(10).isoformat()),               # invertida
+        ]
+        for checkin, checkout in invalid:
+            resp = client.get(reverse("property_list"), {"checkin": checkin, "checkout": checkout})
+            assert resp.status_code == 200
+            assert all(p.stay_total is None for p in resp.context["property_list"])
@@ -0,0 +1,119 @@
+"""
+Tests de las cotizaciones memorizadas (properties.utils.quotes).
+
+Cubre:
+  - Mismo resultado que quote_total() y sin recalcular en llamadas repetidas
+  - Nivel compartido entre procesos (LRU vacío)
+  - Invalidación al cambiar nightly_price o las tarifas por noche
+  - Sin cotizaciones antiguas bajo una versión nueva (instancias desfasadas)
+  - compute_price() memorizado
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache as django_cache
+from model_bakery import baker
+
+from bookings.services import compute_price
+from properties.models import Property
+from properties.utils import quotes
+from properties.utils.quotes import clear_local_quotes, get_quote
+from properties.utils.rates import set_nightly_rates
+
+
+def _day(n):
+    return date.today() + timedelta(days=n)
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    django_cache.clear()
+    clear_local_quotes()
+    yield
+    django_cache.clear()
+    clear_local_quotes()
+
+
+@pytest.fixture
+def prop(db):
+    return baker.make("properties.Property", name="Casa Memo", max_people=4, nightly_price=Decimal("100.00"))
+
+
+@pytest.mark.django_db
+class TestGetQuote:
+
+    def test_memoriza_y_devuelve_copias(self, prop):
+        with patch.object(Property, "quote_total", autospec=True, side_effect=Property.quote_total) as quote_total:
+            first = get_quote(prop, _day(5), _day(8))
+            first["total"] = Decimal("0")
+            second = get_quote(prop, _day(5).isoformat(), _day(8).isoformat())
+
+        assert quote_total.call_count == 1
+        assert second == prop.quote_total(_day(5), _day(8))
+
+    def test_nivel_compartido_sin_lru(self, prop, django_assert_num_queries):
+        get_quote(prop, _day(5), _day(8))
+        clear_local_quotes()  # otro proceso
+        with django_assert_num_queries(0), patch.object(Property, "quote_total") as quote_total:
+            get_quote(prop, _day(5), _day(8))
+        quote_total.assert_not_called()
+
+    def test_lru_acotado(self, prop, monkeypatch):
+        monkeypatch.setattr(quotes, "_local_quotes", quotes._LRU(2))
+        for n in range(4):
+            get_quote(prop, _day(5), _day(8 + n))
+        assert len(quotes._local_quotes) == 2
+
+    def test_cambio_de_precio_invalida(self, prop):
+        before = get_quote(prop, _day(5), _day(8))["total"]
+        prop.nightly_price = Decimal("200.00")
+        prop.save()
+
+        assert get_quote(prop, _day(5), _day(8))["total"] > before
+        assert get_quote(Property.objects.get(pk=prop.pk), _day(5), _day(8)) == prop.quote_total(_day(5), _day(8))
+
+    def test_instancia_antigua_no_memoriza_el_precio_anterior(self, prop):
+        stale = Property.objects.get(pk=prop.pk)
+        prop.nightly_price = Decimal("200.00")
+        prop.save()
+
+        quote = get_quote(stale, _day(5), _day(8))
+        assert quote == prop.quote_total(_day(5), _day(8))
+        assert get_quote(prop, _day(5), _day(8)) == quote
+
+    def test_no_memoriza_si_la_version_cambia_durante_el_calculo(self, prop):
+        original = Property.quote_total
+
+        def quote_and_bump(instance, checkin, checkout):
+            quotes.bump_pricing_version(instance.pk)  # cambio de precio concurrente
+            return original(instance, checkin, checkout)
+
+        with patch.object(Property, "quote_total", autospec=True, side_effect=quote_and_bump):
+            assert get_quote(prop, _day(5), _day(8)) == prop.quote_total(_day(5), _day(8))
+
+        assert len(quotes._local_quotes) == 0
+
+    def test_cambio_de_tarifas_invalida(self, prop):
+        before = get_quote(prop, _day(5), _day(8))["subtotal_base"]
+        set_nightly_rates(prop, _day(5), _day(6), Decimal("400.00"))
+
+        assert before == Decimal("300.00")
+        assert get_quote(prop, _day(5), _day(8))["subtotal_base"] == Decimal("600.00")
+
+    def test_errores_no_se_memorizan(self, prop):
+        with pytest.raises(ValueError):
+            get_quote(prop, _day(8), _day(5))
+        prop.nightly_price = None
+        prop.save()
+        with pytest.raises(ValueError):
+            get_quote(prop, _day(5), _day(8))
+
+    def test_compute_price_memorizado(self, prop):
+        expected = prop.quote_total(_day(5), _day(12))["total"]
+        with patch.object(Property, "quote_total", autospec=True, side_effect=Property.quote_total) as quote_total:
+            assert compute_price(prop, _day(5), _day(12)) == expected
+            assert compute_price(prop, _day(5), _day(12)) == expected
+        assert quote_total.call_count == 1
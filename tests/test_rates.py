@@ -0,0 +1,126 @@
+"""
+Tests de las tarifas por noche (NightlyRate + properties.utils.rates).
+
+Cubre:
+  - Sumas prefijas: subtotal de cualquier estancia igual a sumar noche a noche
+  - quote_total() / compute_price() con fines de semana y temporadas
+  - Cotización en lote (quote_totals) con y sin tarifas
+  - Invalidación del caché al guardar o borrar tarifas
+"""
+
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.core.cache import cache as django_cache
+from model_bakery import baker
+
+from bookings.services import compute_price
+from properties.models import NightlyRate
+from properties.utils.pricing import quote_totals, to_cents
+from properties.utils.rates import RateCalendar, get_rate_calendar, set_nightly_rates
+
+
+def _day(n):
+    return date.today() + timedelta(days=n)
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    django_cache.clear()
+    yield
+    django_cache.clear()
+
+
+@pytest.fixture
+def prop(db):
+    return baker.make("properties.Property", name="Casa Tarifas", max_people=4, nightly_price=Decimal("100.00"))
+
+
+class TestRateCalendar:
+
+    def test_subtotal_igual_a_sumar_noche_a_noche(self):
+        rng = random.Random(3)
+        rates = {_day(n): Decimal(rng.randint(5000, 90000)) / 100 for n in rng.sample(range(0, 120), 40)}
+        calendar = RateCalendar.from_rates(rates.items())
+        default = to_cents(Decimal("123.45"))
+
+        for _ in range(300):
+            start = rng.randint(-20, 130)
+            checkin, checkout = _day(start), _day(start + rng.randint(1, 60))
+            expected = sum(
+                to_cents(rates.get(checkin + timedelta(days=i), Decimal("123.45")))
+                for i in range((checkout - checkin).days)
+            )
+            assert calendar.subtotal_cents(checkin, checkout, default) == expected
+
+    def test_sin_tarifa_por_defecto_exige_todas_las_noches(self):
+        calendar = RateCalendar.from_rates([(_day(1), Decimal("80.00")), (_day(2), Decimal("90.00"))])
+        assert calendar.subtotal_cents(_day(1), _day(3), None) == 17000
+        with pytest.raises(ValueError):
+            calendar.subtotal_cents(_day(1), _day(4), None)
+
+    def test_vacio_y_serializable(self):
+        assert not RateCalendar()
+        calendar = RateCalendar.from_rates([(_day(5), Decimal("10.50"))])
+        restored = RateCalendar.__new__(RateCalendar)
+        restored.__setstate__(calendar.__getstate__())
+        assert restored.window(_day(0), _day(10)) == (1050, 1)
+
+
+@pytest.mark.django_db
+class TestQuoteWithNightlyRates:
+
+    def test_fines_de_semana_y_temporada(self, prop):
+        start = _day(10)
+        set_nightly_rates(prop, start, start + timedelta(days=28), Decimal("150.00"), weekdays={4, 5})
+        set_nightly_rates(prop, start + timedelta(days=14), start + timedelta(days=21), Decimal("200.00"))
+
+        checkout = start + timedelta(days=28)
+        expected_base = sum(
+            Decimal("200.00") if 14 <= i < 21
+            else Decimal("150.00") if (start + timedelta(days=i)).weekday() in (4, 5)
+            else Decimal("100.00")
+            for i in range(28)
+        )
+        quote = prop.quote_total(start, checkout)
+
+        assert quote["subtotal_base"] == expected_base
+        assert quote["discount_rate"] == Decimal("0.10")
+        assert quote["nightly"] == (expected_base / 28).quantize(Decimal("0.01"))
+        assert set(quote) == {"days", "nightly", "subtotal_base", "discount_rate", "discount_amount",
+                              "subtotal", "cleaning", "taxable", "tax_amount", "total"}
+        assert compute_price(prop, start, checkout) == quote["total"]
+
+    def test_sin_tarifas_no_cambia_la_cotizacion(self, prop):
+        set_nightly_rates(prop, _day(50), _day(52), Decimal("300.00"))
+        quote = prop.quote_total(_day(10), _day(13))
+        assert quote["nightly"] == Decimal("100.00")
+        assert quote["subtotal_base"] == Decimal("300.00")
+
+    def test_propiedad_sin_precio_con_tarifas_completas(self, prop):
+        prop.nightly_price = None
+        prop.save()
+        set_nightly_rates(prop, _day(5), _day(8), Decimal("90.00"))
+
+        assert prop.quote_total(_day(5), _day(8))["subtotal_base"] == Decimal("270.00")
+        with pytest.raises(ValueError):
+            prop.quote_total(_day(5), _day(9))
+
+    def test_lote_coincide_con_quote_total(self, prop):
+        other = baker.make("properties.Property", name="Casa Fija", max_people=2, nightly_price=Decimal("85.50"))
+        set_nightly_rates(prop, _day(3), _day(40), Decimal("133.33"), weekdays={5, 6})
+        stays = [(_day(s), _day(s + n)) for s in (0, 4, 9) for n in (2, 7, 30)]
+
+        totals = quote_totals([prop, other], stays)
+        for p in (prop, other):
+            assert totals[p.id] == [p.quote_total(checkin, checkout)["total"] for checkin, checkout in stays]
+
+    def test_guardar_y_borrar_invalidan_el_cache(self, prop):
+        assert not get_rate_calendar(prop.id)
+        rate = NightlyRate.objects.create(property=prop, night=_day(3), price=Decimal("250.00"))
+        assert prop.quote_total(_day(3), _day(5))["subtotal_base"] == Decimal("350.00")
+
+        rate.delete()
+        assert prop.quote_total(_day(3), _day(5))["subtotal_base"] == Decimal("200.00")